@@ -0,0 +1,117 @@
+"""Пропускная способность API при росте числа параллельных запросов.
+
+Поднимает DiscordBotAPI поверх FakeFirestore с искусственной задержкой
+каждого запроса к хранилищу и прогоняет одинаковую нагрузку на разных
+уровнях параллелизма:
+
+    python -m benchmarks.api_concurrency --latency-ms 20 --requests 400
+"""
+import argparse
+import asyncio
+import json
+import socket
+import statistics
+import time
+
+import aiohttp
+import uvicorn
+
+from benchmarks.fake_firestore import FakeFirestore
+from src.api_firebase import APIService, DiscordBotAPI, FirebaseManager
+
+GUILD_COUNT = 50
+
+
+def build_app(latency: float):
+    db = FakeFirestore(latency=latency)
+    db.seed('guild_settings', {
+        str(100000 + index): {
+            'form_channel_id': str(200000 + index),
+            'approv_channel_id': str(300000 + index),
+            'approver_role_id': str(400000 + index)
+        }
+        for index in range(GUILD_COUNT)
+    })
+    api = DiscordBotAPI(APIService(FirebaseManager(db=db)))
+    return api.app, db
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+async def run_level(session: aiohttp.ClientSession, base_url: str, total: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one_request(index: int):
+        url = f"{base_url}/guilds/{100000 + index % GUILD_COUNT}/settings"
+        async with semaphore:
+            start = time.perf_counter()
+            async with session.get(url) as response:
+                await response.read()
+                response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_request(index) for index in range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'concurrency': concurrency,
+        'requests': total,
+        'elapsed_s': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2)
+    }
+
+
+async def main(args):
+    app, _ = build_app(args.latency_ms / 1000)
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host='127.0.0.1', port=port, log_level='warning'))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    results = []
+    try:
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            for concurrency in args.concurrency:
+                results.append(await run_level(session, f"http://127.0.0.1:{port}", args.requests, concurrency))
+    finally:
+        server.should_exit = True
+        await server_task
+
+    baseline = results[0]['throughput_rps']
+    for result in results:
+        result['speedup'] = round(result['throughput_rps'] / baseline, 2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"Задержка хранилища: {args.latency_ms} мс, запросов на уровень: {args.requests}")
+    print(f"{'параллельно':>12} {'RPS':>10} {'p50, мс':>10} {'p95, мс':>10} {'ускорение':>10}")
+    for result in results:
+        print(f"{result['concurrency']:>12} {result['throughput_rps']:>10} {result['p50_ms']:>10} "
+              f"{result['p95_ms']:>10} {result['speedup']:>10}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=20.0, help='задержка одного запроса к хранилищу')
+    parser.add_argument('--requests', type=int, default=400, help='запросов на каждый уровень')
+    parser.add_argument('--concurrency', type=lambda value: [int(part) for part in value.split(',')],
+                        default=[1, 2, 4, 8, 16, 32, 64], help='уровни параллелизма через запятую')
+    parser.add_argument('--json', action='store_true', help='вывести результаты в JSON')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,387 @@
+"""Микробенчмарки хелперов слоя данных на разных объёмах и бэкендах.
+
+Замеряет каждую функцию src.database_firebase и src.database на наборах
+из N серверов, N записей черного списка, N заявок и N групп (по одной на
+сервер), поэтому рост времени или числа прочитанных документов вместе с N
+означает полный проход по коллекции.
+
+Бэкенды:
+    firestore      — хелперы модуля с кэшами поверх FakeFirestore
+    firestore_raw  — методы FirebaseManager напрямую, без кэшей
+    json           — файловый DatabaseManager из src.database
+
+Результаты сравниваются с сохранённым базовым прогоном. Код выхода 1 дают
+только воспроизводимые регрессии: рост числа прочитанных документов и рост
+показателя степени от N. Замедление по времени зависит от соседей по машине
+и печатается как предупреждение (--strict-time делает его ошибкой):
+
+    python -m benchmarks.data_layer --sizes 10,1000,100000
+    python -m benchmarks.data_layer --save-baseline
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+from benchmarks.fake_firestore import FakeFirestore
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baselines', 'data_layer.json')
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+BACKENDS = ('firestore', 'firestore_raw', 'json')
+
+OWNER_ID = '1000000000000000001'
+GUILD_BASE = 100_000_000_000_000_000
+USER_BASE = 200_000_000_000_000_000
+MESSAGE_BASE = 300_000_000_000_000_000
+ROLE_BASE = 400_000_000_000_000_000
+
+EMBED_DATA = {
+    'title': "Новая заявка в семью",
+    'description': None,
+    'color': 0xe74c3c,
+    'thumbnail': None,
+    'fields': [{'name': f"{index}. Вопрос", 'value': "Ответ " * 20, 'inline': False} for index in range(1, 6)],
+    'footer': {'text': "ID Отправителя: (0)"}
+}
+
+
+class Dataset:
+    """Ключи i-го сервера: по одной записи каждого вида, чтобы ответ запроса по серверу не рос с N"""
+
+    def __init__(self, size: int):
+        self.size = size
+
+    def guild(self, index: int) -> str:
+        return str(GUILD_BASE + index % self.size)
+
+    def user(self, index: int) -> str:
+        return str(USER_BASE + index % self.size)
+
+    def message(self, index: int) -> str:
+        return str(MESSAGE_BASE + index % self.size)
+
+    def role(self, index: int) -> str:
+        return str(ROLE_BASE + index % self.size)
+
+    def settings(self, index: int) -> dict:
+        return {
+            'form_channel_id': str(GUILD_BASE + 1 + index),
+            'approv_channel_id': str(GUILD_BASE + 2 + index),
+            'approver_role_id': self.role(index),
+            'approved_role_id': str(ROLE_BASE + 1 + index),
+            'blacklist_report_channel_id': str(GUILD_BASE + 3 + index)
+        }
+
+    def blacklist_entry(self, index: int) -> dict:
+        return {'reason': "Нарушение правил", 'reporter_id': OWNER_ID, 'timestamp': '1700000000', 'static_id': None}
+
+    def application(self, index: int) -> dict:
+        return {'channel_id': str(GUILD_BASE + 2 + index), 'applicant_id': self.user(index), 'embed_data': EMBED_DATA}
+
+    def capt(self, index: int) -> dict:
+        return {'channel_id': str(GUILD_BASE + 1 + index), 'max_members': 10, 'current_members': [self.user(index)]}
+
+
+def _seed_firestore(db: FakeFirestore, data: Dataset) -> None:
+    settings, blacklist, applications, capts, permissions = {}, {}, {}, {}, {}
+    for index in range(data.size):
+        guild, user, message, role = data.guild(index), data.user(index), data.message(index), data.role(index)
+        settings[guild] = data.settings(index)
+        blacklist[f"{guild}_{user}"] = {'guild_id': guild, 'user_id': user, **data.blacklist_entry(index)}
+        applications[f"{guild}_{message}"] = {'guild_id': guild, 'message_id': message, **data.application(index)}
+        capts[f"{guild}_{message}"] = {'guild_id': guild, 'message_id': message, **data.capt(index)}
+        permissions[f"{guild}_{role}"] = {'guild_id': guild, 'role_id': role, 'permissions': ['blacklist', 'createcapt']}
+    db.seed('owners', {OWNER_ID: {}})
+    db.seed('guild_settings', settings)
+    db.seed('blacklist', blacklist)
+    db.seed('applications', applications)
+    db.seed('capts', capts)
+    db.seed('role_permissions', permissions)
+
+
+def _firestore_backend(data: Dataset, cached: bool):
+    from src import database_firebase
+    from src.datastore_metrics import datastore_metrics
+
+    db = FakeFirestore()
+    _seed_firestore(db, data)
+    database_firebase.firebase_db._db = datastore_metrics.wrap_client(db)
+    database_firebase.firebase_db._initialized = True
+    database_firebase.firebase_db._owners = []
+    database_firebase.cache_manager.clear_cache()
+    return (database_firebase if cached else database_firebase.firebase_db), db
+
+
+def _json_backend(data: Dataset, directory: str):
+    settings = {data.guild(index): data.settings(index) for index in range(data.size)}
+    settings['blacklist'] = {data.guild(index): {data.user(index): data.blacklist_entry(index)} for index in range(data.size)}
+    settings['capts'] = {data.guild(index): {data.message(index): data.capt(index)} for index in range(data.size)}
+    applications = {data.guild(index): {data.message(index): data.application(index)} for index in range(data.size)}
+
+    files = {
+        'SETTINGS_FILE': (os.path.join(directory, 'settings.json'), settings),
+        'APPLICATIONS_FILE': (os.path.join(directory, 'applications.json'), applications),
+        'OWNERS_FILE': (os.path.join(directory, 'owners.json'), {'owners': [OWNER_ID], 'approver_role_ids': {}})
+    }
+    for variable, (path, content) in files.items():
+        os.environ[variable] = path
+        with open(path, 'w') as file:
+            json.dump(content, file, indent=4)
+    os.environ.setdefault('DEFAULT_OWNERS', OWNER_ID)
+
+    from src import database
+    # Модульные функции работают через database.db: подменяем его менеджером с файлами этого прогона
+    database.db = database.DatabaseManager()
+    database.db.init_owners()
+    return database, None
+
+
+# Операции в порядке запуска: сначала чтения, затем записи и удаления, меняющие набор данных.
+# Каждая получает модуль бэкенда, набор данных и номер итерации.
+OPERATIONS = [
+    ('get_settings', lambda api, data, i: api.get_settings(data.guild(i))),
+    ('get_all_settings', lambda api, data, i: api.get_all_settings()),
+    ('get_blacklist_report_channel', lambda api, data, i: api.get_blacklist_report_channel(data.guild(i))),
+    ('is_owner', lambda api, data, i: api.is_owner(OWNER_ID if i % 2 else data.user(i))),
+    ('is_blacklisted', lambda api, data, i: api.is_blacklisted(data.guild(i), data.user(i + i % 2))),
+    ('get_blacklist', lambda api, data, i: api.get_blacklist(data.guild(i))),
+    ('get_role_permissions', lambda api, data, i: api.get_role_permissions(data.guild(i), data.role(i))),
+    ('get_guild_applications', lambda api, data, i: api.get_guild_applications(data.guild(i))),
+    ('has_pending_application', lambda api, data, i: api.has_pending_application(data.guild(i), data.user(i + i % 2))),
+    ('get_capt', lambda api, data, i: api.get_capt(data.guild(i), data.message(i))),
+    ('save_settings', lambda api, data, i: api.save_settings(data.guild(i), form_channel_id=str(GUILD_BASE + i))),
+    ('add_to_blacklist', lambda api, data, i: api.add_to_blacklist(
+        data.guild(i), str(USER_BASE + data.size + i), "Нарушение правил", OWNER_ID)),
+    ('save_application', lambda api, data, i: api.save_application(
+        data.guild(i), str(GUILD_BASE + 2), str(MESSAGE_BASE + data.size + i), data.user(i), EMBED_DATA)),
+    ('save_capt', lambda api, data, i: api.save_capt(data.guild(i), str(GUILD_BASE + 1), str(MESSAGE_BASE + data.size + i), 10)),
+    ('add_member_to_capt', lambda api, data, i: api.add_member_to_capt(
+        data.guild(i), data.message(i), str(USER_BASE + data.size + i))),
+    ('remove_member_from_capt', lambda api, data, i: api.remove_member_from_capt(
+        data.guild(i), data.message(i), data.user(i))),
+    ('remove_from_blacklist', lambda api, data, i: api.remove_from_blacklist(data.guild(i), data.user(i))),
+    ('remove_application', lambda api, data, i: api.remove_application(data.guild(i), data.message(i))),
+    ('remove_capt', lambda api, data, i: api.remove_capt(data.guild(i), data.message(i)))
+]
+
+
+def _measure(call, budget: float, max_iterations: int, store, repeats: int):
+    call(0)
+    if store is not None:
+        store.reset_counters()
+
+    # Бюджет делится на несколько раундов: минимум медиан раундов устойчив к паузам, которые задевают один раунд
+    rounds = []
+    iteration = 0
+    per_round = max(1, max_iterations // repeats)
+    for _ in range(repeats):
+        timings = []
+        deadline = time.perf_counter() + budget / repeats
+        # Шаг по ключам взаимно прост с размерами набора, чтобы кэши не видели один и тот же сервер подряд
+        while len(timings) < per_round:
+            iteration += 1
+            start = time.perf_counter()
+            call(iteration * 7919)
+            timings.append(time.perf_counter() - start)
+            if time.perf_counter() > deadline:
+                break
+        rounds.append(timings)
+
+    timings = [value for timings in rounds for value in timings]
+    medians = sorted(statistics.median(timings) for timings in rounds)
+    quartiles = statistics.quantiles(medians, n=4) if len(medians) > 1 else [medians[0]] * 3
+    result = {
+        'iterations': len(timings),
+        'median_us': round(statistics.median(timings) * 1e6, 2),
+        'mean_us': round(statistics.fmean(timings) * 1e6, 2),
+        'min_us': round(medians[0] * 1e6, 2),
+        'iqr_us': round((quartiles[2] - quartiles[0]) * 1e6, 2)
+    }
+    if store is not None:
+        count = len(timings)
+        result.update({
+            'requests_per_op': round(store.requests / count, 3),
+            'reads_per_op': round(store.reads / count, 3),
+            'writes_per_op': round(store.writes / count, 3)
+        })
+    return result
+
+
+def run_suite(backends, sizes, operations, budget: float, max_iterations: int, repeats: int):
+    results = []
+    for backend in backends:
+        for size in sizes:
+            data = Dataset(size)
+            with tempfile.TemporaryDirectory() as directory:
+                if backend == 'json':
+                    api, store = _json_backend(data, directory)
+                else:
+                    api, store = _firestore_backend(data, cached=backend == 'firestore')
+
+                for name, operation in OPERATIONS:
+                    if name not in operations or not hasattr(api, name):
+                        continue
+                    result = _measure(lambda i: operation(api, data, i), budget, max_iterations, store, repeats)
+                    results.append({'backend': backend, 'operation': name, 'size': size, **result})
+                    print(f"  {backend:>13} {name:>28} N={size:<7} {result['min_us']:>12} мкс", file=sys.stderr)
+    return results
+
+
+def _time(row) -> float:
+    # Прогоны без раундов (старые базы) сравниваются по общей медиане
+    return row.get('min_us', row['median_us'])
+
+
+def scaling(results, sizes=None):
+    """Показатель степени роста времени между наименьшим и наибольшим N: ~0 для O(1), ~1 для O(n)"""
+    grouped = {}
+    for result in results:
+        if sizes is not None and result['size'] not in sizes:
+            continue
+        grouped.setdefault((result['backend'], result['operation']), []).append(result)
+
+    exponents = {}
+    for key, rows in grouped.items():
+        rows.sort(key=lambda row: row['size'])
+        first, last = rows[0], rows[-1]
+        if first['size'] == last['size'] or not _time(first) or not _time(last):
+            continue
+        exponent = math.log(_time(last) / _time(first)) / math.log(last['size'] / first['size'])
+        exponents[key] = round(exponent, 2)
+    return exponents
+
+
+def compare(results, baseline, tolerance: float, noise_us: float, strict_time: bool = False):
+    baseline_rows = {(row['backend'], row['operation'], row['size']): row for row in baseline['results']}
+    regressions = []
+
+    for result in results:
+        key = (result['backend'], result['operation'], result['size'])
+        previous = baseline_rows.get(key)
+        if previous is None:
+            continue
+        if 'min_us' in result and 'min_us' in previous:
+            current_us, previous_us = result['min_us'], previous['min_us']
+        else:
+            current_us, previous_us = result['median_us'], previous['median_us']
+        # Разброс между раундами обоих прогонов тоже считается шумом
+        noise = max(noise_us, result.get('iqr_us', 0) + previous.get('iqr_us', 0))
+        if current_us > previous_us * (1 + tolerance) and current_us - previous_us > noise:
+            regressions.append({'key': key, 'kind': 'time', 'baseline': previous_us, 'current': current_us,
+                                'fatal': strict_time})
+        # Число прочитанных документов не зависит от машины: рост здесь — почти всегда полный проход по коллекции
+        if 'reads_per_op' in result and 'reads_per_op' in previous:
+            if result['reads_per_op'] > previous['reads_per_op'] * 1.1 + 0.5:
+                regressions.append({'key': key, 'kind': 'reads', 'baseline': previous['reads_per_op'],
+                                    'current': result['reads_per_op'], 'fatal': True})
+
+    # База считается на тех же размерах, что и текущий прогон, иначе показатели несравнимы
+    baseline_exponents = scaling(baseline['results'], {result['size'] for result in results})
+    for key, exponent in scaling(results).items():
+        previous = baseline_exponents.get(key)
+        if previous is not None and exponent > 0.5 and exponent > previous + 0.3:
+            regressions.append({'key': key, 'kind': 'scaling', 'baseline': previous, 'current': exponent, 'fatal': True})
+    return regressions
+
+
+def main(args) -> int:
+    operations = set(args.operations or [name for name, _ in OPERATIONS])
+    results = run_suite(args.backends, args.sizes, operations, args.budget, args.max_iterations, args.repeats)
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sizes': args.sizes,
+            'budget_s': args.budget,
+            'repeats': args.repeats
+        },
+        'results': results
+    }
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=1, ensure_ascii=False)
+        print(f"Базовый прогон сохранён: {args.baseline}")
+        return 0
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as file:
+            regressions = compare(results, json.load(file), args.tolerance, args.noise_us, args.strict_time)
+    fatal = [item for item in regressions if item['fatal']]
+    report['regressions'] = [{**item, 'key': list(item['key'])} for item in regressions]
+    report['scaling'] = {f"{backend}.{operation}": exponent for (backend, operation), exponent in scaling(results).items()}
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return 1 if fatal else 0
+
+    print(f"{'бэкенд':>13} {'операция':>28} {'рост':>6} " + " ".join(f"{'N=' + str(size):>11}" for size in args.sizes))
+    table = {}
+    for result in results:
+        table.setdefault((result['backend'], result['operation']), {})[result['size']] = result
+    exponents = scaling(results)
+    for (backend, operation), by_size in table.items():
+        cells = []
+        for size in args.sizes:
+            row = by_size.get(size)
+            cells.append(f"{_time(row):>11}" if row else f"{'—':>11}")
+        exponent = exponents.get((backend, operation))
+        print(f"{backend:>13} {operation:>28} {exponent if exponent is not None else '—':>6} " + " ".join(cells))
+    print("Время — лучшая из медиан раундов в мкс; рост — показатель степени от N (0 ≈ O(1), 1 ≈ O(n))")
+
+    if not os.path.exists(args.baseline):
+        print(f"Базовый прогон не найден ({args.baseline}), сравнение пропущено")
+        return 0
+    warnings = [item for item in regressions if not item['fatal']]
+    if warnings:
+        print("Замедления по времени (на код выхода не влияют, см. --strict-time):")
+        for item in warnings:
+            print(f"  {'.'.join(str(part) for part in item['key'])}: {item['baseline']} → {item['current']} мкс")
+    if not fatal:
+        print("Регрессий относительно базового прогона нет")
+        return 0
+
+    print("Регрессии:")
+    for item in fatal:
+        print(f"  {'.'.join(str(part) for part in item['key'])}: {item['kind']} {item['baseline']} → {item['current']}")
+    return 1
+
+
+def _list(value: str):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=lambda value: [int(part) for part in _list(value)], default=DEFAULT_SIZES,
+                        help='размеры наборов данных через запятую')
+    parser.add_argument('--backends', type=_list, default=list(BACKENDS), help='бэкенды через запятую')
+    parser.add_argument('--operations', type=_list, default=None, help='только эти операции, через запятую')
+    parser.add_argument('--budget', type=float, default=0.2, help='секунд на одну операцию и размер')
+    parser.add_argument('--max-iterations', type=int, default=2000, help='предел вызовов на одну операцию и размер')
+    parser.add_argument('--repeats', type=int, default=5, help='раундов замера на одну операцию и размер')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='файл базового прогона')
+    parser.add_argument('--save-baseline', action='store_true', help='записать результаты как новый базовый прогон')
+    parser.add_argument('--tolerance', type=float, default=2.0, help='допустимое замедление относительно базы (2.0 = втрое)')
+    parser.add_argument('--noise-us', type=float, default=50.0, help='замедления меньше этого порога не считаются')
+    parser.add_argument('--strict-time', action='store_true', help='считать замедление по времени регрессией')
+    parser.add_argument('--json', action='store_true', help='вывести результаты в JSON')
+    args = parser.parse_args()
+    unknown = set(args.backends) - set(BACKENDS)
+    if unknown:
+        parser.error(f"неизвестные бэкенды: {', '.join(sorted(unknown))}")
+    if args.repeats < 1:
+        parser.error("--repeats должен быть не меньше 1")
+    return args
+
+
+if __name__ == '__main__':
+    sys.exit(main(parse_args()))
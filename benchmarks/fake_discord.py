@@ -0,0 +1,292 @@
+import asyncio
+import itertools
+import time
+import types
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import discord
+
+_snowflakes = itertools.count(1_100_000_000_000_000_000)
+
+
+def snowflake() -> int:
+    return next(_snowflakes)
+
+
+def _not_found(text: str) -> discord.NotFound:
+    return discord.NotFound(types.SimpleNamespace(status=404, reason='Not Found'), text)
+
+
+class FakeDiscordHTTP:
+    """Задержка и учёт REST-вызовов вместо настоящего discord.http."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls: Counter = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.calls.values())
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+    async def call(self, route: str) -> None:
+        self.calls[route] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+
+class FakeRole:
+    def __init__(self, guild: 'FakeGuild', role_id: int, position: int = 1):
+        self.guild = guild
+        self.id = role_id
+        self.position = position
+
+    @property
+    def mention(self) -> str:
+        return f"<@&{self.id}>"
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+
+class FakeUser:
+    def __init__(self, http: FakeDiscordHTTP, user_id: int):
+        self._http = http
+        self.id = user_id
+        self.name = f"user{user_id % 100000}"
+        self.display_name = self.name
+        self.avatar = None
+        self.bot = False
+        self.direct_messages: List[str] = []
+
+    @property
+    def mention(self) -> str:
+        return f"<@{self.id}>"
+
+    async def send(self, content: Optional[str] = None, **kwargs) -> None:
+        await self._http.call('POST /channels/{channel_id}/messages')
+        self.direct_messages.append(content)
+
+
+class FakeMember(FakeUser):
+    def __init__(self, http: FakeDiscordHTTP, guild: 'FakeGuild', user_id: int, roles=None, manage_roles: bool = False):
+        super().__init__(http, user_id)
+        self.guild = guild
+        self.roles: List[FakeRole] = list(roles or [])
+        self.guild_permissions = types.SimpleNamespace(manage_roles=manage_roles, administrator=False)
+
+    @property
+    def top_role(self) -> FakeRole:
+        return max(self.roles, key=lambda role: role.position) if self.roles else self.guild.default_role
+
+    async def add_roles(self, *roles, reason: Optional[str] = None) -> None:
+        await self._http.call('PUT /guilds/{guild_id}/members/{user_id}/roles/{role_id}')
+        for role in roles:
+            if role not in self.roles:
+                self.roles.append(role)
+
+
+class FakeMessage:
+    def __init__(self, channel: 'FakeChannel', message_id: int, content=None, embeds=None, view=None):
+        self.channel = channel
+        self.id = message_id
+        self.content = content
+        self.embeds = list(embeds or [])
+        self.view = view
+        self.deleted = False
+
+    @property
+    def guild(self) -> 'FakeGuild':
+        return self.channel.guild
+
+    async def edit(self, *, content=None, embed=None, view=None, **kwargs) -> 'FakeMessage':
+        await self.channel._http.call('PATCH /channels/{channel_id}/messages/{message_id}')
+        if content is not None:
+            self.content = content
+        if embed is not None:
+            self.embeds = [embed]
+        if view is not None:
+            self.view = view
+        return self
+
+    async def delete(self, **kwargs) -> None:
+        await self.channel._http.call('DELETE /channels/{channel_id}/messages/{message_id}')
+        self.deleted = True
+        self.channel.messages.pop(self.id, None)
+
+
+class FakeChannel:
+    def __init__(self, http: FakeDiscordHTTP, guild: 'FakeGuild', channel_id: int):
+        self._http = http
+        self.guild = guild
+        self.id = channel_id
+        self.messages: Dict[int, FakeMessage] = {}
+        self.sent: List[FakeMessage] = []
+
+    @property
+    def mention(self) -> str:
+        return f"<#{self.id}>"
+
+    async def send(self, content=None, *, embed=None, embeds=None, view=None, **kwargs) -> FakeMessage:
+        await self._http.call('POST /channels/{channel_id}/messages')
+        message = FakeMessage(self, snowflake(), content, [embed] if embed else embeds, view)
+        self.messages[message.id] = message
+        self.sent.append(message)
+        return message
+
+    async def fetch_message(self, message_id: int) -> FakeMessage:
+        await self._http.call('GET /channels/{channel_id}/messages/{message_id}')
+        message = self.messages.get(int(message_id))
+        if message is None:
+            raise _not_found('Unknown Message')
+        return message
+
+
+class FakeGuild:
+    def __init__(self, http: FakeDiscordHTTP, guild_id: int):
+        self._http = http
+        self.id = guild_id
+        self.default_role = FakeRole(self, guild_id, position=0)
+        self.roles: Dict[int, FakeRole] = {}
+        self.members: Dict[int, FakeMember] = {}
+        self.channels: Dict[int, FakeChannel] = {}
+        self.bans: List[int] = []
+        self.me = FakeMember(http, self, snowflake(), manage_roles=True)
+        self.me.roles.append(self.add_role(position=100))
+
+    def add_role(self, position: int = 1) -> FakeRole:
+        role = FakeRole(self, snowflake(), position)
+        self.roles[role.id] = role
+        return role
+
+    def add_channel(self) -> FakeChannel:
+        channel = FakeChannel(self._http, self, snowflake())
+        self.channels[channel.id] = channel
+        return channel
+
+    def add_member(self, user_id: Optional[int] = None, roles=None) -> FakeMember:
+        member = FakeMember(self._http, self, user_id or snowflake(), roles)
+        self.members[member.id] = member
+        return member
+
+    def get_role(self, role_id: int) -> Optional[FakeRole]:
+        return self.roles.get(int(role_id))
+
+    def get_channel(self, channel_id: int) -> Optional[FakeChannel]:
+        return self.channels.get(int(channel_id))
+
+    def get_member(self, user_id: int) -> Optional[FakeMember]:
+        return self.members.get(int(user_id))
+
+    async def fetch_member(self, user_id: int) -> FakeMember:
+        await self._http.call('GET /guilds/{guild_id}/members/{user_id}')
+        member = self.members.get(int(user_id))
+        if member is None:
+            raise _not_found('Unknown Member')
+        return member
+
+    async def ban(self, user, **kwargs) -> None:
+        await self._http.call('PUT /guilds/{guild_id}/bans/{user_id}')
+        self.bans.append(user.id)
+
+
+class FakeBot:
+    def __init__(self, http: FakeDiscordHTTP):
+        self.http = http
+        self.guilds: Dict[int, FakeGuild] = {}
+        self.users: Dict[int, FakeUser] = {}
+        self.user = FakeUser(http, snowflake())
+        self.latency = 0.05
+        self.persistent_views: List[Any] = []
+
+    def add_guild(self) -> FakeGuild:
+        guild = FakeGuild(self.http, snowflake())
+        self.guilds[guild.id] = guild
+        return guild
+
+    def get_guild(self, guild_id: int) -> Optional[FakeGuild]:
+        return self.guilds.get(int(guild_id))
+
+    async def fetch_user(self, user_id: int) -> FakeUser:
+        await self.http.call('GET /users/{user_id}')
+        user = self.users.get(int(user_id))
+        if user is None:
+            user = self.users[int(user_id)] = FakeUser(self.http, int(user_id))
+        return user
+
+    def add_view(self, view, **kwargs) -> None:
+        self.persistent_views.append(view)
+
+
+class FakeResponse:
+    def __init__(self, interaction: 'FakeInteraction'):
+        self._interaction = interaction
+        self._responded = False
+
+    def is_done(self) -> bool:
+        return self._responded
+
+    async def _respond(self, kind: str) -> None:
+        if self._responded:
+            # Повторный ответ на одно взаимодействие — ошибка, которую Discord вернул бы 400-м
+            self._interaction.double_responses += 1
+            raise discord.InteractionResponded(self._interaction)
+        self._responded = True
+        self._interaction.response_kind = kind
+        await self._interaction._http.call('POST /interactions/{interaction_id}/{token}/callback')
+        self._interaction.responded_at = time.perf_counter()
+
+    async def defer(self, **kwargs) -> None:
+        await self._respond('defer')
+
+    async def send_message(self, content=None, *, embed=None, **kwargs) -> None:
+        await self._respond('message')
+        self._interaction.messages.append((content, embed))
+
+    async def send_modal(self, modal) -> None:
+        await self._respond('modal')
+        self._interaction.modal = modal
+
+    async def edit_message(self, *, content=None, embed=None, view=None, **kwargs) -> None:
+        await self._respond('edit')
+        self._interaction.messages.append((content, embed))
+
+
+class FakeFollowup:
+    def __init__(self, interaction: 'FakeInteraction'):
+        self._interaction = interaction
+
+    async def send(self, content=None, *, embed=None, **kwargs) -> None:
+        await self._interaction._http.call('POST /webhooks/{application_id}/{token}')
+        self._interaction.messages.append((content, embed))
+
+
+class FakeInteraction:
+    def __init__(self, bot: FakeBot, guild: FakeGuild, user: FakeMember, channel: Optional[FakeChannel] = None,
+                 message: Optional[FakeMessage] = None, data: Optional[Dict[str, Any]] = None,
+                 interaction_type: discord.InteractionType = discord.InteractionType.component):
+        self._http = bot.http
+        self.id = snowflake()
+        self.client = bot
+        self.guild = guild
+        self.guild_id = guild.id
+        self.user = user
+        self.channel = channel or (message.channel if message else None)
+        self.channel_id = self.channel.id if self.channel else None
+        self.message = message
+        self.data = data or {}
+        self.type = interaction_type
+        self.command = None
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.messages: List[tuple] = []
+        self.modal = None
+        self.response_kind = None
+        self.responded_at = None
+        self.double_responses = 0
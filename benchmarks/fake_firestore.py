@@ -0,0 +1,323 @@
+import copy
+import itertools
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from google.api_core.exceptions import Aborted
+
+_OPERATORS = {
+    '==': lambda left, right: left == right,
+    '!=': lambda left, right: left != right,
+    '<': lambda left, right: left is not None and left < right,
+    '<=': lambda left, right: left is not None and left <= right,
+    '>': lambda left, right: left is not None and left > right,
+    '>=': lambda left, right: left is not None and left >= right,
+    'in': lambda left, right: left in right,
+    'array_contains': lambda left, right: isinstance(left, list) and right in left,
+}
+
+DOCUMENT_ID = '__name__'
+
+
+class FakeDocumentSnapshot:
+    def __init__(self, reference: 'FakeDocumentReference', data: Optional[Dict[str, Any]]):
+        self._reference = reference
+        self._data = data
+
+    @property
+    def id(self) -> str:
+        return self._reference.id
+
+    @property
+    def reference(self) -> 'FakeDocumentReference':
+        return self._reference
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return (self._data or {}).get(field)
+
+
+class FakeDocumentReference:
+    def __init__(self, client: 'FakeFirestore', collection: str, document_id: str):
+        self._client = client
+        self._collection = collection
+        self._id = document_id
+
+    @property
+    def id(self) -> str:
+        return self._id
+
+    @property
+    def path(self) -> str:
+        return f'{self._collection}/{self._id}'
+
+    def get(self, transaction=None) -> FakeDocumentSnapshot:
+        return self._client._read_document(self, transaction)
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        self._client._write_document(self, data, merge=merge)
+
+    def update(self, data: Dict[str, Any]) -> None:
+        self._client._update_document(self, data)
+
+    def delete(self) -> None:
+        self._client._delete_document(self)
+
+
+class FakeQuery:
+    def __init__(self, client: 'FakeFirestore', collection: str, filters=None, orders=None,
+                 limit: Optional[int] = None, cursor=None, projection=None):
+        self._client = client
+        self._collection = collection
+        self._filters = list(filters or [])
+        self._orders = list(orders or [])
+        self._limit = limit
+        self._cursor = cursor
+        self._projection = projection
+
+    def _copy(self, **changes) -> 'FakeQuery':
+        state = {
+            'filters': self._filters,
+            'orders': self._orders,
+            'limit': self._limit,
+            'cursor': self._cursor,
+            'projection': self._projection,
+        }
+        state.update(changes)
+        return FakeQuery(self._client, self._collection, **state)
+
+    def where(self, field_path=None, op_string=None, value=None, *, filter=None) -> 'FakeQuery':
+        if filter is not None:
+            field_path, op_string, value = filter if isinstance(filter, tuple) else (
+                filter.field_path, filter.op_string, filter.value)
+        return self._copy(filters=self._filters + [(field_path, op_string, value)])
+
+    def order_by(self, field_path: str, direction: str = 'ASCENDING') -> 'FakeQuery':
+        return self._copy(orders=self._orders + [(field_path, direction)])
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return self._copy(limit=count)
+
+    def select(self, field_paths) -> 'FakeQuery':
+        return self._copy(projection=list(field_paths))
+
+    def start_after(self, document_fields) -> 'FakeQuery':
+        return self._copy(cursor=document_fields)
+
+    def _matches(self, document_id: str, data: Dict[str, Any]) -> bool:
+        for field_path, op_string, value in self._filters:
+            left = document_id if field_path == DOCUMENT_ID else data.get(field_path)
+            if not _OPERATORS[op_string](left, value):
+                return False
+        return True
+
+    def _sort_key(self, item):
+        document_id, data = item
+        key = []
+        for field_path, _ in self._orders or [(DOCUMENT_ID, 'ASCENDING')]:
+            key.append(document_id if field_path == DOCUMENT_ID else data.get(field_path))
+        return key
+
+    def _cursor_value(self):
+        cursor = self._cursor
+        if isinstance(cursor, FakeDocumentSnapshot):
+            return [cursor.id if field == DOCUMENT_ID else cursor.get(field)
+                    for field, _ in self._orders or [(DOCUMENT_ID, 'ASCENDING')]]
+        if isinstance(cursor, dict):
+            return [cursor.get(field) for field, _ in self._orders]
+        return [cursor]
+
+    def stream(self, transaction=None) -> Iterator[FakeDocumentSnapshot]:
+        items = self._client._scan(self._collection, self._matches)
+        items.sort(key=self._sort_key, reverse=bool(self._orders) and self._orders[0][1] == 'DESCENDING')
+
+        if self._cursor is not None:
+            cursor = self._cursor_value()
+            items = [item for item in items if self._sort_key(item) > cursor]
+        if self._limit is not None:
+            items = items[:self._limit]
+
+        for document_id, data in items:
+            self._client._charge_read()
+            if self._projection is not None:
+                data = {field: data[field] for field in self._projection if field in data}
+            yield FakeDocumentSnapshot(FakeDocumentReference(self._client, self._collection, document_id), data)
+
+    def get(self, transaction=None) -> List[FakeDocumentSnapshot]:
+        return list(self.stream())
+
+
+class FakeCollectionReference(FakeQuery):
+    def __init__(self, client: 'FakeFirestore', collection: str):
+        super().__init__(client, collection)
+
+    @property
+    def id(self) -> str:
+        return self._collection
+
+    def document(self, document_id: str) -> FakeDocumentReference:
+        return FakeDocumentReference(self._client, self._collection, document_id)
+
+
+class FakeWriteBatch:
+    def __init__(self, client: 'FakeFirestore'):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference: FakeDocumentReference, data: Dict[str, Any], merge: bool = False):
+        self._writes.append(lambda: self._client._write_document(reference, data, merge=merge, charge=False))
+        return self
+
+    def update(self, reference: FakeDocumentReference, data: Dict[str, Any]):
+        self._writes.append(lambda: self._client._update_document(reference, data, charge=False))
+        return self
+
+    def delete(self, reference: FakeDocumentReference):
+        self._writes.append(lambda: self._client._delete_document(reference, charge=False))
+        return self
+
+    def commit(self):
+        if len(self._writes) > 500:
+            raise ValueError("Батч Firestore не может содержать больше 500 операций")
+        self._client._charge_request(writes=len(self._writes))
+        with self._client._lock:
+            for write in self._writes:
+                write()
+        self._writes = []
+
+
+class FakeTransaction(FakeWriteBatch):
+    """Оптимистичная транзакция: фиксация отменяется с Aborted, если прочитанный документ успели изменить"""
+
+    _max_attempts = 5
+    _read_only = False
+    _ids = itertools.count(1)
+
+    def __init__(self, client: 'FakeFirestore', max_attempts: int = 5):
+        super().__init__(client)
+        self._max_attempts = max_attempts
+        self._id = None
+        self._read_versions: Dict[str, int] = {}
+
+    def _clean_up(self):
+        self._writes = []
+        self._read_versions = {}
+        self._id = None
+
+    def _begin(self, retry_id=None):
+        self._id = next(self._ids)
+
+    def _record_read(self, reference: FakeDocumentReference, version: int):
+        self._read_versions.setdefault(reference.path, version)
+
+    def _commit(self):
+        self._client._charge_request(writes=len(self._writes))
+        with self._client._lock:
+            for path, version in self._read_versions.items():
+                if self._client._versions.get(path, 0) != version:
+                    self._clean_up()
+                    raise Aborted(f"Документ {path} изменён во время транзакции")
+            for write in self._writes:
+                write()
+        self._clean_up()
+
+    def _rollback(self):
+        self._clean_up()
+
+
+class FakeFirestore:
+    """Хранилище в памяти с интерфейсом клиента Firestore для офлайн-бенчмарков"""
+
+    def __init__(self, latency: float = 0.0):
+        self._latency = latency
+        self._collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.reads = 0
+        self.writes = 0
+        self.requests = 0
+
+    def reset_counters(self) -> None:
+        self.reads = self.writes = self.requests = 0
+
+    def _charge_request(self, reads: int = 0, writes: int = 0) -> None:
+        with self._lock:
+            self.requests += 1
+            self.reads += reads
+            self.writes += writes
+        if self._latency:
+            time.sleep(self._latency)
+
+    def _charge_read(self) -> None:
+        with self._lock:
+            self.reads += 1
+
+    def _scan(self, collection: str, predicate=None):
+        self._charge_request()
+        # Фильтр применяется до копирования: на больших коллекциях копируются только подходящие документы
+        with self._lock:
+            return [(document_id, copy.deepcopy(data)) for document_id, data in self._collections.get(collection, {}).items()
+                    if predicate is None or predicate(document_id, data)]
+
+    def _read_document(self, reference: FakeDocumentReference, transaction=None) -> FakeDocumentSnapshot:
+        self._charge_request(reads=1)
+        with self._lock:
+            data = self._collections.get(reference._collection, {}).get(reference.id)
+            if transaction is not None:
+                transaction._record_read(reference, self._versions.get(reference.path, 0))
+            return FakeDocumentSnapshot(reference, copy.deepcopy(data))
+
+    def _touch(self, reference: FakeDocumentReference) -> None:
+        self._versions[reference.path] = self._versions.get(reference.path, 0) + 1
+
+    def _write_document(self, reference: FakeDocumentReference, data: Dict[str, Any], merge: bool = False,
+                        charge: bool = True) -> None:
+        if charge:
+            self._charge_request(writes=1)
+        with self._lock:
+            documents = self._collections.setdefault(reference._collection, {})
+            if merge and reference.id in documents:
+                documents[reference.id].update(copy.deepcopy(data))
+            else:
+                documents[reference.id] = copy.deepcopy(data)
+            self._touch(reference)
+
+    def _update_document(self, reference: FakeDocumentReference, data: Dict[str, Any], charge: bool = True) -> None:
+        if charge:
+            self._charge_request(writes=1)
+        with self._lock:
+            documents = self._collections.get(reference._collection, {})
+            if reference.id not in documents:
+                raise KeyError(f"Документ {reference.path} не существует")
+            documents[reference.id].update(copy.deepcopy(data))
+            self._touch(reference)
+
+    def _delete_document(self, reference: FakeDocumentReference, charge: bool = True) -> None:
+        if charge:
+            self._charge_request(writes=1)
+        with self._lock:
+            self._collections.get(reference._collection, {}).pop(reference.id, None)
+            self._touch(reference)
+
+    def collection(self, name: str) -> FakeCollectionReference:
+        return FakeCollectionReference(self, name)
+
+    def batch(self) -> FakeWriteBatch:
+        return FakeWriteBatch(self)
+
+    def transaction(self, max_attempts: int = 5) -> FakeTransaction:
+        return FakeTransaction(self, max_attempts)
+
+    def seed(self, collection: str, documents: Dict[str, Dict[str, Any]]) -> None:
+        with self._lock:
+            self._collections.setdefault(collection, {}).update(copy.deepcopy(documents))
+
+    def count(self, collection: str) -> int:
+        return len(self._collections.get(collection, {}))
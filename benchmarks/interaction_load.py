@@ -0,0 +1,362 @@
+"""Синтетическая нагрузка на кнопки, формы и слэш-команды бота.
+
+Прогоняет настоящие ApplyButtonView, ApplicationModal, ApplicationView,
+CaptView и CreateCaptCommand через поддельные взаимодействия Discord
+поверх FakeFirestore и имитации REST API. Считает пропускную способность,
+перцентили времени до ответа, операции хранилища и REST на одно
+взаимодействие, а также нарушения корректности: переполненные группы,
+дубликаты заявок, двойные и пропущенные ответы.
+
+    python -m benchmarks.interaction_load --scenario capt_rush --users 500 --duration 5
+    python -m benchmarks.interaction_load --scenario applications --applications 200 --guilds 50 --approve
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import Counter, defaultdict
+
+import discord
+
+from benchmarks.fake_discord import FakeBot, FakeDiscordHTTP, FakeInteraction
+from benchmarks.fake_firestore import FakeFirestore
+from src.core.command_factory import command_factory
+from src.datastore_metrics import datastore_metrics
+from src.database_firebase import cache_manager, firebase_db
+from src.tracing import tracer
+from src.views import ApplyButtonView
+
+# Discord считает взаимодействие проваленным, если первый ответ не пришёл за 3 секунды
+RESPONSE_DEADLINE = 3.0
+
+OWNER_ID = 1_000_000_000_000_000_001
+
+
+class ErrorCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.records = Counter()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        self.records[record.getMessage()] += 1
+
+
+class LoadRun:
+    def __init__(self, store_latency: float, rest_latency: float):
+        self.db = FakeFirestore(latency=store_latency)
+        self.db.seed('owners', {str(OWNER_ID): {}})
+        self.http = FakeDiscordHTTP(latency=rest_latency)
+        self.bot = FakeBot(self.http)
+
+        # Модули данных бота работают с поддельным хранилищем так же, как с настоящим клиентом
+        firebase_db._db = datastore_metrics.wrap_client(self.db)
+        firebase_db._initialized = True
+        firebase_db._owners = []
+        cache_manager.clear_cache()
+        tracer.reset()
+
+        self.latencies = defaultdict(list)
+        self.violations = Counter()
+        self.interactions = 0
+        self.errors = ErrorCounter()
+        logging.getLogger().addHandler(self.errors)
+
+    def close(self) -> None:
+        logging.getLogger().removeHandler(self.errors)
+
+    def interaction(self, guild, user, **kwargs) -> FakeInteraction:
+        return FakeInteraction(self.bot, guild, user, **kwargs)
+
+    async def _measure(self, name: str, interaction: FakeInteraction, dispatch) -> FakeInteraction:
+        self.interactions += 1
+        start = time.perf_counter()
+        await dispatch
+        if interaction.responded_at is None:
+            self.violations['no_response'] += 1
+        else:
+            latency = interaction.responded_at - start
+            self.latencies[name].append(latency)
+            if latency > RESPONSE_DEADLINE:
+                self.violations['deadline_missed'] += 1
+        if interaction.double_responses:
+            self.violations['double_response'] += interaction.double_responses
+        return interaction
+
+    async def click(self, view, custom_id: str, interaction: FakeInteraction, name: str = None) -> FakeInteraction:
+        item = discord.utils.get(view.children, custom_id=custom_id)
+        interaction.data = {'custom_id': custom_id, 'component_type': 2}
+        # _scheduled_task — та же точка входа, через которую discord.py вызывает колбэки кнопок
+        return await self._measure(name or custom_id, interaction, view._scheduled_task(item, interaction))
+
+    async def submit(self, modal, values: dict, interaction: FakeInteraction) -> FakeInteraction:
+        components = [
+            {'type': 1, 'components': [{'type': 4, 'custom_id': item.custom_id, 'value': values[name]}]}
+            for name, item in ((name, getattr(modal, name)) for name in values)
+        ]
+        interaction.type = discord.InteractionType.modal_submit
+        name = f"{type(modal).__name__}.on_submit"
+        return await self._measure(name, interaction, modal._scheduled_task(interaction, components))
+
+    async def command(self, command, interaction: FakeInteraction, **options) -> FakeInteraction:
+        interaction.type = discord.InteractionType.application_command
+        interaction.data = {'name': command.name}
+
+        async def run():
+            with tracer.interaction(interaction, f"command.{command.name}"):
+                await command.execute(interaction, **options)
+
+        return await self._measure(f"command.{command.name}", interaction, run())
+
+    def report(self, elapsed: float) -> dict:
+        latencies = {}
+        for name, values in self.latencies.items():
+            values.sort()
+            latencies[name] = {
+                'count': len(values),
+                'p50_ms': round(_percentile(values, 0.5) * 1000, 2),
+                'p95_ms': round(_percentile(values, 0.95) * 1000, 2),
+                'p99_ms': round(_percentile(values, 0.99) * 1000, 2),
+                'max_ms': round(values[-1] * 1000, 2)
+            }
+
+        slowest_spans = {}
+        for item in tracer.summary(top_spans=1):
+            if item['spans']:
+                span = item['spans'][0]
+                slowest_spans[item['interaction']] = {'span': span['name'], 'p95_ms': round(span['p95'] * 1000, 2)}
+
+        count = max(self.interactions, 1)
+        if self.errors.records:
+            self.violations['handler_errors'] += sum(self.errors.records.values())
+        return {
+            'interactions': self.interactions,
+            'elapsed_s': round(elapsed, 3),
+            'throughput_per_s': round(self.interactions / elapsed, 1) if elapsed else None,
+            'latency': latencies,
+            'slowest_spans': slowest_spans,
+            'datastore_per_interaction': {
+                'requests': round(self.db.requests / count, 2),
+                'reads': round(self.db.reads / count, 2),
+                'writes': round(self.db.writes / count, 2)
+            },
+            'rest_per_interaction': round(self.http.total / count, 2),
+            'rest_routes': dict(self.http.calls.most_common()),
+            'violations': dict(self.violations),
+            'errors': dict(self.errors.records.most_common(5))
+        }
+
+
+def _percentile(values, q: float) -> float:
+    return values[min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))]
+
+
+def _arrivals(count: int, duration: float, rng: random.Random):
+    return sorted(rng.uniform(0, duration) for _ in range(count))
+
+
+async def _at(offset: float, start: float, coroutine):
+    delay = start + offset - time.perf_counter()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    return await coroutine
+
+
+async def capt_rush(run: LoadRun, args) -> dict:
+    guild = run.bot.add_guild()
+    channel = guild.add_channel()
+    owner = guild.add_member(OWNER_ID)
+
+    created = await run.command(command_factory.create_command('createcapt', run.bot),
+                                run.interaction(guild, owner, channel=channel),
+                                max_members=args.max_members)
+    message = channel.sent[0]
+    run.db.reset_counters()
+    run.http.reset()
+    run.interactions = 0
+    run.latencies.clear()
+
+    async def join(member):
+        # Каждый клик попадает в view, который сейчас висит на сообщении: handle_join заменяет его при обновлении
+        return await run.click(message.view, 'join_capt', run.interaction(guild, member, message=message))
+
+    members = [guild.add_member() for _ in range(args.users)]
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        _at(offset, start, join(member)) for offset, member in zip(_arrivals(args.users, args.duration, rng), members)
+    ))
+    elapsed = max((result.responded_at or start) for result in results) - start
+
+    joined = [result.user.id for result in results
+              if any(embed is not None and embed.title == "🎉 Успешно!" for _, embed in result.messages)]
+    finals = [sent for sent in channel.sent[1:] if sent.embeds and sent.embeds[0].title != "📋 Группа"]
+    if len(joined) > args.max_members:
+        run.violations['overfilled_group'] += len(joined) - args.max_members
+    if len(set(joined)) != len(joined):
+        run.violations['duplicate_member'] += len(joined) - len(set(joined))
+    if len(finals) > 1:
+        run.violations['duplicate_completion'] += len(finals) - 1
+
+    report = run.report(elapsed)
+    report['scenario'] = {
+        'name': 'capt_rush', 'users': args.users, 'duration_s': args.duration, 'max_members': args.max_members,
+        'joined': len(joined), 'create_command_responded': created.responded_at is not None
+    }
+    return report
+
+
+def _form_values(index: int) -> dict:
+    return {
+        'name': f"Игрок {index}",
+        'age': str(18 + index % 20),
+        'families': "Нигде не был",
+        'favorite': "Каптить",
+        'expectations': "Дружную семью"
+    }
+
+
+async def applications(run: LoadRun, args) -> dict:
+    guilds = []
+    for _ in range(args.guilds):
+        guild = run.bot.add_guild()
+        form_channel, approv_channel = guild.add_channel(), guild.add_channel()
+        approver_role, approved_role = guild.add_role(position=5), guild.add_role(position=2)
+        run.db.seed('guild_settings', {str(guild.id): {
+            'form_channel_id': str(form_channel.id),
+            'approv_channel_id': str(approv_channel.id),
+            'approver_role_id': str(approver_role.id),
+            'approved_role_id': str(approved_role.id)
+        }})
+        reviewer = guild.add_member(roles=[approver_role])
+        guilds.append((guild, approv_channel, approved_role, reviewer))
+
+    # Одна постоянная view на все формы, как после восстановления в main
+    apply_view = ApplyButtonView(run.bot)
+    rng = random.Random(args.seed)
+
+    async def apply(index: int, guild, applicant):
+        click = await run.click(apply_view, 'apply_button', run.interaction(guild, applicant))
+        if click.modal is None:
+            return click
+        return await run.submit(click.modal, _form_values(index), run.interaction(guild, applicant))
+
+    jobs = []
+    applicants = []
+    for index in range(args.applications):
+        guild, *_ = guilds[index % len(guilds)]
+        applicant = guild.add_member()
+        applicants.append((guild, applicant))
+        jobs.append(apply(index, guild, applicant))
+        # Часть пользователей нажимает кнопку дважды, пока первая форма ещё не отправлена
+        if rng.random() < args.double_click_rate:
+            jobs.append(apply(index, guild, applicant))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(
+        _at(offset, start, job) for offset, job in zip(_arrivals(len(jobs), args.duration, rng), jobs)
+    ))
+    elapsed = time.perf_counter() - start
+
+    stored = Counter(document['applicant_id'] for _, document in run.db._scan('applications'))
+    submitted = Counter(str(result.user.id) for result in results
+                        if result.type == discord.InteractionType.modal_submit
+                        and any(content == "Заявка в семью успешно отправлена!" for content, _ in result.messages))
+    for applicant_id, count in stored.items():
+        if count > 1:
+            run.violations['duplicate_application'] += count - 1
+    for applicant_id in submitted:
+        if applicant_id not in stored:
+            run.violations['lost_application'] += 1
+
+    approved = 0
+    if args.approve:
+        approvals = []
+        for guild, approv_channel, approved_role, reviewer in guilds:
+            for message in list(approv_channel.messages.values()):
+                approvals.append(run.click(
+                    message.view, f"approve_{message.id}", run.interaction(guild, reviewer, message=message),
+                    name='approve'))
+        approve_start = time.perf_counter()
+        await asyncio.gather(*approvals)
+        elapsed += time.perf_counter() - approve_start
+        approved = len(approvals)
+
+        if run.db.count('applications'):
+            run.violations['application_left_after_approve'] += run.db.count('applications')
+        for guild, applicant in applicants:
+            role = next(item for item in guilds if item[0] is guild)[2]
+            if str(applicant.id) in stored and role not in applicant.roles:
+                run.violations['role_not_assigned'] += 1
+
+    report = run.report(elapsed)
+    report['scenario'] = {
+        'name': 'applications', 'applications': args.applications, 'guilds': args.guilds,
+        'duration_s': args.duration, 'double_click_rate': args.double_click_rate,
+        'stored': sum(stored.values()), 'approved': approved
+    }
+    return report
+
+
+SCENARIOS = {
+    'capt_rush': capt_rush,
+    'applications': applications
+}
+
+
+async def main(args):
+    run = LoadRun(args.store_latency_ms / 1000, args.rest_latency_ms / 1000)
+    try:
+        report = await SCENARIOS[args.scenario](run, args)
+    finally:
+        run.close()
+
+    if args.json:
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        return
+
+    scenario = report['scenario']
+    print(f"Сценарий: {scenario['name']} • {json.dumps({k: v for k, v in scenario.items() if k != 'name'}, ensure_ascii=False)}")
+    print(f"Взаимодействий: {report['interactions']} за {report['elapsed_s']} с "
+          f"({report['throughput_per_s']} в секунду)")
+    print(f"{'взаимодействие':>28} {'шт.':>6} {'p50, мс':>9} {'p95, мс':>9} {'p99, мс':>9} {'макс, мс':>9}")
+    for name, stats in report['latency'].items():
+        print(f"{name:>28} {stats['count']:>6} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+              f"{stats['p99_ms']:>9} {stats['max_ms']:>9}")
+    for name, span in report['slowest_spans'].items():
+        print(f"  {name}: дольше всего {span['span']} (p95 {span['p95_ms']} мс)")
+    store = report['datastore_per_interaction']
+    print(f"Firestore на взаимодействие: запросов {store['requests']}, чтений {store['reads']}, записей {store['writes']}")
+    print(f"REST на взаимодействие: {report['rest_per_interaction']}")
+    if report['violations']:
+        print("Нарушения:")
+        for name, count in report['violations'].items():
+            print(f"  {name}: {count}")
+        for message, count in report['errors'].items():
+            print(f"  ошибка «{message}»: {count}")
+    else:
+        print("Нарушений не обнаружено")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='capt_rush')
+    parser.add_argument('--users', type=int, default=500, help='capt_rush: сколько пользователей жмут «Присоединиться»')
+    parser.add_argument('--max-members', type=int, default=10, help='capt_rush: размер группы')
+    parser.add_argument('--applications', type=int, default=200, help='applications: число заявок')
+    parser.add_argument('--guilds', type=int, default=50, help='applications: число серверов')
+    parser.add_argument('--double-click-rate', type=float, default=0.1,
+                        help='applications: доля пользователей, дважды нажимающих «Подать заявку»')
+    parser.add_argument('--approve', action='store_true', help='applications: одобрить все заявки после подачи')
+    parser.add_argument('--duration', type=float, default=5.0, help='за сколько секунд приходит вся нагрузка')
+    parser.add_argument('--store-latency-ms', type=float, default=5.0, help='задержка одного запроса к хранилищу')
+    parser.add_argument('--rest-latency-ms', type=float, default=50.0, help='задержка одного запроса к Discord')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='вывести результаты в JSON')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main(parse_args()))
@@ -1,6 +1,7 @@
 import discord
 from discord.ext import commands
 import asyncio
+import logging
 import os
 
 from dotenv import load_dotenv
@@ -12,17 +13,40 @@ from src.database_firebase import (
     init_owners,
     sync_approver_role,
     applications_cache,
-    owners_cache
+    get_approver_role_id
 )
 from src.views import ApplyButtonView, ApplicationView
+from src.cluster import ClusterLauncher, cluster_client_from_env
 from src.commands_new import CommandsModule
+from src.server_manager import APIServerManager, EmbeddedAPIServer, ServerConfig
 from src.utils import clear_old_states
+from src.loop_monitor import loop_monitor, start_loop_monitor
+from src.memory import memory_reporter, start_tracemalloc
+from src.review_locks import review_locks
+from src.sharding import ShardConfig, create_bot, shard_monitor
+from src.tracing import TracedCommandTree, tracer
+from src.metrics import metrics_registry
+from src.log import setup_logging, shutdown_logging
+
+logger = logging.getLogger('bot')
 
 class BotManager:
     def __init__(self):
         self.intents = discord.Intents.default()
         self.bot_token = os.getenv('BOT_TOKEN')
-        self.bot = commands.Bot(command_prefix='/', intents=self.intents)
+        self.shard_config = ShardConfig.from_env()
+        self.bot = create_bot(self.shard_config, command_prefix='/', intents=self.intents, tree_cls=TracedCommandTree)
+        shard_monitor.attach(self.bot)
+        self.cluster_client = cluster_client_from_env()
+        if self.cluster_client is not None:
+            # Очередь IDENTIFY общая для всех процессов кластера, её ведёт брокер
+            self.bot.before_identify_hook = self.cluster_client.before_identify
+        tracer.instrument_http(self.bot.http)
+        memory_reporter.register('persistent_views', lambda: self.bot.persistent_views)
+        self.api_config = ServerConfig()
+        self.api_server = None
+        self._ready_handled = False
+        self._cleanup_task = None
         self._setup_events()
 
     def _setup_events(self):
@@ -35,28 +59,35 @@ class BotManager:
             await self._handle_command_error(interaction, error)
 
     async def _handle_ready(self):
+        # on_ready повторяется после переподключений шлюза: данные, view, команды и задачи поднимаются один раз
+        if self._ready_handled:
+            logger.info("Повторный on_ready, инициализация пропущена")
+            return
+        self._ready_handled = True
+        logger.info("Бот готов", extra={'guilds': len(self.bot.guilds), 'sharding': self.shard_config.describe()})
+
         try:
             await self._initialize_data()
-        except Exception as e:
-            print(f"❌ Ошибка при инициализации данных: {e}")
+        except Exception:
+            logger.exception("Ошибка при инициализации данных")
         
         self._add_persistent_views()
         await self._restore_application_views()
         
         try:
             await self._setup_commands()
-        except Exception as e:
-            print(f'❌ Ошибка при настройке команд: {e}')
+        except Exception:
+            logger.exception("Ошибка при настройке команд")
         
         try:
             await self._sync_commands()
-        except Exception as e:
-            print(f'❌ Ошибка синхронизации команд: {e}')
+        except Exception:
+            logger.exception("Ошибка синхронизации команд")
         
         try:
             self._start_cleanup_task()
-        except Exception as e:
-            print(f'❌ Ошибка при запуске задачи очистки: {e}')
+        except Exception:
+            logger.exception("Ошибка при запуске задачи очистки")
 
     async def _initialize_data(self):
         init_settings()
@@ -74,15 +105,17 @@ class BotManager:
             if not app_cache:
                 return
             
+            restored = 0
+            
             for guild_id, applications in app_cache.items():
                 guild = self.bot.get_guild(int(guild_id))
                 if not guild:
                     continue
                 
                 for message_id, app_data in applications.items():
-                    channel = guild.get_channel(int(app_data['channel_id']))
+                    channel = guild.get_channel(int(app_data.channel_id))
                     if not channel:
-                        print(f"⚠️ Канал не найден для заявки {message_id}, пропускаем")
+                        logger.warning("Канал заявки не найден, пропускаем", extra={'message_id': message_id})
                         continue
                     
                     try:
@@ -100,31 +133,33 @@ class BotManager:
                         # Восстанавливаем view только для необработанных заявок
                         if not is_processed:
                             view = ApplicationView(
-                                applicant_id=app_data['applicant_id'], 
+                                applicant_id=app_data.applicant_id, 
                                 message_id=message_id, 
                                 guild_id=int(guild_id), 
                                 bot=self.bot
                             )
                             self.bot.add_view(view)
-                            print(f"✅ Восстановлено view для заявки {message_id}")
+                            restored += 1
+                            logger.info("Восстановлено view заявки", extra={'sample': 'view_restored', 'message_id': message_id})
                         else:
-                            print(f"⚠️ Заявка {message_id} уже обработана модератором")
+                            logger.info("Заявка уже обработана модератором", extra={'sample': 'view_processed', 'message_id': message_id})
                         
                     except discord.NotFound:
-                        print(f"⚠️ Сообщение заявки {message_id} не найдено в чате")
+                        logger.warning("Сообщение заявки не найдено в чате", extra={'message_id': message_id})
                         
                     except discord.Forbidden:
-                        print(f"⚠️ Нет доступа к каналу для заявки {message_id}")
+                        logger.warning("Нет доступа к каналу заявки", extra={'message_id': message_id})
                         
-                    except Exception as e:
-                        print(f"❌ Ошибка при проверке сообщения {message_id}: {e}")
+                    except Exception:
+                        logger.exception("Ошибка при проверке сообщения заявки", extra={'message_id': message_id})
                         
                     await asyncio.sleep(0.1)
+            
+            metrics_registry.gauge(
+                'persistent_views_restored', 'View заявок, восстановленные при запуске').set(restored)
                         
-        except Exception as e:
-            print(f"❌ Критическая ошибка восстановления заявок: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Критическая ошибка восстановления заявок")
 
     def _create_embed_from_data(self, embed_data):
         embed = discord.Embed(
@@ -141,12 +176,10 @@ class BotManager:
         return embed
 
     def _create_content(self, app_data, guild, guild_id):
-        guild_id_str = str(guild_id)
-        owner_data = owners_cache()
-        approver_role_id = owner_data.get('approver_role_ids', {}).get(guild_id_str)
-        role = guild.get_role(int(approver_role_id)) if approver_role_id else None
+        approver_role_id = get_approver_role_id(guild_id)
+        role = guild.get_role(approver_role_id) if approver_role_id else None
         mention = role.mention if role else "@everyone"
-        return f"{mention} <@{app_data['applicant_id']}>"
+        return f"{mention} <@{app_data.applicant_id}>"
 
     async def _setup_commands(self):
         commands_module = CommandsModule(self.bot)
@@ -156,11 +189,13 @@ class BotManager:
         synced = await self.bot.tree.sync()
 
     def _start_cleanup_task(self):
-        self.bot.loop.create_task(clear_old_states())
+        # Очистка состояний общая для всех шардов процесса: одна задача, а не по одной на шард
+        if self._cleanup_task is None or self._cleanup_task.done():
+            self._cleanup_task = self.bot.loop.create_task(clear_old_states())
 
     async def _handle_command_error(self, interaction: discord.Interaction, error: discord.app_commands.AppCommandError):
         if interaction.response.is_done():
-            print(f"Interaction уже обработан: {error}")
+            logger.warning("Interaction уже обработан", extra={'error': str(error)})
             return
             
         if isinstance(error, discord.app_commands.MissingPermissions):
@@ -172,23 +207,77 @@ class BotManager:
             
             from src.database_firebase import is_owner
             
-            if command_name in ['sync', 'manageroles'] and not is_owner(interaction.user.id):
+            if command_name in ['sync', 'manageroles', 'perf'] and not is_owner(interaction.user.id):
                 await interaction.response.send_message("❌ Эта команда доступна только владельцам бота.", ephemeral=True)
             else:
                 await interaction.response.send_message(f"❌ У вас нет прав для использования команды `/{command_name}`. Обратитесь к администрации.", ephemeral=True)
         else:
             await interaction.response.send_message("❌ Произошла ошибка при выполнении команды.", ephemeral=True)
-            print(f"Ошибка команды: {error}")
+            logger.error("Ошибка команды", exc_info=error, extra={'command': interaction.command.name if interaction.command else None})
+
+    async def _start_api(self):
+        mode = self.api_config.api_mode
+        if mode == 'embedded':
+            self.api_server = EmbeddedAPIServer(self.api_config)
+            await self.api_server.start()
+        elif mode == 'subprocess':
+            self.api_server = APIServerManager(self.api_config)
+            await self.api_server.start()
+
+    async def _stop_api(self):
+        if self.api_server is not None:
+            await self.api_server.stop()
+        self.api_server = None
+
+    async def _run(self):
+        async with self.bot:
+            # Монитор стартует первым, чтобы видеть блокировки уже при загрузке данных в on_ready
+            start_loop_monitor()
+            if start_tracemalloc():
+                logger.info("tracemalloc включён: отчёт о памяти покажет места аллокаций")
+            # API поднимается до логина бота и живёт в том же цикле событий
+            await self._start_api()
+            shard_monitor.start()
+            if self.cluster_client is not None:
+                await self.cluster_client.start()
+            try:
+                await self.bot.start(self.bot_token)
+            finally:
+                if self.cluster_client is not None:
+                    await self.cluster_client.stop()
+                await shard_monitor.stop()
+                await review_locks.close()
+                await self._stop_api()
+                await loop_monitor.stop()
 
     def run(self):
-        self.bot.run(self.bot_token)
+        setup_logging()
+        try:
+            asyncio.run(self._run())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            shutdown_logging()
+
+class ClusterManager:
+    def __init__(self):
+        self.launcher = ClusterLauncher.from_env()
+
+    def run(self):
+        setup_logging()
+        try:
+            asyncio.run(self.launcher.run())
+        finally:
+            shutdown_logging()
 
 class Application:
     def __init__(self):
-        self.bot_manager = BotManager()
+        # CLUSTER_PROCESSES > 1 запускает лаунчер; процессы, которые он порождает, получают CLUSTER_ID и работают как бот
+        clustered = int(os.getenv('CLUSTER_PROCESSES', 1)) > 1 and os.getenv('CLUSTER_ID') is None
+        self.manager = ClusterManager() if clustered else BotManager()
 
     def run(self):
-        self.bot_manager.run()
+        self.manager.run()
 
 if __name__ == "__main__":
     app = Application()
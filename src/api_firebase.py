@@ -1,11 +1,70 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Iterator, Sequence, Tuple
 import firebase_admin
 from firebase_admin import credentials, firestore
+import anyio
+import asyncio
+import hashlib
+import itertools
 import json
 import os
+import threading
+import time
+from src.blacklist_io import MAX_IMPORT_BYTES, PartialImportError, chunked, detect_format, parse_entries, serialize
+from src.cache import cache_registry
+from src.change_feed import ChangeFeed, FeedOverflow
+from src.datastore_metrics import datastore_metrics, instrumented
+from src import events
+from src.events import ChangeEvent, data_change_bus
+from src.log import setup_logging
+from src.loop_monitor import loop_monitor, start_loop_monitor
+from src.memory import memory_reporter
+from src.tracing import tracer
+from src.metrics import metrics_registry
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+DOCUMENT_ID = '__name__'
+MAX_PAGE_SIZE = 1000
+NDJSON_MEDIA_TYPE = 'application/x-ndjson'
+NDJSON_CHUNK_SIZE = 100
+SSE_HEARTBEAT_INTERVAL = 15.0
+SSE_RETRY_MS = 2000
+FEED_COLLECTIONS = frozenset((events.SETTINGS, events.APPLICATIONS, events.BLACKLIST, events.CAPTS,
+                              events.ROLE_PERMISSIONS))
+
+SETTINGS_FIELDS = ('form_channel_id', 'approv_channel_id', 'approver_role_id', 'approved_role_id',
+                   'blacklist_report_channel_id')
+APPLICATION_FIELDS = ('channel_id', 'applicant_id', 'embed_data')
+BLACKLIST_FIELDS = ('reason', 'reporter_id', 'timestamp', 'static_id')
+
+
+def encode_json(data: Any) -> bytes:
+    # Сложные типы (модели, даты Firestore) уходят в jsonable_encoder только при встрече, без обхода всего дерева
+    if orjson is not None:
+        return orjson.dumps(data, default=jsonable_encoder, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        data, default=jsonable_encoder, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    ).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return encode_json(content)
 
 class GuildSettings(BaseModel):
     form_channel_id: Optional[str] = None
@@ -31,9 +90,9 @@ class BlacklistEntry(BaseModel):
     static_id: Optional[str] = None
 
 class FirebaseManager:
-    def __init__(self):
-        self._db = None
-        self._initialize_firebase()
+    def __init__(self, db=None):
+        self._db = datastore_metrics.wrap_client(db) if db is not None else None
+        self._lock = threading.Lock()
     
     def _initialize_firebase(self):
         if not firebase_admin._apps:
@@ -41,26 +100,63 @@ class FirebaseManager:
             if os.path.exists(cred_path):
                 cred = credentials.Certificate(cred_path)
                 firebase_admin.initialize_app(cred)
-        self._db = firestore.client()
+        self._db = datastore_metrics.wrap_client(firestore.client())
     
     @property
     def db(self):
+        # Клиент создаётся при первом обращении: запросы идут из пула потоков
+        if self._db is None:
+            with self._lock:
+                if self._db is None:
+                    self._initialize_firebase()
         return self._db
 
 class BaseRepository:
-    def __init__(self, firebase_manager: FirebaseManager):
+    def __init__(self, firebase_manager: FirebaseManager, cache_manager=None):
         self._firebase_manager = firebase_manager
+        # CacheManager бота во встроенном режиме: чтения целиком идут через его кэши, без отдельных запросов API
+        self._cache_manager = cache_manager
     
     @property
     def db(self):
         return self._firebase_manager.db
+    
+    @staticmethod
+    def _page(items: Iterator[Tuple[str, Any]], limit: int) -> Dict[str, Any]:
+        # Запрашивается на один документ больше, чтобы знать, есть ли следующая страница
+        page = {}
+        last_key = None
+        for key, value in items:
+            if len(page) == limit:
+                return {'items': page, 'next_start_after': last_key}
+            page[key] = value
+            last_key = key
+        return {'items': page, 'next_start_after': None}
+    
+    @staticmethod
+    def _primed(items: Iterator[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+        # stream() ленивый: первый документ читается сразу, чтобы запрос ушёл в Firestore внутри операции
+        # и его ошибка всплыла до отправки заголовков ответа
+        first = next(items, None)
+        if first is None:
+            return iter(())
+        return itertools.chain((first,), items)
 
 class GuildSettingsRepository(BaseRepository):
-    def __init__(self, firebase_manager: FirebaseManager):
-        super().__init__(firebase_manager)
+    def __init__(self, firebase_manager: FirebaseManager, cache_manager=None):
+        super().__init__(firebase_manager, cache_manager)
         self._collection_name = 'guild_settings'
     
+    @instrumented
     def get_settings(self, guild_id: str) -> Dict[str, Any]:
+        if self._cache_manager is not None:
+            settings = self._cache_manager.load_settings(guild_id)
+            # Firestore хранит id строками, запись кэша — числами
+            return {
+                field: str(getattr(settings, field))
+                for field in SETTINGS_FIELDS if getattr(settings, field) is not None
+            }
+        
         doc_ref = self.db.collection(self._collection_name).document(guild_id)
         doc = doc_ref.get()
         
@@ -72,6 +168,7 @@ class GuildSettingsRepository(BaseRepository):
         settings.pop('updated_at', None)
         return settings
     
+    @instrumented
     def update_settings(self, guild_id: str, settings: GuildSettings) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(guild_id)
         current_doc = doc_ref.get()
@@ -98,40 +195,85 @@ class GuildSettingsRepository(BaseRepository):
         
         return {"status": "success"}
     
-    def get_all_settings(self) -> Dict[str, Any]:
-        settings_ref = self.db.collection(self._collection_name)
-        docs = settings_ref.stream()
-        
-        all_settings = {}
+    def _settings_query(self, limit: Optional[int] = None, start_after: Optional[str] = None,
+                        fields: Optional[Sequence[str]] = None):
+        query = self.db.collection(self._collection_name).order_by(DOCUMENT_ID)
+        if fields is not None:
+            query = query.select(list(fields))
+        if start_after is not None:
+            query = query.start_after({DOCUMENT_ID: start_after})
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+    
+    @staticmethod
+    def _settings_items(docs) -> Iterator[Tuple[str, Any]]:
         for doc in docs:
             settings = doc.to_dict()
             settings.pop('created_at', None)
             settings.pop('updated_at', None)
-            all_settings[doc.id] = settings
-        
-        return all_settings
+            yield doc.id, settings
+    
+    @instrumented
+    def get_all_settings(self, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        if self._cache_manager is not None:
+            all_settings = self._cache_manager.load_settings_cache()
+            return {
+                guild_id: self._project(all_settings[guild_id], fields) for guild_id in sorted(all_settings)
+            }
+        return dict(self._settings_items(self._settings_query(fields=fields).stream()))
+    
+    @staticmethod
+    def _project(settings: Dict[str, Any], fields: Optional[Sequence[str]]) -> Dict[str, Any]:
+        # Документы из кэша общие с ботом: всегда копия, как и select() в Firestore, без отсутствующих полей
+        if fields is not None:
+            return {field: settings[field] for field in fields if field in settings}
+        return {key: value for key, value in settings.items() if key not in ('created_at', 'updated_at')}
+    
+    @instrumented
+    def get_settings_page(self, limit: int, start_after: Optional[str] = None,
+                          fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        return self._page(self._settings_items(self._settings_query(limit + 1, start_after, fields).stream()), limit)
+    
+    @instrumented
+    def stream_settings(self, limit: Optional[int] = None, start_after: Optional[str] = None,
+                        fields: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, Any]]:
+        # Первый документ читается внутри операции, остальные дочитываются лениво при отправке ответа
+        return self._primed(self._settings_items(self._settings_query(limit, start_after, fields).stream()))
 
 class ApplicationsRepository(BaseRepository):
-    def __init__(self, firebase_manager: FirebaseManager):
-        super().__init__(firebase_manager)
+    def __init__(self, firebase_manager: FirebaseManager, cache_manager=None):
+        super().__init__(firebase_manager, cache_manager)
         self._collection_name = 'applications'
     
-    def get_guild_applications(self, guild_id: str) -> Dict[str, Any]:
+    @instrumented
+    def get_guild_applications(self, guild_id: str, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        # Кэш бота хранит заявки без embed_data: из него отдаются только проекции без этого поля
+        if self._cache_manager is not None and fields is not None and 'embed_data' not in fields:
+            records = self._cache_manager.load_guild_applications(guild_id)
+            return {
+                message_id: {field: getattr(record, field) for field in fields}
+                for message_id, record in records.items()
+            }
+        
         applications_ref = self.db.collection(self._collection_name)
         query = applications_ref.where('guild_id', '==', guild_id)
+        if fields is not None:
+            # Без embed_data в проекции Firestore не передаёт самые тяжёлые поля заявок
+            query = query.select(['message_id', *fields])
         docs = query.stream()
         
         applications = {}
         for doc in docs:
             data = doc.to_dict()
+            # Старые документы могут не содержать поле, добавленное позже: как и в черном списке, оно отдаётся как null
             applications[data['message_id']] = {
-                'channel_id': data['channel_id'],
-                'applicant_id': data['applicant_id'],
-                'embed_data': data['embed_data']
+                field: data.get(field) for field in (fields if fields is not None else APPLICATION_FIELDS)
             }
         
         return applications
     
+    @instrumented
     def create_application(self, guild_id: str, message_id: str, application: Application) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{message_id}")
         doc_ref.set({
@@ -145,6 +287,7 @@ class ApplicationsRepository(BaseRepository):
         
         return {"status": "success"}
     
+    @instrumented
     def delete_application(self, guild_id: str, message_id: str) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{message_id}")
         doc_ref.delete()
@@ -152,10 +295,11 @@ class ApplicationsRepository(BaseRepository):
         return {"status": "success"}
 
 class CaptsRepository(BaseRepository):
-    def __init__(self, firebase_manager: FirebaseManager):
-        super().__init__(firebase_manager)
+    def __init__(self, firebase_manager: FirebaseManager, cache_manager=None):
+        super().__init__(firebase_manager, cache_manager)
         self._collection_name = 'capts'
     
+    @instrumented
     def get_capt(self, guild_id: str, message_id: str) -> Dict[str, Any]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{message_id}")
         doc = doc_ref.get()
@@ -170,6 +314,7 @@ class CaptsRepository(BaseRepository):
             'current_members': data.get('current_members', [])
         }
     
+    @instrumented
     def create_capt(self, guild_id: str, message_id: str, capt: Capt) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{message_id}")
         doc_ref.set({
@@ -184,12 +329,14 @@ class CaptsRepository(BaseRepository):
         
         return {"status": "success"}
     
+    @instrumented
     def delete_capt(self, guild_id: str, message_id: str) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{message_id}")
         doc_ref.delete()
         
         return {"status": "success"}
     
+    @instrumented
     def add_member(self, guild_id: str, message_id: str, member_id: str) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{message_id}")
         doc = doc_ref.get()
@@ -209,6 +356,7 @@ class CaptsRepository(BaseRepository):
         
         return {"status": "success"}
     
+    @instrumented
     def remove_member(self, guild_id: str, message_id: str, member_id: str) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{message_id}")
         doc = doc_ref.get()
@@ -229,27 +377,77 @@ class CaptsRepository(BaseRepository):
         return {"status": "success"}
 
 class BlacklistRepository(BaseRepository):
-    def __init__(self, firebase_manager: FirebaseManager):
-        super().__init__(firebase_manager)
+    def __init__(self, firebase_manager: FirebaseManager, cache_manager=None):
+        super().__init__(firebase_manager, cache_manager)
         self._collection_name = 'blacklist'
     
-    def get_guild_blacklist(self, guild_id: str) -> Dict[str, Any]:
-        blacklist_ref = self.db.collection(self._collection_name)
-        query = blacklist_ref.where('guild_id', '==', guild_id)
-        docs = query.stream()
-        
-        blacklist = {}
+    def _blacklist_query(self, guild_id: str, limit: Optional[int] = None, start_after: Optional[str] = None,
+                         fields: Optional[Sequence[str]] = None):
+        # Сортировка по id документа ({guild_id}_{user_id}) не требует составного индекса
+        query = self.db.collection(self._collection_name).where('guild_id', '==', guild_id).order_by(DOCUMENT_ID)
+        if fields is not None:
+            query = query.select(['user_id', *fields])
+        if start_after is not None:
+            query = query.start_after({DOCUMENT_ID: f"{guild_id}_{start_after}"})
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+    
+    @staticmethod
+    def _blacklist_items(docs, fields: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, Any]]:
         for doc in docs:
             data = doc.to_dict()
-            blacklist[data['user_id']] = {
-                'reason': data['reason'],
-                'reporter_id': data['reporter_id'],
-                'timestamp': data['timestamp'],
-                'static_id': data.get('static_id')
+            yield data['user_id'], {
+                field: data.get(field) for field in (fields if fields is not None else BLACKLIST_FIELDS)
             }
-        
-        return blacklist
     
+    @instrumented
+    def get_guild_blacklist(self, guild_id: str, fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        if self._cache_manager is not None:
+            blacklist = self._cache_manager.load_blacklist(guild_id)
+            return {
+                user_id: {field: blacklist[user_id].get(field) for field in (fields or BLACKLIST_FIELDS)}
+                for user_id in sorted(blacklist)
+            }
+        return dict(self._blacklist_items(self._blacklist_query(guild_id, fields=fields).stream(), fields))
+    
+    @instrumented
+    def get_blacklist_page(self, guild_id: str, limit: int, start_after: Optional[str] = None,
+                           fields: Optional[Sequence[str]] = None) -> Dict[str, Any]:
+        docs = self._blacklist_query(guild_id, limit + 1, start_after, fields).stream()
+        return self._page(self._blacklist_items(docs, fields), limit)
+    
+    @instrumented
+    def stream_blacklist(self, guild_id: str, limit: Optional[int] = None, start_after: Optional[str] = None,
+                         fields: Optional[Sequence[str]] = None) -> Iterator[Tuple[str, Any]]:
+        docs = self._blacklist_query(guild_id, limit, start_after, fields).stream()
+        return self._primed(self._blacklist_items(docs, fields))
+    
+    @instrumented
+    def bulk_add(self, guild_id: str, entries: List[Dict[str, Optional[str]]]) -> int:
+        collection = self.db.collection(self._collection_name)
+        written = 0
+        try:
+            for chunk in chunked(entries):
+                batch = self.db.batch()
+                for entry in chunk:
+                    batch.set(collection.document(f"{guild_id}_{entry['user_id']}"), {
+                        'guild_id': guild_id,
+                        'user_id': entry['user_id'],
+                        'reason': entry['reason'],
+                        'reporter_id': entry['reporter_id'] or '',
+                        'timestamp': entry['timestamp'] or str(int(time.time())),
+                        'static_id': entry['static_id'],
+                        'created_at': firestore.SERVER_TIMESTAMP
+                    })
+                batch.commit()
+                written += len(chunk)
+        except Exception as e:
+            # Пакеты коммитятся по отдельности: уже записанные не откатываются
+            raise PartialImportError(written, len(entries)) from e
+        return written
+    
+    @instrumented
     def add_to_blacklist(self, guild_id: str, user_id: str, entry: BlacklistEntry) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{user_id}")
         doc_ref.set({
@@ -264,6 +462,7 @@ class BlacklistRepository(BaseRepository):
         
         return {"status": "success"}
     
+    @instrumented
     def remove_from_blacklist(self, guild_id: str, user_id: str) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(f"{guild_id}_{user_id}")
         doc_ref.delete()
@@ -271,11 +470,15 @@ class BlacklistRepository(BaseRepository):
         return {"status": "success"}
 
 class OwnersRepository(BaseRepository):
-    def __init__(self, firebase_manager: FirebaseManager):
-        super().__init__(firebase_manager)
+    def __init__(self, firebase_manager: FirebaseManager, cache_manager=None):
+        super().__init__(firebase_manager, cache_manager)
         self._collection_name = 'owners'
     
+    @instrumented
     def get_owners(self) -> Dict[str, List[str]]:
+        if self._cache_manager is not None:
+            return {"owners": list(self._cache_manager.load_owners())}
+        
         owners_ref = self.db.collection(self._collection_name)
         docs = owners_ref.stream()
         
@@ -285,6 +488,7 @@ class OwnersRepository(BaseRepository):
         
         return {"owners": owners}
     
+    @instrumented
     def add_owner(self, user_id: str) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(user_id)
         doc = doc_ref.get()
@@ -298,20 +502,156 @@ class OwnersRepository(BaseRepository):
         
         return {"status": "success"}
     
+    @instrumented
     def remove_owner(self, user_id: str) -> Dict[str, str]:
         doc_ref = self.db.collection(self._collection_name).document(user_id)
         doc_ref.delete()
         
         return {"status": "success"}
 
+class MetricsMiddleware:
+    def __init__(self, app, registry=metrics_registry):
+        self._app = app
+        self._requests = registry.counter(
+            'http_requests_total', 'HTTP-запросы к API', ('method', 'route', 'status'))
+        self._latency = registry.histogram(
+            'http_request_duration_seconds', 'Длительность HTTP-запросов', ('method', 'route'))
+        self._in_flight = registry.gauge(
+            'http_requests_in_flight', 'Запросы, обрабатываемые в данный момент')
+    
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self._app(scope, receive, send)
+            return
+        
+        status_code = 500
+        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message['type'] == 'http.response.start':
+                status_code = message['status']
+            await send(message)
+        
+        self._in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self._app(scope, receive, send_wrapper)
+        finally:
+            self._in_flight.dec()
+            # Шаблон маршрута вместо фактического пути, чтобы не плодить метки по guild_id
+            route = scope.get('route')
+            route_path = getattr(route, 'path', 'unmatched')
+            method = scope.get('method', '')
+            self._requests.inc(method=method, route=route_path, status=status_code)
+            self._latency.observe(time.perf_counter() - start, method=method, route=route_path)
+
+class HealthChecker:
+    def __init__(self, firebase_manager: FirebaseManager, check_interval: float = 5.0):
+        self._firebase_manager = firebase_manager
+        self._check_interval = check_interval
+        self._last_check = 0.0
+        self._last_result = None
+    
+    @instrumented(name='HealthChecker.ping_firestore')
+    def _ping_firestore(self) -> Dict[str, Any]:
+        start = time.perf_counter()
+        try:
+            list(self._firebase_manager.db.collection('owners').limit(1).stream())
+            return {'reachable': True, 'latency_ms': round((time.perf_counter() - start) * 1000, 2)}
+        except Exception as e:
+            return {'reachable': False, 'error': str(e)}
+    
+    def _cache_warmth(self) -> Dict[str, Any]:
+        namespaces = {
+            name: {'entries': stats['size'], 'hit_ratio': stats['hit_ratio']}
+            for name, stats in cache_registry.stats().items()
+        }
+        return {
+            'warm': any(stats['entries'] > 0 for stats in namespaces.values()),
+            'namespaces': namespaces
+        }
+    
+    def check(self) -> Dict[str, Any]:
+        # Результат проверки Firestore переиспользуется, чтобы частые health-запросы не тратили чтения
+        now = time.monotonic()
+        if self._last_result is None or now - self._last_check >= self._check_interval:
+            self._last_result = self._ping_firestore()
+            self._last_check = now
+        
+        return {
+            'ready': self._last_result['reachable'],
+            'firestore': self._last_result,
+            'cache': self._cache_warmth()
+        }
+
+class CachedResponse:
+    __slots__ = ('body', 'etag')
+    
+    def __init__(self, body: bytes, etag: str):
+        self.body = body
+        self.etag = etag
+    
+    @classmethod
+    def from_data(cls, data: Any) -> 'CachedResponse':
+        body = encode_json(data)
+        # Слабый тег: при сжатии меняется представление, но не содержимое
+        return cls(body, f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"')
+    
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        etag = self.etag.removeprefix('W/')
+        candidates = [tag.strip() for tag in if_none_match.split(',')]
+        return '*' in candidates or any(tag.removeprefix('W/') == etag for tag in candidates)
+
+class ResponseCache:
+    def __init__(self, registry=cache_registry):
+        self._cache = registry.namespace('api_responses', max_size=2048, ttl=30)
+        self._version = 0
+    
+    @property
+    def version(self) -> int:
+        return self._version
+    
+    def get(self, key) -> Optional[CachedResponse]:
+        return self._cache.get(key)
+    
+    def store(self, key, data: Any, version: int) -> CachedResponse:
+        cached = CachedResponse.from_data(data)
+        # Если за время загрузки прошла инвалидация, ответ может быть устаревшим и не кэшируется
+        if version == self._version:
+            self._cache.set(key, cached)
+        return cached
+    
+    def invalidate(self, route: str, guild_id: Optional[str] = None) -> None:
+        self._version += 1
+        self._cache.invalidate_where(lambda key: key[0] == route and key[1] == guild_id)
+    
+    def handle_change(self, event: ChangeEvent) -> None:
+        if event.collection == events.SETTINGS:
+            self.invalidate("settings", event.guild_id)
+            self.invalidate("guilds")
+        elif event.collection == events.APPLICATIONS:
+            self.invalidate("applications", event.guild_id)
+        elif event.collection == events.BLACKLIST:
+            self.invalidate("blacklist", event.guild_id)
+
 class APIService:
-    def __init__(self):
-        self._firebase_manager = FirebaseManager()
-        self._guild_settings_repo = GuildSettingsRepository(self._firebase_manager)
-        self._applications_repo = ApplicationsRepository(self._firebase_manager)
-        self._capts_repo = CaptsRepository(self._firebase_manager)
-        self._blacklist_repo = BlacklistRepository(self._firebase_manager)
-        self._owners_repo = OwnersRepository(self._firebase_manager)
+    def __init__(self, firebase_manager: Optional[FirebaseManager] = None, cache_manager=None):
+        self._firebase_manager = firebase_manager or FirebaseManager()
+        self._guild_settings_repo = GuildSettingsRepository(self._firebase_manager, cache_manager)
+        self._applications_repo = ApplicationsRepository(self._firebase_manager, cache_manager)
+        self._capts_repo = CaptsRepository(self._firebase_manager, cache_manager)
+        self._blacklist_repo = BlacklistRepository(self._firebase_manager, cache_manager)
+        self._owners_repo = OwnersRepository(self._firebase_manager, cache_manager)
+    
+    @classmethod
+    def from_env(cls) -> 'APIService':
+        if os.getenv('API_MODE') != 'embedded':
+            return cls()
+        # Во встроенном режиме API работает поверх слоя данных бота: один клиент Firestore и одни кэши на процесс
+        from src.database_firebase import cache_manager, firebase_db
+        return cls(FirebaseManager(db=firebase_db.db), cache_manager)
     
     @property
     def guild_settings(self):
@@ -332,15 +672,154 @@ class APIService:
     @property
     def owners(self):
         return self._owners_repo
+    
+    @property
+    def firebase_manager(self):
+        return self._firebase_manager
 
 class DiscordBotAPI:
-    def __init__(self):
-        self._app = FastAPI(title="Discord Bot Firebase API", description="API для работы с Firebase Firestore")
-        self._service = APIService()
+    def __init__(self, service: Optional[APIService] = None):
+        self._app = FastAPI(
+            title="Discord Bot Firebase API",
+            description="API для работы с Firebase Firestore",
+            default_response_class=FastJSONResponse
+        )
+        self._service = service or APIService.from_env()
+        self._health_checker = HealthChecker(self._service.firebase_manager)
+        self._response_cache = ResponseCache()
+        # Во встроенном режиме та же шина получает записи бота, и наоборот
+        data_change_bus.subscribe(self._response_cache.handle_change)
+        self._change_feed = ChangeFeed(
+            history_size=int(os.getenv('SSE_HISTORY_SIZE', 1000)),
+            max_queue=int(os.getenv('SSE_MAX_QUEUE', 256))
+        )
+        self._threadpool_size = int(os.getenv('API_THREADPOOL_SIZE', 64))
+        self._compression_min_size = int(os.getenv('API_COMPRESSION_MIN_SIZE', 1024))
         self._setup_middleware()
+        self._setup_events()
         self._setup_routes()
     
+    def _setup_events(self):
+        @self._app.on_event("startup")
+        async def configure_threadpool():
+            # Клиент Firestore синхронный: пул потоков ограничивает число параллельных запросов к нему
+            anyio.to_thread.current_default_thread_limiter().total_tokens = self._threadpool_size
+            setup_logging()
+            self._change_feed.attach(asyncio.get_running_loop())
+            start_loop_monitor()
+    
+    async def _run(self, func, *args, **kwargs):
+        return await run_in_threadpool(func, *args, **kwargs)
+    
+    async def _cached_json(self, request: Request, key: tuple, func, *args, **kwargs) -> Response:
+        cached = self._response_cache.get(key)
+        if cached is None:
+            version = self._response_cache.version
+            data = await self._run(func, *args, **kwargs)
+            cached = self._response_cache.store(key, data, version)
+        
+        headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+        if cached.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        return Response(content=cached.body, media_type="application/json", headers=headers)
+    
+    @staticmethod
+    def _wants_ndjson(request: Request, format: Optional[str]) -> bool:
+        if format is not None:
+            return format == "ndjson"
+        return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+    
+    @staticmethod
+    async def _read_body(request: Request, limit: int) -> bytes:
+        too_large = HTTPException(status_code=413, detail=f"Файл больше {limit // (1024 * 1024)} МБ")
+        length = request.headers.get("content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            raise too_large
+        # Content-Length может отсутствовать (chunked) или врать: предел проверяется и по мере чтения
+        chunks = []
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > limit:
+                raise too_large
+            chunks.append(chunk)
+        return b"".join(chunks)
+    
+    @staticmethod
+    def _parse_fields(fields: Optional[str], allowed: Sequence[str]) -> Optional[Tuple[str, ...]]:
+        if fields is None:
+            return None
+        requested = tuple(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+        unknown = [field for field in requested if field not in allowed]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Неизвестные поля: {', '.join(unknown)}")
+        return requested
+    
+    async def _ndjson(self, func, *args, key_name: str, **kwargs) -> StreamingResponse:
+        # func читает первый документ в пуле потоков: ошибка запроса к Firestore возвращается как 500 до заголовков
+        items = await self._run(func, *args, **kwargs)
+        
+        def lines():
+            # StreamingResponse перебирает синхронный генератор через iterate_in_threadpool.
+            # Строки группируются, чтобы не переключаться в пул потоков на каждый документ
+            chunk = []
+            for key, value in items:
+                chunk.append(encode_json({key_name: key, **value}) + b"\n")
+                if len(chunk) >= NDJSON_CHUNK_SIZE:
+                    yield b"".join(chunk)
+                    chunk = []
+            if chunk:
+                yield b"".join(chunk)
+        
+        return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
+    
+    @staticmethod
+    def _sse_message(event: str, data: Dict[str, Any], event_id: Optional[str] = None) -> bytes:
+        lines = f"id: {event_id}\n" if event_id else ""
+        return (lines + f"event: {event}\ndata: ").encode('utf-8') + encode_json(data) + b"\n\n"
+    
+    async def _event_stream(self, subscription, replay):
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n".encode('utf-8')
+            if replay is None:
+                # Токен устарел или из прошлого запуска: клиент должен перечитать данные целиком
+                yield self._sse_message("reset", {"guild_id": subscription.guild_id})
+            else:
+                for entry in replay:
+                    yield self._sse_message(entry.event.collection, entry.event.as_dict(), self._change_feed.event_id(entry))
+                self._change_feed.record_sent(len(replay))
+            
+            while True:
+                entry = await subscription.get(timeout=SSE_HEARTBEAT_INTERVAL)
+                if entry is None:
+                    yield b": ping\n\n"
+                    continue
+                yield self._sse_message(entry.event.collection, entry.event.as_dict(), self._change_feed.event_id(entry))
+                self._change_feed.record_sent()
+        except FeedOverflow:
+            # Поток закрывается, а EventSource переподключается с Last-Event-ID и догоняет из истории
+            yield b": overflow\n\n"
+        finally:
+            subscription.close()
+    
+    async def _collection(self, request: Request, key: tuple, format: Optional[str], limit: Optional[int],
+                          start_after: Optional[str], fields: Optional[Tuple[str, ...]], key_name: str,
+                          read_all, read_page, stream, *args):
+        if self._wants_ndjson(request, format):
+            return await self._ndjson(stream, *args, limit, start_after, key_name=key_name, fields=fields)
+        if limit is None and start_after is None:
+            return await self._cached_json(request, key + (fields,), read_all, *args, fields=fields)
+        return await self._cached_json(
+            request, key + (fields, limit, start_after), read_page, *args, limit or MAX_PAGE_SIZE, start_after,
+            fields=fields
+        )
+    
     def _setup_middleware(self):
+        # brotli_asgi необязателен: без него остаётся gzip из starlette
+        if BrotliMiddleware is not None:
+            self._app.add_middleware(BrotliMiddleware, minimum_size=self._compression_min_size)
+        else:
+            self._app.add_middleware(GZipMiddleware, minimum_size=self._compression_min_size, compresslevel=6)
         self._app.add_middleware(
             CORSMiddleware,
             allow_origins=["*"],
@@ -348,58 +827,124 @@ class DiscordBotAPI:
             allow_methods=["*"],
             allow_headers=["*"],
         )
+        self._app.add_middleware(MetricsMiddleware)
     
     def _setup_routes(self):
         @self._app.get("/")
         async def root():
-            return {"message": "Discord Bot Firebase API is running"}
+            health = await self._run(self._health_checker.check)
+            return {"message": "Discord Bot Firebase API is running", **health}
+
+        @self._app.get("/metrics", response_class=PlainTextResponse)
+        async def metrics():
+            return PlainTextResponse(
+                metrics_registry.render_prometheus(),
+                media_type="text/plain; version=0.0.4; charset=utf-8"
+            )
+
+        @self._app.get("/debug/loop")
+        async def loop_report(top: int = Query(10, ge=1, le=100)):
+            return loop_monitor.report(top)
+
+        @self._app.get("/debug/memory")
+        async def memory_report(top: int = Query(15, ge=1, le=100), types: bool = False):
+            # Проход по всем объектам gc занимает секунды на большом процессе: только по явному types=true
+            return await memory_reporter.report_async(top, include_types=types)
+
+        @self._app.get("/debug/traces")
+        async def trace_report(recent: int = Query(0, ge=0, le=200)):
+            # Трассы пишет бот: в отдельном процессе API сводка пуста, полезна во встроенном режиме
+            return {"summary": tracer.summary(), "recent": tracer.recent(recent) if recent else []}
+
+        @self._app.get("/guilds/{guild_id}/events")
+        async def guild_events(
+            guild_id: str,
+            request: Request,
+            collections: Optional[str] = None,
+            last_event_id: Optional[str] = None
+        ):
+            selected = self._parse_fields(collections, FEED_COLLECTIONS)
+            self._change_feed.attach(asyncio.get_running_loop())
+            subscription, replay = self._change_feed.subscribe(
+                guild_id,
+                frozenset(selected) if selected else None,
+                request.headers.get("last-event-id") or last_event_id
+            )
+            return StreamingResponse(
+                self._event_stream(subscription, replay),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
 
         @self._app.get("/guilds/{guild_id}/settings")
-        async def get_guild_settings(guild_id: str):
+        async def get_guild_settings(guild_id: str, request: Request):
             try:
-                return self._service.guild_settings.get_settings(guild_id)
+                return await self._cached_json(
+                    request, ("settings", guild_id), self._service.guild_settings.get_settings, guild_id
+                )
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка получения настроек: {str(e)}")
 
         @self._app.put("/guilds/{guild_id}/settings")
         async def update_guild_settings(guild_id: str, settings: GuildSettings):
             try:
-                return self._service.guild_settings.update_settings(guild_id, settings)
+                result = await self._run(self._service.guild_settings.update_settings, guild_id, settings)
+                events.publish_change(events.SETTINGS, events.SET, guild_id)
+                return result
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка обновления настроек: {str(e)}")
 
         @self._app.get("/guilds")
-        async def get_all_guilds():
+        async def get_all_guilds(
+            request: Request,
+            limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+            start_after: Optional[str] = None,
+            format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+            fields: Optional[str] = None
+        ):
+            repo = self._service.guild_settings
+            projection = self._parse_fields(fields, SETTINGS_FIELDS)
             try:
-                return self._service.guild_settings.get_all_settings()
+                return await self._collection(
+                    request, ("guilds", None), format, limit, start_after, projection, "guild_id",
+                    repo.get_all_settings, repo.get_settings_page, repo.stream_settings
+                )
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка получения настроек: {str(e)}")
 
         @self._app.get("/guilds/{guild_id}/applications")
-        async def get_guild_applications(guild_id: str):
+        async def get_guild_applications(guild_id: str, request: Request, fields: Optional[str] = None):
+            projection = self._parse_fields(fields, APPLICATION_FIELDS)
             try:
-                return self._service.applications.get_guild_applications(guild_id)
+                return await self._cached_json(
+                    request, ("applications", guild_id, projection),
+                    self._service.applications.get_guild_applications, guild_id, fields=projection
+                )
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка получения заявок: {str(e)}")
 
         @self._app.post("/guilds/{guild_id}/applications/{message_id}")
         async def create_application(guild_id: str, message_id: str, application: Application):
             try:
-                return self._service.applications.create_application(guild_id, message_id, application)
+                result = await self._run(self._service.applications.create_application, guild_id, message_id, application)
+                events.publish_change(events.APPLICATIONS, events.SET, guild_id, message_id)
+                return result
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка создания заявки: {str(e)}")
 
         @self._app.delete("/guilds/{guild_id}/applications/{message_id}")
         async def delete_application(guild_id: str, message_id: str):
             try:
-                return self._service.applications.delete_application(guild_id, message_id)
+                result = await self._run(self._service.applications.delete_application, guild_id, message_id)
+                events.publish_change(events.APPLICATIONS, events.DELETE, guild_id, message_id)
+                return result
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка удаления заявки: {str(e)}")
 
         @self._app.get("/guilds/{guild_id}/capts/{message_id}")
         async def get_capt(guild_id: str, message_id: str):
             try:
-                return self._service.capts.get_capt(guild_id, message_id)
+                return await self._run(self._service.capts.get_capt, guild_id, message_id)
             except HTTPException:
                 raise
             except Exception as e:
@@ -408,21 +953,27 @@ class DiscordBotAPI:
         @self._app.post("/guilds/{guild_id}/capts/{message_id}")
         async def create_capt(guild_id: str, message_id: str, capt: Capt):
             try:
-                return self._service.capts.create_capt(guild_id, message_id, capt)
+                result = await self._run(self._service.capts.create_capt, guild_id, message_id, capt)
+                events.publish_change(events.CAPTS, events.SET, guild_id, message_id)
+                return result
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка создания капты: {str(e)}")
 
         @self._app.delete("/guilds/{guild_id}/capts/{message_id}")
         async def delete_capt(guild_id: str, message_id: str):
             try:
-                return self._service.capts.delete_capt(guild_id, message_id)
+                result = await self._run(self._service.capts.delete_capt, guild_id, message_id)
+                events.publish_change(events.CAPTS, events.DELETE, guild_id, message_id)
+                return result
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка удаления капты: {str(e)}")
 
         @self._app.post("/guilds/{guild_id}/capts/{message_id}/members/{member_id}")
         async def add_member_to_capt(guild_id: str, message_id: str, member_id: str):
             try:
-                return self._service.capts.add_member(guild_id, message_id, member_id)
+                result = await self._run(self._service.capts.add_member, guild_id, message_id, member_id)
+                events.publish_change(events.CAPTS, events.SET, guild_id, message_id)
+                return result
             except HTTPException:
                 raise
             except Exception as e:
@@ -431,44 +982,110 @@ class DiscordBotAPI:
         @self._app.delete("/guilds/{guild_id}/capts/{message_id}/members/{member_id}")
         async def remove_member_from_capt(guild_id: str, message_id: str, member_id: str):
             try:
-                return self._service.capts.remove_member(guild_id, message_id, member_id)
+                result = await self._run(self._service.capts.remove_member, guild_id, message_id, member_id)
+                events.publish_change(events.CAPTS, events.SET, guild_id, message_id)
+                return result
             except HTTPException:
                 raise
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка удаления участника: {str(e)}")
 
         @self._app.get("/guilds/{guild_id}/blacklist")
-        async def get_guild_blacklist(guild_id: str):
+        async def get_guild_blacklist(
+            guild_id: str,
+            request: Request,
+            limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+            start_after: Optional[str] = None,
+            format: Optional[str] = Query(None, pattern="^(json|ndjson)$"),
+            fields: Optional[str] = None
+        ):
+            repo = self._service.blacklist
+            projection = self._parse_fields(fields, BLACKLIST_FIELDS)
             try:
-                return self._service.blacklist.get_guild_blacklist(guild_id)
+                return await self._collection(
+                    request, ("blacklist", guild_id), format, limit, start_after, projection, "user_id",
+                    repo.get_guild_blacklist, repo.get_blacklist_page, repo.stream_blacklist, guild_id
+                )
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка получения черного списка: {str(e)}")
 
+        @self._app.get("/guilds/{guild_id}/blacklist/export")
+        async def export_blacklist(guild_id: str, format: str = Query("csv", pattern="^(csv|jsonl)$")):
+            try:
+                items = await self._run(self._service.blacklist.stream_blacklist, guild_id)
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Ошибка выгрузки черного списка: {str(e)}")
+            
+            media_type = "text/csv; charset=utf-8" if format == "csv" else NDJSON_MEDIA_TYPE
+            return StreamingResponse(
+                serialize(items, format),
+                media_type=media_type,
+                headers={"Content-Disposition": f'attachment; filename="blacklist_{guild_id}.{format}"'}
+            )
+
+        @self._app.post("/guilds/{guild_id}/blacklist/import")
+        async def import_blacklist(
+            guild_id: str,
+            request: Request,
+            format: Optional[str] = Query(None, pattern="^(csv|jsonl)$")
+        ):
+            content = await self._read_body(request, MAX_IMPORT_BYTES)
+            try:
+                # Разбор до 10 000 строк занимает заметное время: не в цикле событий
+                entries, errors = await self._run(
+                    parse_entries, content, format or detect_format(content_type=request.headers.get("content-type"))
+                )
+            except (ValueError, UnicodeDecodeError) as e:
+                raise HTTPException(status_code=400, detail=f"Некорректный файл: {str(e)}")
+            
+            try:
+                written = await self._run(self._service.blacklist.bulk_add, guild_id, entries)
+            except PartialImportError as e:
+                # Повторный импорт того же файла безопасен: записи перезаписывают те же документы
+                raise HTTPException(status_code=500, detail={
+                    "message": f"Ошибка импорта черного списка: {e.__cause__}",
+                    "imported": e.written,
+                    "total": e.total,
+                    "skipped": len(errors)
+                })
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Ошибка импорта черного списка: {str(e)}")
+            finally:
+                events.publish_change(events.BLACKLIST, events.SET, guild_id)
+            
+            return {"status": "success", "imported": written, "skipped": len(errors), "errors": errors[:100]}
+
         @self._app.post("/guilds/{guild_id}/blacklist/{user_id}")
         async def add_to_blacklist(guild_id: str, user_id: str, entry: BlacklistEntry):
             try:
-                return self._service.blacklist.add_to_blacklist(guild_id, user_id, entry)
+                result = await self._run(self._service.blacklist.add_to_blacklist, guild_id, user_id, entry)
+                events.publish_change(events.BLACKLIST, events.SET, guild_id, user_id)
+                return result
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка добавления в черный список: {str(e)}")
 
         @self._app.delete("/guilds/{guild_id}/blacklist/{user_id}")
         async def remove_from_blacklist(guild_id: str, user_id: str):
             try:
-                return self._service.blacklist.remove_from_blacklist(guild_id, user_id)
+                result = await self._run(self._service.blacklist.remove_from_blacklist, guild_id, user_id)
+                events.publish_change(events.BLACKLIST, events.DELETE, guild_id, user_id)
+                return result
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка удаления из черного списка: {str(e)}")
 
         @self._app.get("/owners")
         async def get_owners():
             try:
-                return self._service.owners.get_owners()
+                return await self._run(self._service.owners.get_owners)
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка получения владельцев: {str(e)}")
 
         @self._app.post("/owners/{user_id}")
         async def add_owner(user_id: str):
             try:
-                return self._service.owners.add_owner(user_id)
+                result = await self._run(self._service.owners.add_owner, user_id)
+                events.publish_change(events.OWNERS, events.SET, document_id=user_id)
+                return result
             except HTTPException:
                 raise
             except Exception as e:
@@ -477,7 +1094,9 @@ class DiscordBotAPI:
         @self._app.delete("/owners/{user_id}")
         async def remove_owner(user_id: str):
             try:
-                return self._service.owners.remove_owner(user_id)
+                result = await self._run(self._service.owners.remove_owner, user_id)
+                events.publish_change(events.OWNERS, events.DELETE, document_id=user_id)
+                return result
             except Exception as e:
                 raise HTTPException(status_code=500, detail=f"Ошибка удаления владельца: {str(e)}")
     
@@ -0,0 +1,115 @@
+import asyncio
+import os
+import time
+from typing import Optional
+
+import discord
+
+from src.metrics import metrics_registry
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self._rate = rate
+        self._capacity = capacity or max(rate, 1.0)
+        self._tokens = self._capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+
+class BanJob:
+    __slots__ = ('guild', 'user_id', 'reason', 'future')
+
+    def __init__(self, guild: discord.Guild, user_id: int, reason: str, future: asyncio.Future):
+        self.guild = guild
+        self.user_id = user_id
+        self.reason = reason
+        self.future = future
+
+
+class BanWorkerPool:
+    def __init__(self, workers: int = 3, rate: float = 5.0, registry=metrics_registry):
+        self._worker_count = workers
+        self._limiter_rate = rate
+        self._queue: Optional[asyncio.Queue] = None
+        self._limiter: Optional[TokenBucket] = None
+        self._workers = []
+        self._results = registry.counter('discord_bans_total', 'Баны из очереди по результату', ('result',))
+        self._depth = registry.gauge('discord_ban_queue_depth', 'Баны, ожидающие отправки в Discord')
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_started(self) -> None:
+        # Очередь и воркеры создаются при первом использовании: нужен работающий цикл бота
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._limiter = TokenBucket(self._limiter_rate)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self._worker_count)]
+
+    def submit(self, guild: discord.Guild, user_id: int, reason: str) -> asyncio.Future:
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait(BanJob(guild, int(user_id), reason, future))
+        self._depth.set(self._queue.qsize())
+        return future
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            self._depth.set(self._queue.qsize())
+            try:
+                await self._limiter.acquire()
+                result = await self._ban(job)
+                self._results.inc(result=result)
+                if not job.future.done():
+                    job.future.set_result(result)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._results.inc(result='error')
+                if not job.future.done():
+                    job.future.set_exception(e)
+            finally:
+                self._queue.task_done()
+
+    @staticmethod
+    async def _ban(job: BanJob) -> str:
+        try:
+            # Бан по id работает и для пользователей, которых нет на сервере, без fetch_user
+            await job.guild.ban(discord.Object(id=job.user_id), reason=job.reason, delete_message_seconds=0)
+            return 'banned'
+        except discord.NotFound:
+            return 'not_found'
+        except discord.Forbidden:
+            return 'forbidden'
+
+    async def join(self) -> None:
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self._queue = None
+
+
+ban_worker_pool = BanWorkerPool(
+    workers=int(os.getenv('BAN_WORKERS', 3)),
+    rate=float(os.getenv('BAN_RATE_PER_SECOND', 5))
+)
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+BLACKLIST_FIELDS = ('user_id', 'reason', 'reporter_id', 'timestamp', 'static_id')
+FORMATS = ('csv', 'jsonl')
+FIRESTORE_BATCH_LIMIT = 500
+MAX_IMPORT_ENTRIES = 10000
+# Общий предел для команды бота и API: файл целиком читается в память и разбирается за один проход
+MAX_IMPORT_BYTES = 2 * 1024 * 1024
+
+
+class PartialImportError(Exception):
+    """Пакетная запись прервалась: первые written записей уже в Firestore, остальные нет"""
+
+    def __init__(self, written: int, total: int):
+        super().__init__(f"записано {written} из {total}")
+        self.written = written
+        self.total = total
+
+
+def detect_format(filename: Optional[str] = None, content_type: Optional[str] = None) -> str:
+    name = (filename or '').lower()
+    content_type = (content_type or '').lower()
+    if name.endswith(('.jsonl', '.ndjson', '.json')) or 'json' in content_type:
+        return 'jsonl'
+    return 'csv'
+
+
+def _decode(content) -> str:
+    if isinstance(content, bytes):
+        # utf-8-sig убирает BOM, который добавляет Excel при сохранении CSV
+        return content.decode('utf-8-sig')
+    return content.lstrip('\ufeff')
+
+
+def _rows(text: str, format: str) -> Iterator[Tuple[int, Any]]:
+    if format == 'jsonl':
+        for line_number, line in enumerate(text.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_number, json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, e
+        return
+
+    reader = csv.DictReader(io.StringIO(text))
+    for row in reader:
+        yield reader.line_num, row
+
+
+def _normalize(row: Any) -> Dict[str, Optional[str]]:
+    if not isinstance(row, dict):
+        raise ValueError("ожидался объект")
+
+    user_id = str(row.get('user_id') or '').strip()
+    if not user_id.isdigit():
+        raise ValueError(f"неверный user_id: {user_id or 'пусто'}")
+
+    reason = str(row.get('reason') or '').strip()
+    if not reason:
+        raise ValueError("не указана причина")
+
+    entry = {'user_id': user_id, 'reason': reason}
+    for field in ('reporter_id', 'timestamp', 'static_id'):
+        value = row.get(field)
+        entry[field] = str(value).strip() if value not in (None, '') else None
+    return entry
+
+
+def parse_entries(content, format: str = 'csv', limit: int = MAX_IMPORT_ENTRIES) -> Tuple[List[Dict[str, Optional[str]]], List[str]]:
+    if format not in FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {format}")
+
+    entries = {}
+    errors = []
+    for line_number, row in _rows(_decode(content), format):
+        if isinstance(row, Exception):
+            errors.append(f"строка {line_number}: некорректный JSON")
+            continue
+        try:
+            entry = _normalize(row)
+        except ValueError as e:
+            errors.append(f"строка {line_number}: {e}")
+            continue
+        # Повторы одного пользователя схлопываются: в Firestore это один документ
+        entries[entry['user_id']] = entry
+        if len(entries) > limit:
+            raise ValueError(f"Файл содержит больше {limit} записей")
+
+    return list(entries.values()), errors
+
+
+def serialize(items: Iterable[Tuple[str, Dict[str, Any]]], format: str) -> Iterator[str]:
+    if format not in FORMATS:
+        raise ValueError(f"Неподдерживаемый формат: {format}")
+
+    if format == 'jsonl':
+        for user_id, entry in items:
+            record = {field: entry.get(field) for field in BLACKLIST_FIELDS[1:]}
+            yield json.dumps({'user_id': user_id, **record}, ensure_ascii=False) + '\n'
+        return
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(BLACKLIST_FIELDS)
+    for user_id, entry in items:
+        writer.writerow([user_id] + [entry.get(field) or '' for field in BLACKLIST_FIELDS[1:]])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def chunked(items: List[Any], size: int = FIRESTORE_BATCH_LIMIT) -> Iterator[List[Any]]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,201 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+_MISSING = object()
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.negative_stores = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'invalidations': self.invalidations,
+            'negative_stores': self.negative_stores,
+            'hit_ratio': round(self.hit_ratio, 4)
+        }
+
+
+class TTLCache:
+    def __init__(self, name: str, max_size: int = 1024, ttl: float = 300.0):
+        self._name = name
+        self._max_size = max_size
+        self._ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.RLock()
+        self._stats = CacheStats()
+        # Растёт при каждой инвалидации: загрузка, во время которой кэш инвалидировали, не сохраняет результат
+        self._generation = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def max_size(self) -> int:
+        return self._max_size
+
+    @property
+    def ttl(self) -> float:
+        return self._ttl
+
+    @property
+    def stats(self) -> CacheStats:
+        return self._stats
+
+    def _lookup(self, key: Hashable) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats.misses += 1
+                return _MISSING
+
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self._stats.expirations += 1
+                self._stats.misses += 1
+                return _MISSING
+
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._lookup(key)
+        return default if value is _MISSING else value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None, generation: Optional[int] = None) -> None:
+        ttl = self._ttl if ttl is None else ttl
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._stats.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], ttl: Optional[float] = None,
+                    should_cache: Optional[Callable[[Any], bool]] = None,
+                    is_negative: Optional[Callable[[Any], bool]] = None,
+                    negative_ttl: Optional[float] = None) -> Any:
+        value = self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        # Исключения загрузчика пробрасываются наверх и ничего не кэшируют
+        generation = self._generation
+        value = loader()
+        if should_cache is not None and not should_cache(value):
+            return value
+
+        if is_negative is not None and is_negative(value):
+            self._stats.negative_stores += 1
+            ttl = negative_ttl
+        self.set(key, value, ttl, generation)
+        return value
+
+    def invalidate(self, key: Hashable) -> bool:
+        with self._lock:
+            # Поколение растёт, даже если записи нет: её как раз может загружать другой поток
+            self._generation += 1
+            if self._entries.pop(key, _MISSING) is _MISSING:
+                return False
+            self._stats.invalidations += 1
+            return True
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+            self._stats.invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._stats.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._entries.keys())
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and entry[0] > time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'name': self._name,
+            'size': len(self._entries),
+            'max_size': self._max_size,
+            'ttl': self._ttl,
+            **self._stats.as_dict()
+        }
+
+
+class CacheRegistry:
+    def __init__(self):
+        self._caches: Dict[str, TTLCache] = {}
+        self._lock = threading.Lock()
+
+    def _env_setting(self, name: str, suffix: str, default: float) -> float:
+        value = os.getenv(f'CACHE_{name.upper()}_{suffix}', os.getenv(f'CACHE_DEFAULT_{suffix}'))
+        return float(value) if value else default
+
+    def namespace(self, name: str, max_size: int = 1024, ttl: float = 300.0) -> TTLCache:
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None:
+                cache = TTLCache(
+                    name,
+                    max_size=int(self._env_setting(name, 'MAX_SIZE', max_size)),
+                    ttl=self._env_setting(name, 'TTL', ttl)
+                )
+                self._caches[name] = cache
+            return cache
+
+    def get(self, name: str) -> Optional[TTLCache]:
+        return self._caches.get(name)
+
+    def names(self) -> List[str]:
+        return list(self._caches.keys())
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: cache.snapshot() for name, cache in list(self._caches.items())}
+
+    def clear_all(self) -> None:
+        for cache in list(self._caches.values()):
+            cache.clear()
+
+
+cache_registry = CacheRegistry()
+
+
+def get_cache_registry() -> CacheRegistry:
+    return cache_registry
@@ -0,0 +1,142 @@
+import asyncio
+import itertools
+import secrets
+import threading
+from collections import deque
+from typing import Dict, FrozenSet, List, Optional
+
+from src.events import ChangeEvent, DataChangeBus, data_change_bus
+from src.metrics import metrics_registry
+
+
+class FeedEntry:
+    __slots__ = ('sequence', 'event')
+
+    def __init__(self, sequence: int, event: ChangeEvent):
+        self.sequence = sequence
+        self.event = event
+
+
+class FeedOverflow(Exception):
+    pass
+
+
+_OVERFLOW = object()
+
+
+class FeedSubscription:
+    def __init__(self, feed: 'ChangeFeed', guild_id: str, collections: Optional[FrozenSet[str]], max_queue: int):
+        self._feed = feed
+        self.guild_id = guild_id
+        self.collections = collections
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflowed = False
+
+    def accepts(self, event: ChangeEvent) -> bool:
+        return event.guild_id == self.guild_id and (self.collections is None or event.collection in self.collections)
+
+    def _deliver(self, entry: FeedEntry) -> None:
+        if self.overflowed:
+            return
+        try:
+            self._queue.put_nowait(entry)
+        except asyncio.QueueFull:
+            # Медленный клиент не копит память сервера: поток закрывается, клиент переподключается с Last-Event-ID
+            self.overflowed = True
+            self._feed._overflows.inc()
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(_OVERFLOW)
+
+    async def get(self, timeout: float) -> Optional[FeedEntry]:
+        try:
+            entry = await asyncio.wait_for(self._queue.get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+        if entry is _OVERFLOW:
+            raise FeedOverflow()
+        return entry
+
+    def close(self) -> None:
+        self._feed._unsubscribe(self)
+
+
+class ChangeFeed:
+    def __init__(self, bus: DataChangeBus = data_change_bus, history_size: int = 1000, max_queue: int = 256,
+                 registry=metrics_registry):
+        self._history_size = history_size
+        self._max_queue = max_queue
+        self._history: Dict[str, deque] = {}
+        self._trimmed: Dict[str, int] = {}
+        # Эпоха отличает токены прошлых запусков: после рестарта последовательность начинается заново
+        self._epoch = secrets.token_hex(4)
+        self._subscriptions: List[FeedSubscription] = []
+        self._sequence = itertools.count(1)
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connections = registry.gauge('sse_connections', 'Открытые SSE-подключения ленты изменений')
+        self._events_sent = registry.counter('sse_events_sent_total', 'События, отправленные в SSE-ленты')
+        self._overflows = registry.counter(
+            'sse_overflows_total', 'SSE-подключения, закрытые из-за переполнения очереди')
+        bus.subscribe(self.publish)
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        self._loop = loop
+
+    def publish(self, event: ChangeEvent) -> None:
+        if event.guild_id is None:
+            return
+
+        with self._lock:
+            entry = FeedEntry(next(self._sequence), event)
+            history = self._history.get(event.guild_id)
+            if history is None:
+                history = self._history[event.guild_id] = deque(maxlen=self._history_size)
+            if len(history) == self._history_size:
+                self._trimmed[event.guild_id] = history[0].sequence
+            history.append(entry)
+            subscribers = [subscription for subscription in self._subscriptions if subscription.accepts(event)]
+
+        if not subscribers or self._loop is None:
+            return
+        # Записи приходят и из пула потоков, а очереди подписчиков живут в цикле событий API
+        for subscription in subscribers:
+            self._loop.call_soon_threadsafe(subscription._deliver, entry)
+
+    def event_id(self, entry: FeedEntry) -> str:
+        return f"{self._epoch}-{entry.sequence}"
+
+    def _parse_event_id(self, event_id: Optional[str]) -> Optional[int]:
+        epoch, _, sequence = (event_id or '').partition('-')
+        if epoch != self._epoch or not sequence.isdigit():
+            return None
+        return int(sequence)
+
+    def subscribe(self, guild_id: str, collections: Optional[FrozenSet[str]] = None,
+                  last_event_id: Optional[str] = None):
+        subscription = FeedSubscription(self, str(guild_id), collections, self._max_queue)
+        with self._lock:
+            replay = self._replay(subscription, last_event_id)
+            self._subscriptions.append(subscription)
+        self._connections.inc()
+        return subscription, replay
+
+    def _replay(self, subscription: FeedSubscription, last_event_id: Optional[str]) -> Optional[List[FeedEntry]]:
+        # None — история не покрывает разрыв, клиенту нужно перечитать данные целиком
+        if not last_event_id:
+            return []
+        sequence = self._parse_event_id(last_event_id)
+        if sequence is None or sequence < self._trimmed.get(subscription.guild_id, 0):
+            return None
+        history = self._history.get(subscription.guild_id, ())
+        return [entry for entry in history if entry.sequence > sequence and subscription.accepts(entry.event)]
+
+    def _unsubscribe(self, subscription: FeedSubscription) -> None:
+        with self._lock:
+            if subscription not in self._subscriptions:
+                return
+            self._subscriptions.remove(subscription)
+        self._connections.dec()
+
+    def record_sent(self, count: int = 1) -> None:
+        self._events_sent.inc(count)
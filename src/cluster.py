@@ -0,0 +1,473 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from src.cache import cache_registry
+from src.events import ChangeEvent, data_change_bus
+from src.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = '/tmp/chili-cluster.sock'
+EVENT_DELAY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+# Discord разрешает одно IDENTIFY в 5 секунд на каждый слот max_concurrency
+IDENTIFY_INTERVAL = 5.0
+
+
+def _encode(message: Dict[str, Any]) -> bytes:
+    return json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n'
+
+
+def _decode(line: bytes) -> Dict[str, Any]:
+    message = json.loads(line)
+    if not isinstance(message, dict):
+        raise ValueError("Сообщение кластера должно быть JSON-объектом")
+    return message
+
+
+def split_shards(shard_count: int, processes: int) -> List[List[int]]:
+    # Непрерывные диапазоны: первые процессы получают на шард больше, если поровну не делится
+    size, extra = divmod(shard_count, processes)
+    ranges, start = [], 0
+    for index in range(processes):
+        end = start + size + (1 if index < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+class BrokerConnection:
+    __slots__ = ('writer', 'process', 'shards', 'connected_at')
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.process = None
+        self.shards: List[int] = []
+        self.connected_at = time.time()
+
+    def send(self, payload: bytes) -> None:
+        if not self.writer.is_closing():
+            self.writer.write(payload)
+
+
+class ClusterBroker:
+    """Брокер на Unix-сокете: пересылает события шины изменений между процессами кластера
+    и выдаёт слоты IDENTIFY, общие для всех шардов бота."""
+
+    def __init__(self, path: str = DEFAULT_SOCKET, max_concurrency: int = 1, registry=metrics_registry):
+        self._path = path
+        self._max_concurrency = max(max_concurrency, 1)
+        self._server = None
+        self._connections: List[BrokerConnection] = []
+        self._identify_locks: Dict[int, asyncio.Lock] = {}
+        self._identify_next: Dict[int, float] = {}
+        self._grants = set()
+        self._handlers = set()
+        self._relayed = registry.counter('cluster_broker_events_total', 'События, разосланные брокером кластера')
+        self._members = registry.gauge('cluster_broker_connections', 'Процессы, подключённые к брокеру кластера')
+        self._identify_wait = registry.histogram(
+            'cluster_identify_wait_seconds', 'Ожидание слота IDENTIFY в брокере кластера')
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    async def start(self) -> None:
+        # Сокет от прошлого запуска остаётся на диске и не даёт занять путь
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+        self._server = await asyncio.start_unix_server(self._handle, path=self._path)
+        logger.info("Брокер кластера запущен", extra={'socket': self._path})
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for connection in list(self._connections):
+            connection.writer.close()
+        for grant in self._grants:
+            grant.cancel()
+        # wait_closed не ждёт обработчики соединений: без этого они останутся висеть до закрытия цикла
+        await asyncio.gather(*self._handlers, *self._grants, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+        if os.path.exists(self._path):
+            os.unlink(self._path)
+
+    def members(self) -> List[Dict[str, Any]]:
+        return [
+            {'process': connection.process, 'shards': connection.shards, 'connected_at': connection.connected_at}
+            for connection in self._connections
+        ]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        connection = BrokerConnection(writer)
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        self._connections.append(connection)
+        self._members.set(len(self._connections))
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    message = _decode(line)
+                except ValueError:
+                    # Битая строка или строка длиннее лимита потока: readline() её уже отбросил, соединение живёт дальше
+                    logger.warning("Некорректное сообщение в брокере кластера", extra={'cluster_id': connection.process})
+                    continue
+                await self._dispatch(connection, message, line)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.remove(connection)
+            self._handlers.discard(handler)
+            self._members.set(len(self._connections))
+            writer.close()
+            logger.info("Процесс отключился от брокера", extra={'cluster_id': connection.process})
+
+    async def _dispatch(self, connection: BrokerConnection, message: Dict[str, Any], raw: bytes) -> None:
+        operation = message.get('op')
+        if operation in ('publish', 'resync'):
+            # Строка пересылается как есть: брокер не разбирает и не собирает событие заново
+            for other in self._connections:
+                if other is not connection:
+                    other.send(raw)
+            self._relayed.inc()
+        elif operation == 'identify':
+            task = asyncio.create_task(self._grant_identify(connection, message))
+            self._grants.add(task)
+            task.add_done_callback(self._grants.discard)
+        elif operation == 'hello':
+            connection.process = message.get('process')
+            connection.shards = message.get('shards') or []
+            logger.info("Процесс подключился к брокеру", extra={'cluster_id': connection.process, 'shards': connection.shards})
+
+    async def _grant_identify(self, connection: BrokerConnection, message: Dict[str, Any]) -> None:
+        bucket = int(message.get('shard') or 0) % self._max_concurrency
+        lock = self._identify_locks.setdefault(bucket, asyncio.Lock())
+        started = time.monotonic()
+        async with lock:
+            delay = self._identify_next.get(bucket, 0.0) - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._identify_next[bucket] = time.monotonic() + IDENTIFY_INTERVAL
+        self._identify_wait.observe(time.monotonic() - started)
+        connection.send(_encode({'op': 'identify_ok', 'id': message.get('id')}))
+
+
+class ClusterClient:
+    """Связь процесса бота с брокером: локальные события шины уходят в другие процессы, чужие применяются здесь.
+
+    Кэши каждого процесса остаются локальными, брокер пересылает только инвалидации. Если связь терялась,
+    часть событий могла пройти мимо, поэтому после переподключения кэши сбрасываются целиком. Свои события,
+    опубликованные без связи, копятся в очереди и уходят после переподключения; если очередь переполнилась,
+    вместо них остальным процессам отправляется resync, и они сбрасывают кэши сами.
+    """
+
+    def __init__(self, path: str = DEFAULT_SOCKET, process_id: int = 0, shard_ids: Optional[List[int]] = None,
+                 bus=data_change_bus, reconnect_delay: float = 1.0, backlog_size: int = 10000,
+                 registry=metrics_registry):
+        self._path = path
+        self._process_id = process_id
+        self._shard_ids = shard_ids or []
+        self._bus = bus
+        self._reconnect_delay = reconnect_delay
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task = None
+        self._unsubscribe = None
+        self._applying = threading.local()
+        self._requests = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._connected = asyncio.Event()
+        self._backlog: deque = deque()
+        self._backlog_size = backlog_size
+        self._overflowed = False
+        self._events = registry.counter('cluster_events_total', 'События шины изменений между процессами', ('direction',))
+        self._delay = registry.histogram(
+            'cluster_event_delay_seconds', 'Задержка доставки события из другого процесса', buckets=EVENT_DELAY_BUCKETS)
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    async def start(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._unsubscribe = self._bus.subscribe(self._forward)
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._unsubscribe is not None:
+            self._unsubscribe()
+            self._unsubscribe = None
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def wait_connected(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _forward(self, event: ChangeEvent) -> None:
+        # Вызывается синхронно из шины, в том числе из потоков API
+        if getattr(self._applying, 'active', False) or self._loop is None or self._loop.is_closed():
+            return
+        payload = _encode({'op': 'publish', 'origin': self._process_id, 'sent_at': time.time(), 'event': event.as_dict()})
+        self._loop.call_soon_threadsafe(self._publish, payload)
+
+    def _writable(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    def _publish(self, payload: bytes) -> None:
+        if self._writable():
+            self._writer.write(payload)
+            self._events.inc(direction='out')
+            return
+        # Без очереди остальные процессы не узнали бы о записях, сделанных этим процессом, пока связи не было
+        if len(self._backlog) < self._backlog_size:
+            self._backlog.append(payload)
+            self._events.inc(direction='buffered')
+        else:
+            self._overflowed = True
+            self._events.inc(direction='dropped')
+
+    def _flush_backlog(self) -> None:
+        if self._overflowed:
+            self._backlog.clear()
+            self._overflowed = False
+            self._writer.write(_encode({'op': 'resync', 'origin': self._process_id}))
+            logger.warning("Очередь событий переполнилась, остальным процессам отправлен resync",
+                           extra={'cluster_id': self._process_id})
+            return
+        while self._backlog:
+            self._writer.write(self._backlog.popleft())
+            self._events.inc(direction='out')
+
+    def _send(self, payload: bytes) -> bool:
+        if not self._writable():
+            return False
+        self._writer.write(payload)
+        return True
+
+    def _apply(self, message: Dict[str, Any]) -> None:
+        self._applying.active = True
+        try:
+            self._bus.publish(ChangeEvent(**message['event']))
+        finally:
+            self._applying.active = False
+        self._events.inc(direction='in')
+        if message.get('sent_at'):
+            self._delay.observe(max(time.time() - message['sent_at'], 0.0))
+
+    async def _run(self) -> None:
+        first = True
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_unix_connection(self._path)
+            except OSError:
+                await asyncio.sleep(self._reconnect_delay)
+                continue
+
+            try:
+                self._writer.write(_encode({'op': 'hello', 'process': self._process_id, 'shards': self._shard_ids}))
+                self._flush_backlog()
+                if not first:
+                    cache_registry.clear_all()
+                    logger.info("Связь с брокером восстановлена, кэши сброшены", extra={'cluster_id': self._process_id})
+                first = False
+                self._connected.set()
+                await self._read(reader)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            except Exception:
+                # Любая ошибка заканчивается переподключением: без клиента процесс тихо перестаёт получать инвалидации
+                logger.exception("Ошибка связи с брокером кластера", extra={'cluster_id': self._process_id})
+            finally:
+                self._connected.clear()
+                self._writer.close()
+                self._writer = None
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("Связь с брокером потеряна"))
+                self._pending.clear()
+            logger.warning("Связь с брокером кластера потеряна", extra={'cluster_id': self._process_id})
+            await asyncio.sleep(self._reconnect_delay)
+
+    async def _read(self, reader: asyncio.StreamReader) -> None:
+        while True:
+            try:
+                line = await reader.readline()
+                if not line:
+                    return
+                message = _decode(line)
+            except ValueError:
+                logger.warning("Некорректное сообщение от брокера кластера", extra={'cluster_id': self._process_id})
+                continue
+            operation = message.get('op')
+            if operation == 'publish':
+                try:
+                    self._apply(message)
+                except Exception:
+                    logger.exception("Ошибка применения события из другого процесса")
+            elif operation == 'resync':
+                cache_registry.clear_all()
+                logger.info("Процесс потерял часть событий, кэши сброшены", extra={'cluster_id': message.get('origin')})
+            elif operation == 'identify_ok':
+                future = self._pending.pop(message.get('id'), None)
+                if future is not None and not future.done():
+                    future.set_result(True)
+
+    async def before_identify(self, shard_id: Optional[int], *, initial: bool = False) -> None:
+        # Замена Client.before_identify_hook: очередь IDENTIFY общая для всех процессов, а не для одного
+        if await self.wait_connected(timeout=30):
+            request_id = next(self._requests)
+            future = self._loop.create_future()
+            self._pending[request_id] = future
+            if self._send(_encode({'op': 'identify', 'id': request_id, 'shard': shard_id or 0})):
+                try:
+                    await asyncio.wait_for(future, timeout=120)
+                    return
+                except (asyncio.TimeoutError, ConnectionError):
+                    pass
+            self._pending.pop(request_id, None)
+        logger.warning("Брокер не выдал слот IDENTIFY, ожидание по умолчанию", extra={'shard': shard_id})
+        await asyncio.sleep(IDENTIFY_INTERVAL)
+
+
+class ClusterWorker:
+    def __init__(self, index: int, shard_ids: List[int], environment: Dict[str, str]):
+        self.index = index
+        self.shard_ids = shard_ids
+        self._environment = environment
+        self._process = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self._process.pid if self._process else None
+
+    async def start(self, command: List[str]) -> None:
+        # Вывод не перехватывается: процессы пишут логи туда же, куда и лаунчер
+        self._process = await asyncio.create_subprocess_exec(*command, env=self._environment)
+
+    async def wait(self) -> int:
+        return await self._process.wait()
+
+    async def stop(self, timeout: float = 30) -> None:
+        if self._process is None or self._process.returncode is not None:
+            return
+        # SIGINT: бот завершается штатно, отдаёт аренды и закрывает соединение со шлюзом
+        self._process.send_signal(signal.SIGINT)
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._process.kill()
+            await self._process.wait()
+
+
+class ClusterLauncher:
+    def __init__(self, processes: int, shard_count: Optional[int] = None, socket_path: str = DEFAULT_SOCKET,
+                 max_concurrency: int = 1, max_restart_delay: float = 30.0, command: Optional[List[str]] = None):
+        self._processes = processes
+        self._shard_count = shard_count or processes
+        if self._shard_count < processes:
+            raise ValueError("SHARD_COUNT не может быть меньше CLUSTER_PROCESSES")
+        self._socket_path = socket_path
+        self._broker = ClusterBroker(socket_path, max_concurrency)
+        self._max_restart_delay = max_restart_delay
+        self._command = command or [sys.executable, os.path.abspath(sys.argv[0])]
+        self._workers: List[ClusterWorker] = []
+        self._stopping = asyncio.Event()
+        self._restarts = metrics_registry.counter(
+            'cluster_worker_restarts_total', 'Перезапуски процессов кластера после падения', ('worker',))
+
+    @classmethod
+    def from_env(cls) -> 'ClusterLauncher':
+        shard_count = os.getenv('SHARD_COUNT')
+        return cls(
+            processes=int(os.getenv('CLUSTER_PROCESSES', 1)),
+            shard_count=int(shard_count) if shard_count else None,
+            socket_path=os.getenv('CLUSTER_SOCKET', DEFAULT_SOCKET),
+            max_concurrency=int(os.getenv('IDENTIFY_CONCURRENCY', 1))
+        )
+
+    def _environment(self, index: int, shard_ids: List[int]) -> Dict[str, str]:
+        environment = dict(os.environ)
+        environment.update({
+            'CLUSTER_ID': str(index),
+            'CLUSTER_SOCKET': self._socket_path,
+            'SHARD_COUNT': str(self._shard_count),
+            'SHARD_IDS': ','.join(map(str, shard_ids))
+        })
+        # API слушает один порт: его поднимает только первый процесс
+        if index > 0:
+            environment['API_MODE'] = 'off'
+        return environment
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self._stopping.set)
+
+        await self._broker.start()
+        ranges = split_shards(self._shard_count, self._processes)
+        self._workers = [ClusterWorker(index, shards, self._environment(index, shards)) for index, shards in enumerate(ranges)]
+        logger.info("Запуск кластера", extra={'processes': self._processes, 'shards': self._shard_count})
+        supervisors = [asyncio.create_task(self._supervise(worker)) for worker in self._workers]
+        try:
+            await self._stopping.wait()
+        finally:
+            logger.info("Остановка кластера")
+            for supervisor in supervisors:
+                supervisor.cancel()
+            await asyncio.gather(*supervisors, return_exceptions=True)
+            await asyncio.gather(*(worker.stop() for worker in self._workers), return_exceptions=True)
+            await self._broker.stop()
+
+    async def _supervise(self, worker: ClusterWorker) -> None:
+        delay = 1.0
+        while True:
+            started_at = time.monotonic()
+            try:
+                await worker.start(self._command)
+            except OSError as e:
+                logger.error("Не удалось запустить процесс кластера", extra={'worker': worker.index, 'error': str(e)})
+            else:
+                logger.info("Процесс кластера запущен",
+                            extra={'worker': worker.index, 'pid': worker.pid, 'shards': worker.shard_ids})
+                return_code = await worker.wait()
+                logger.warning("Процесс кластера завершился, перезапуск",
+                               extra={'worker': worker.index, 'return_code': return_code, 'delay': delay})
+
+            # Как и у процесса API: после долгой стабильной работы задержка перезапуска сбрасывается
+            if time.monotonic() - started_at > self._max_restart_delay:
+                delay = 1.0
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_restart_delay)
+            self._restarts.inc(worker=str(worker.index))
+
+
+def cluster_client_from_env() -> Optional[ClusterClient]:
+    # Процесс бота внутри кластера получает CLUSTER_ID от лаунчера
+    if os.getenv('CLUSTER_ID') is None:
+        return None
+    shard_ids = os.getenv('SHARD_IDS')
+    return ClusterClient(
+        path=os.getenv('CLUSTER_SOCKET', DEFAULT_SOCKET),
+        process_id=int(os.getenv('CLUSTER_ID')),
+        shard_ids=[int(part) for part in shard_ids.split(',') if part.strip()] if shard_ids else [],
+        backlog_size=int(os.getenv('CLUSTER_BACKLOG', 10000))
+    )
@@ -1,9 +1,15 @@
 import discord
 import asyncio
+import logging
 from src.core.base_command import PermissionCommand
 from src.database_firebase import save_capt, get_capt, remove_capt
+from src.sharding import shard_monitor
 from src.views import CaptView
 
+logger = logging.getLogger(__name__)
+
+SHARD_RECONNECT_WAIT = 60
+
 
 class CreateCaptCommand(PermissionCommand):
     
@@ -107,10 +113,15 @@ class AutoTimeoutHandler:
         self.timer_minutes = timer_minutes
     
     async def schedule(self):
-        asyncio.create_task(self._execute_timeout())
+        shard_id = shard_monitor.shard_for_guild(self.interaction.guild_id)
+        shard_monitor.spawn(shard_id, self._execute_timeout(shard_id), name=f"capt-timeout-{self.message.id}")
     
-    async def _execute_timeout(self):
+    async def _execute_timeout(self, shard_id: int):
         await asyncio.sleep(self.timer_minutes * 60)
+        # Пока шард переподключается, нажатия кнопок не доходят: итог набора считаем после восстановления
+        if not await shard_monitor.wait_connected(shard_id, timeout=SHARD_RECONNECT_WAIT):
+            logger.warning("Шард не переподключился, группа завершается по последним данным",
+                           extra={'guild_id': self.interaction.guild_id, 'shard': shard_id})
         
         try:
             capt_info = get_capt(self.interaction.guild_id, self.message.id)
@@ -126,5 +137,5 @@ class AutoTimeoutHandler:
                 await self.message.delete()
                 remove_capt(self.interaction.guild_id, self.message.id)
                 
-        except Exception as e:
-            print(f"Ошибка при завершении группы: {e}")
\ No newline at end of file
+        except Exception:
+            logger.exception("Ошибка при завершении группы", extra={'guild_id': self.interaction.guild_id})
\ No newline at end of file
@@ -1,7 +1,15 @@
-from .blacklist_commands import BlacklistCommand, UnblacklistCommand, BlacklistChannelCommand
+from .blacklist_commands import (
+    BlacklistCommand,
+    UnblacklistCommand,
+    BlacklistChannelCommand,
+    BlacklistImportCommand,
+    BlacklistExportCommand
+)
 
 __all__ = [
     'BlacklistCommand',
     'UnblacklistCommand', 
-    'BlacklistChannelCommand'
+    'BlacklistChannelCommand',
+    'BlacklistImportCommand',
+    'BlacklistExportCommand'
 ] 
\ No newline at end of file
@@ -1,13 +1,27 @@
+import asyncio
+import io
 import discord
 from typing import Tuple, Optional
+from src.ban_worker import ban_worker_pool
+from src.blacklist_io import FORMATS, MAX_IMPORT_BYTES, PartialImportError, detect_format, parse_entries, serialize
 from src.core.base_command import PermissionCommand
 from src.database_firebase import (
     save_settings, 
     add_to_blacklist, 
+    bulk_add_to_blacklist,
+    get_blacklist,
     get_blacklist_report_channel,
     is_blacklisted,
     remove_from_blacklist
 )
+from src.sharding import shard_monitor
+
+BAN_RESULT_NAMES = {
+    'banned': 'забанено',
+    'not_found': 'не найдено',
+    'forbidden': 'нет прав',
+    'error': 'ошибки'
+}
 
 
 class BlacklistChannelCommand(PermissionCommand):
@@ -69,7 +83,7 @@ class BlacklistCommand(PermissionCommand):
             )
             return None
 
-        report_channel = interaction.guild.get_channel(int(report_channel_id))
+        report_channel = interaction.guild.get_channel(report_channel_id)
         if not report_channel:
             await self.handle_error(
                 interaction, 
@@ -218,7 +232,7 @@ class UnblacklistCommand(PermissionCommand):
             if not report_channel_id:
                 return
             
-            report_channel = interaction.guild.get_channel(int(report_channel_id))
+            report_channel = interaction.guild.get_channel(report_channel_id)
             if not report_channel:
                 return
             
@@ -245,4 +259,144 @@ class UnblacklistCommand(PermissionCommand):
             await report_channel.send(embed=embed)
             
         except Exception:
-            pass
\ No newline at end of file
+            pass
+
+
+class BlacklistImportCommand(PermissionCommand):
+    
+    def __init__(self, bot: discord.Client):
+        super().__init__(
+            bot=bot,
+            name="blacklistimport",
+            description="📥 Импортировать черный список из CSV/JSONL",
+            required_permission="blacklist"
+        )
+    
+    async def execute(self, interaction: discord.Interaction, file: discord.Attachment, **kwargs) -> None:
+        if not await self.validate(interaction):
+            return
+        
+        if file.size > MAX_IMPORT_BYTES:
+            await self.handle_error(interaction, "❌ Файл слишком большой. Максимальный размер — 2 МБ.")
+            return
+        
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        
+        try:
+            content = await file.read()
+            entries, errors = parse_entries(content, detect_format(file.filename, file.content_type))
+        except (ValueError, UnicodeDecodeError) as e:
+            await self.handle_error(interaction, f"❌ Не удалось разобрать файл: {e}")
+            return
+        except discord.HTTPException:
+            await self.handle_error(interaction, "❌ Не удалось скачать файл.")
+            return
+        
+        if not entries:
+            await self.handle_error(interaction, "❌ В файле нет корректных записей.")
+            return
+        
+        # Пакетная запись блокирует поток, поэтому уходит из цикла событий
+        interrupted = False
+        try:
+            written = await asyncio.to_thread(bulk_add_to_blacklist, interaction.guild_id, entries, interaction.user.id)
+        except PartialImportError as e:
+            written, interrupted = e.written, True
+        bans = self._queue_bans(interaction, entries[:written])
+        
+        await interaction.followup.send(
+            embed=self._create_import_embed(len(entries), written, errors, len(bans), interrupted),
+            ephemeral=True
+        )
+        if bans:
+            # spawn держит ссылку на задачу: без неё сборщик мусора может снять отчёт посреди ожидания банов
+            shard_id = shard_monitor.shard_for_guild(interaction.guild_id)
+            shard_monitor.spawn(shard_id, self._report_bans(interaction, bans), name=f"import-bans-{interaction.id}")
+    
+    def _queue_bans(self, interaction: discord.Interaction, entries) -> list:
+        bot_member = interaction.guild.me
+        if not bot_member or not bot_member.guild_permissions.ban_members:
+            return []
+        
+        return [
+            ban_worker_pool.submit(
+                interaction.guild,
+                int(entry['user_id']),
+                f"Добавлен в черный список (импорт): {entry['reason']}"[:512]
+            )
+            for entry in entries
+        ]
+    
+    async def _report_bans(self, interaction: discord.Interaction, bans: list) -> None:
+        results = {}
+        for result in await asyncio.gather(*bans, return_exceptions=True):
+            key = 'error' if isinstance(result, Exception) else result
+            results[key] = results.get(key, 0) + 1
+        
+        summary = ", ".join(f"{BAN_RESULT_NAMES.get(key, key)}: {count}" for key, count in sorted(results.items()))
+        try:
+            await interaction.followup.send(f"🔨 Баны по импорту завершены — {summary}", ephemeral=True)
+        except discord.HTTPException:
+            # Токен взаимодействия живёт 15 минут, длинная очередь банов может его пережить
+            pass
+    
+    def _create_import_embed(self, parsed: int, written: int, errors: list, queued_bans: int,
+                             interrupted: bool = False) -> discord.Embed:
+        if interrupted:
+            color = 0xFF0000
+        else:
+            color = 0x00FF00 if written == parsed and not errors else 0xFFA500
+        embed = discord.Embed(title="📥 Импорт черного списка", color=color)
+        
+        embed.add_field(name="✅ Записано", value=f"{written} из {parsed}", inline=True)
+        embed.add_field(
+            name="🔨 Баны",
+            value=f"В очереди: {queued_bans}" if queued_bans else "Нет прав на бан участников",
+            inline=True
+        )
+        
+        if interrupted:
+            embed.add_field(
+                name="❌ Запись прервана ошибкой базы данных",
+                value=f"Успели записаться {written} из {parsed}. Повторный импорт того же файла безопасен.",
+                inline=False
+            )
+        
+        if errors:
+            shown = "\n".join(errors[:10])
+            if len(errors) > 10:
+                shown += f"\n… и ещё {len(errors) - 10}"
+            embed.add_field(name=f"⚠️ Пропущено строк: {len(errors)}", value=shown[:1024], inline=False)
+        
+        return embed
+
+
+class BlacklistExportCommand(PermissionCommand):
+    
+    def __init__(self, bot: discord.Client):
+        super().__init__(
+            bot=bot,
+            name="blacklistexport",
+            description="📤 Выгрузить черный список в CSV/JSONL",
+            required_permission="blacklist"
+        )
+    
+    async def execute(self, interaction: discord.Interaction, format: str = None, **kwargs) -> None:
+        if not await self.validate(interaction):
+            return
+        
+        format = (format or 'csv').lower()
+        if format not in FORMATS:
+            await self.handle_error(interaction, "❌ Поддерживаются форматы: csv, jsonl.")
+            return
+        
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        
+        blacklist = await asyncio.to_thread(get_blacklist, interaction.guild_id)
+        content = "".join(serialize(blacklist.items(), format)).encode('utf-8')
+        
+        await interaction.followup.send(
+            f"📤 Записей в черном списке: **{len(blacklist)}**",
+            file=discord.File(io.BytesIO(content), filename=f"blacklist_{interaction.guild_id}.{format}"),
+            ephemeral=True
+        )
\ No newline at end of file
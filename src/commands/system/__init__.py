@@ -1,7 +1,9 @@
 from .help_command import HelpCommand
+from .perf_command import PerfCommand
 from .sync_command import SyncCommand
 
 __all__ = [
     'HelpCommand',
+    'PerfCommand',
     'SyncCommand'
 ] 
\ No newline at end of file
@@ -208,7 +208,11 @@ class HelpView(discord.ui.View):
             moderation_commands.extend([
                 "**`/blacklist`** ⛔",
                 "└ Добавление пользователя в черный список",
-                "└ *Блокировка по Discord ID и игровому ID*"
+                "└ *Блокировка по Discord ID и игровому ID*",
+                "",
+                "**`/blacklistimport`** 📥 / **`/blacklistexport`** 📤",
+                "└ Массовый импорт и выгрузка черного списка",
+                "└ *Файлы CSV или JSONL*"
             ])
         
         if await check_command_permission(self.interaction, 'unblacklist'):
@@ -248,6 +252,10 @@ class HelpView(discord.ui.View):
                 "**`/sync`** 🔄\n"
                 "└ Принудительная синхронизация команд\n"
                 "└ *Обновление команд в интерфейсе Discord*\n"
+                "└ ⚠️ **Только для владельцев бота**\n\n"
+                "**`/perf`** 📊\n"
+                "└ Задержки, нагрузка на Firestore и кэши\n"
+                "└ *Лаг цикла событий, p95 команд, очередь банов*\n"
                 "└ ⚠️ **Только для владельцев бота**"
             ),
             inline=False
@@ -0,0 +1,227 @@
+import discord
+from src.ban_worker import ban_worker_pool
+from src.cache import cache_registry
+from src.core.base_command import OwnerCommand
+from src.datastore_metrics import datastore_metrics
+from src.loop_monitor import loop_monitor
+from src.memory import memory_reporter
+from src.metrics import metrics_registry
+from src.sharding import shard_monitor
+from src.tracing import tracer
+
+FIELD_LIMIT = 1024
+MAX_ROWS = 15
+
+
+def _ms(value) -> str:
+    # До подключения к шлюзу bot.latency равен nan
+    if value is None or value != value:
+        return "—"
+    return f"{value * 1000:.0f} мс"
+
+
+def _bytes(value) -> str:
+    if value is None:
+        return "—"
+    for unit in ("Б", "КиБ", "МиБ"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "Б" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} ГиБ"
+
+
+def _lines(rows: list, empty: str) -> str:
+    text = ""
+    for row in rows[:MAX_ROWS]:
+        # Поле embed ограничено 1024 символами: хвост отбрасывается целыми строками
+        if len(text) + len(row) + 1 > FIELD_LIMIT:
+            break
+        text += row + "\n"
+    return text or empty
+
+
+class PerfCommand(OwnerCommand):
+
+    def __init__(self, bot: discord.Client):
+        super().__init__(
+            bot=bot,
+            name="perf",
+            description="📊 Показать задержки, нагрузку на Firestore и статистику кэшей"
+        )
+
+    async def execute(self, interaction: discord.Interaction, **kwargs) -> None:
+        if not await self.validate(interaction):
+            return
+
+        view = PerfView(self._bot, interaction)
+        await interaction.response.send_message(embed=await view.current_embed(), view=view, ephemeral=True)
+
+
+class PerfView(discord.ui.View):
+    PAGES = ("overview", "commands", "interactions", "caches", "loop", "memory")
+
+    def __init__(self, bot: discord.Client, interaction: discord.Interaction):
+        super().__init__(timeout=300)
+        self.bot = bot
+        self.interaction = interaction
+        self.page = 0
+
+    async def current_embed(self) -> discord.Embed:
+        name = self.PAGES[self.page]
+        if name == "memory":
+            # Обход кэшей идёт в потоке, а проход по всем объектам gc на странице не делается: это цикл шлюза бота
+            embed = self._memory_page(await memory_reporter.report_async(top=MAX_ROWS, include_types=False))
+        else:
+            embed = getattr(self, f"_{name}_page")()
+        embed.set_footer(text=f"Страница {self.page + 1}/{len(self.PAGES)} • данные на момент запроса")
+        return embed
+
+    def _overview_page(self) -> discord.Embed:
+        embed = discord.Embed(title="📊 Производительность бота", color=0x2f3136)
+
+        loop = loop_monitor.report(top=0)
+        lag = loop['lag']
+        embed.add_field(
+            name="⏱️ Цикл событий",
+            value=(
+                f"p50: **{_ms(lag['p50'])}** • p95: **{_ms(lag['p95'])}** • p99: **{_ms(lag['p99'])}**\n"
+                f"Максимум: **{_ms(lag['max'])}** • Блокировок > {loop['threshold_ms']:.0f} мс: **{loop['stalls']}**\n"
+                f"Задержка шлюза Discord: **{_ms(self.bot.latency)}**"
+            ),
+            inline=False
+        )
+
+        rate = datastore_metrics.per_minute()
+        embed.add_field(
+            name="🔥 Firestore за минуту",
+            value=(
+                f"Запросов: **{rate['requests']:.0f}**\n"
+                f"Прочитано документов: **{rate['reads']:.0f}**\n"
+                f"Записано документов: **{rate['writes']:.0f}**"
+            ),
+            inline=True
+        )
+
+        restored = metrics_registry.get('persistent_views_restored')
+        embed.add_field(
+            name="🧩 Очереди и view",
+            value=(
+                f"Очередь банов: **{ban_worker_pool.depth}**\n"
+                f"View восстановлено при запуске: **{restored.total() if restored else 0:.0f}**\n"
+                f"Постоянных view сейчас: **{len(self.bot.persistent_views)}**"
+            ),
+            inline=True
+        )
+
+        if shard_monitor.sharded:
+            rows = []
+            for shard in shard_monitor.snapshot():
+                rate = shard['events_per_second']
+                rows.append(
+                    f"`#{shard['shard']}` {'🟢' if shard['connected'] else '🔴'} {_ms(shard['latency'])} • "
+                    f"серверов {shard['guilds']} • событий/с {f'{rate:.1f}' if rate is not None else '—'}"
+                )
+            embed.add_field(name="🛰️ Шарды", value=_lines(rows, "Шарды ещё не подключены"), inline=False)
+        return embed
+
+    def _latency_rows(self, commands: bool) -> list:
+        rows = []
+        for item in tracer.summary(top_spans=1):
+            if item['interaction'].startswith("command.") != commands:
+                continue
+            name = f"/{item['interaction'][len('command.'):]}" if commands else item['interaction']
+            row = f"`{name}` p95 **{_ms(item['p95'])}** • p50 {_ms(item['p50'])} • {item['count']} шт."
+            if item['spans']:
+                slowest = item['spans'][0]
+                row += f"\n└ дольше всего: `{slowest['name']}` p95 {_ms(slowest['p95'])}"
+            rows.append(row)
+        return rows
+
+    def _commands_page(self) -> discord.Embed:
+        embed = discord.Embed(title="⌨️ Слэш-команды (скользящее окно)", color=0x2f3136)
+        embed.add_field(
+            name="Задержка по командам",
+            value=_lines(self._latency_rows(commands=True), "Команды ещё не вызывались"),
+            inline=False
+        )
+        return embed
+
+    def _interactions_page(self) -> discord.Embed:
+        embed = discord.Embed(title="🖱️ Кнопки и формы (скользящее окно)", color=0x2f3136)
+        embed.add_field(
+            name="Задержка по взаимодействиям",
+            value=_lines(self._latency_rows(commands=False), "Взаимодействий ещё не было"),
+            inline=False
+        )
+        return embed
+
+    def _caches_page(self) -> discord.Embed:
+        embed = discord.Embed(title="🗄️ Кэши", color=0x2f3136)
+        rows = []
+        stats = sorted(cache_registry.stats().items(), key=lambda item: item[1]['hits'] + item[1]['misses'], reverse=True)
+        for namespace, cache in stats:
+            rows.append(
+                f"`{namespace}` **{cache['hit_ratio'] * 100:.1f}%** "
+                f"({cache['hits']}/{cache['hits'] + cache['misses']}) • записей {cache['size']}/{cache['max_size']}"
+            )
+        embed.add_field(name="Доля попаданий", value=_lines(rows, "Кэши не созданы"), inline=False)
+        return embed
+
+    def _loop_page(self) -> discord.Embed:
+        embed = discord.Embed(title="🐢 Блокировки цикла событий", color=0x2f3136)
+        rows = []
+        for offender in loop_monitor.report(top=MAX_ROWS)['offenders']:
+            rows.append(
+                f"`{offender['location']}`\n"
+                f"└ {offender['blocked_seconds']:.2f} с • блокировок {offender['stalls']} • `{offender['culprit']}`"
+            )
+        embed.add_field(name="Худшие места", value=_lines(rows, "Блокировок не обнаружено"), inline=False)
+        return embed
+
+    def _memory_page(self, report) -> discord.Embed:
+        embed = discord.Embed(title="🧠 Память", color=0x2f3136)
+        process = report['process']
+        embed.add_field(
+            name="Процесс",
+            value=f"Резидентная: **{_bytes(process['resident_bytes'])}** • пик {_bytes(process['peak_resident_bytes'])}",
+            inline=False
+        )
+        rows = [
+            f"`{item['name']}` **{_bytes(item['retained_bytes'])}**"
+            + (f" • записей {item['entries']}" if item['entries'] is not None else "")
+            for item in report['components']
+        ]
+        embed.add_field(name="По компонентам", value=_lines(rows, "Компоненты не зарегистрированы"), inline=False)
+        if report['allocations']:
+            rows = [f"`{item['location']}` {_bytes(item['size_bytes'])}" for item in report['allocations']]
+            embed.add_field(name="Места аллокаций", value=_lines(rows, "Нет данных"), inline=False)
+        return embed
+
+    async def _show(self, interaction: discord.Interaction) -> None:
+        await interaction.response.edit_message(embed=await self.current_embed(), view=self)
+
+    @discord.ui.button(label="◀️", style=discord.ButtonStyle.secondary)
+    async def previous_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = (self.page - 1) % len(self.PAGES)
+        await self._show(interaction)
+
+    @discord.ui.button(label="🔄 Обновить", style=discord.ButtonStyle.primary)
+    async def refresh_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction)
+
+    @discord.ui.button(label="▶️", style=discord.ButtonStyle.secondary)
+    async def next_button(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page = (self.page + 1) % len(self.PAGES)
+        await self._show(interaction)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        return interaction.user.id == self.interaction.user.id
+
+    async def on_timeout(self) -> None:
+        for item in self.children:
+            item.disabled = True
+
+        try:
+            await self.interaction.edit_original_response(view=self)
+        except:
+            pass
@@ -10,7 +10,7 @@ class CommandFactory(ICommandFactory):
         self._register_default_commands()
     
     def _register_default_commands(self):
-        from src.commands.system import HelpCommand, SyncCommand
+        from src.commands.system import HelpCommand, PerfCommand, SyncCommand
         from src.commands.role_management import ManageRolesCommand
         from src.commands.applications import (
             AddFormCommand, 
@@ -21,11 +21,14 @@ class CommandFactory(ICommandFactory):
         from src.commands.moderation import (
             BlacklistCommand,
             UnblacklistCommand, 
-            BlacklistChannelCommand
+            BlacklistChannelCommand,
+            BlacklistImportCommand,
+            BlacklistExportCommand
         )
         
         self.register_command_type("help", HelpCommand)
         self.register_command_type("sync", SyncCommand)
+        self.register_command_type("perf", PerfCommand)
         self.register_command_type("manageroles", ManageRolesCommand)
         self.register_command_type("addform", AddFormCommand)
         self.register_command_type("approvchannel", ApprovalChannelCommand)
@@ -34,6 +37,8 @@ class CommandFactory(ICommandFactory):
         self.register_command_type("blacklist", BlacklistCommand)
         self.register_command_type("unblacklist", UnblacklistCommand)
         self.register_command_type("blacklistchannel", BlacklistChannelCommand)
+        self.register_command_type("blacklistimport", BlacklistImportCommand)
+        self.register_command_type("blacklistexport", BlacklistExportCommand)
     
     def register_command_type(self, command_type: str, command_class: ICommand) -> None:
         if not issubclass(command_class, BaseCommand):
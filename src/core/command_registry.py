@@ -2,11 +2,14 @@ from typing import Dict, Optional, List
 import discord
 from discord import app_commands
 import json
+import logging
 import os
 from .interfaces import ICommand, ICommandRegistry
 from .command_factory import command_factory
 from src.permissions import universal_permission_check
 
+logger = logging.getLogger(__name__)
+
 
 class SlashCommandConfigLoader:
     
@@ -18,10 +21,10 @@ class SlashCommandConfigLoader:
                 config = json.load(f)
             return SlashCommandConfigLoader._parse_parameter_types(config)
         except FileNotFoundError:
-            print(f"❌ Файл конфигурации {config_path} не найден!")
+            logger.error("Файл конфигурации команд не найден", extra={'path': config_path})
             return {}
         except json.JSONDecodeError as e:
-            print(f"❌ Ошибка парсинга JSON: {e}")
+            logger.error("Ошибка парсинга конфигурации команд", extra={'path': config_path, 'error': str(e)})
             return {}
     
     @staticmethod
@@ -37,6 +40,8 @@ class SlashCommandConfigLoader:
                         param_config['type'] = int
                     elif param_config.get('type') == 'str':
                         param_config['type'] = str
+                    elif param_config.get('type') == 'Attachment':
+                        param_config['type'] = discord.Attachment
         return config
 
 
@@ -62,6 +67,12 @@ class CommandWrapperFactory:
         if "user_id" in parameters and len(parameters) == 1:
             return CommandWrapperFactory._create_user_id_wrapper(command)
         
+        if "file" in parameters:
+            return CommandWrapperFactory._create_file_wrapper(command)
+        
+        if "format" in parameters:
+            return CommandWrapperFactory._create_format_wrapper(command)
+        
         return CommandWrapperFactory._create_no_params_wrapper(command)
     
     @staticmethod
@@ -108,6 +119,18 @@ class CommandWrapperFactory:
         async def wrapper(interaction: discord.Interaction, user_id: str) -> None:
             await command.execute(interaction, user_id=user_id)
         return wrapper
+    
+    @staticmethod
+    def _create_file_wrapper(command: ICommand):
+        async def wrapper(interaction: discord.Interaction, file: discord.Attachment) -> None:
+            await command.execute(interaction, file=file)
+        return wrapper
+    
+    @staticmethod
+    def _create_format_wrapper(command: ICommand):
+        async def wrapper(interaction: discord.Interaction, format: str = None) -> None:
+            await command.execute(interaction, format=format)
+        return wrapper
 
 
 class SlashCommandBuilder:
@@ -165,8 +188,8 @@ class CommandRegistry(ICommandRegistry):
             try:
                 command = command_factory.create_command(command_type, self._bot)
                 self.register_command(command)
-            except Exception as e:
-                print(f"❌ Ошибка создания команды {command_type}: {e}")
+            except Exception:
+                logger.exception("Ошибка создания команды", extra={'command': command_type})
     
     async def _register_slash_commands(self) -> None:
         for command_name, command in self._commands.items():
@@ -177,7 +200,7 @@ class CommandRegistry(ICommandRegistry):
     def unregister_command(self, name: str) -> bool:
         if name in self._commands:
             del self._commands[name]
-            print(f"🗑️ Команда {name} удалена")
+            logger.info("Команда удалена", extra={'command': name})
             return True
         return False
     
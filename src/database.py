@@ -1,10 +1,13 @@
 import json
+import logging
 import os
 from dotenv import load_dotenv
 import time
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class DatabaseManager:
     def __init__(self):
         self.settings_file = os.getenv('SETTINGS_FILE')
@@ -29,7 +32,7 @@ class DatabaseManager:
                     return {}
                 return json.loads(content)
         except (json.JSONDecodeError, PermissionError) as e:
-            print(f"Ошибка при загрузке файла {file_path}: {e}")
+            logger.error("Ошибка при загрузке файла", extra={'path': file_path, 'error': str(e)})
             return {}
     
     def _write_json_file(self, file_path, data):
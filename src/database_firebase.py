@@ -2,15 +2,91 @@ import discord
 import firebase_admin
 from firebase_admin import credentials, firestore
 import json
+import logging
 import os
 import time
 from typing import Optional, Dict, List, Any
 from dotenv import load_dotenv
 import asyncio
 import threading
+from src.blacklist_io import PartialImportError, chunked
+from src.cache import CacheRegistry, cache_registry
+from src.datastore_metrics import datastore_metrics, instrumented
+from src import events
+from src.events import ChangeEvent, data_change_bus
+from src.metrics import metrics_registry
+from src.tracing import traced
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+APPLICATION_RECORD_FIELDS = ['message_id', 'channel_id', 'applicant_id']
+
+
+class ApplicationRecord:
+    # Кэш держит только то, что нужно для проверок и восстановления view: embed_data остаётся в Firestore
+    __slots__ = ('channel_id', 'applicant_id')
+
+    def __init__(self, channel_id: str, applicant_id: str):
+        self.channel_id = channel_id
+        self.applicant_id = applicant_id
+
+    def __repr__(self) -> str:
+        return f"ApplicationRecord(channel_id={self.channel_id!r}, applicant_id={self.applicant_id!r})"
+
+
+def _parse_id(value) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class GuildSettings:
+    # Запись неизменяема и делится между всеми читателями кэша: id приводятся к int один раз при загрузке
+    __slots__ = (
+        'form_channel_id', 'approv_channel_id', 'approver_role_id', 'approved_role_id', 'blacklist_report_channel_id'
+    )
+
+    def __init__(self, form_channel_id=None, approv_channel_id=None, approver_role_id=None,
+                 approved_role_id=None, blacklist_report_channel_id=None):
+        for name, value in zip(self.__slots__, (form_channel_id, approv_channel_id, approver_role_id,
+                                                 approved_role_id, blacklist_report_channel_id)):
+            object.__setattr__(self, name, _parse_id(value))
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'GuildSettings':
+        if not data:
+            return EMPTY_SETTINGS
+        return cls(*(data.get(name) for name in cls.__slots__))
+
+    @property
+    def is_empty(self) -> bool:
+        return all(getattr(self, name) is None for name in self.__slots__)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("GuildSettings неизменяем")
+
+    def __delattr__(self, name):
+        raise AttributeError("GuildSettings неизменяем")
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, GuildSettings):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __hash__(self) -> int:
+        return hash(tuple(getattr(self, name) for name in self.__slots__))
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"GuildSettings({fields})"
+
+
+EMPTY_SETTINGS = GuildSettings()
+
+
 class FirebaseManager:
     def __init__(self):
         self._db = None
@@ -30,7 +106,7 @@ class FirebaseManager:
                 cred = credentials.Certificate(cred_path)
                 firebase_admin.initialize_app(cred)
             
-            self._db = firestore.client()
+            self._db = datastore_metrics.wrap_client(firestore.client())
             self._initialized = True
             
         except Exception as e:
@@ -39,29 +115,42 @@ class FirebaseManager:
     def _ensure_initialized(self):
         return self._initialized
 
-    def load_owners(self):
+    @property
+    def db(self):
+        return self._db
+
+    @property
+    def default_owners(self):
+        return tuple(self._default_owners)
+
+    @instrumented
+    def fetch_owners(self):
         if not self._ensure_initialized():
-            return self._default_owners
+            return None
         
+        owners_ref = self._db.collection('owners')
+        docs = owners_ref.stream()
+        
+        owners = []
+        for doc in docs:
+            owners.append(doc.id)
+        
+        if not owners:
+            for owner_id in self._default_owners:
+                if owner_id.strip():
+                    self._add_owner(owner_id.strip())
+                    owners.append(owner_id.strip())
+        
+        self._owners = owners
+        return owners
+
+    @instrumented
+    def load_owners(self):
         try:
-            owners_ref = self._db.collection('owners')
-            docs = owners_ref.stream()
-            
-            owners = []
-            for doc in docs:
-                owners.append(doc.id)
-            
-            if not owners:
-                for owner_id in self._default_owners:
-                    if owner_id.strip():
-                        self._add_owner(owner_id.strip())
-                        owners.append(owner_id.strip())
-            
-            self._owners = owners
-            return owners
-            
+            owners = self.fetch_owners()
         except Exception as e:
             return self._default_owners
+        return self._default_owners if owners is None else owners
 
     def _add_owner(self, user_id: str):
         try:
@@ -71,34 +160,28 @@ class FirebaseManager:
         except Exception as e:
             pass
 
+    @instrumented
     def is_owner(self, user_id):
         if not self._owners:
             self.load_owners()
         return str(user_id) in self._owners
 
-    def get_settings(self, guild_id):
+    @instrumented
+    def fetch_settings(self, guild_id):
         if not self._ensure_initialized():
-            return (None, None, None, None, None)
+            return None
         
+        doc = self._db.collection('guild_settings').document(str(guild_id)).get()
+        return doc.to_dict() if doc.exists else None
+
+    @instrumented
+    def get_settings(self, guild_id) -> GuildSettings:
         try:
-            doc_ref = self._db.collection('guild_settings').document(str(guild_id))
-            doc = doc_ref.get()
-            
-            if not doc.exists:
-                return (None, None, None, None, None)
-            
-            settings = doc.to_dict()
-            return (
-                settings.get('form_channel_id'),
-                settings.get('approv_channel_id'),
-                settings.get('approver_role_id'),
-                settings.get('approved_role_id'),
-                settings.get('blacklist_report_channel_id')
-            )
-            
+            return GuildSettings.from_dict(self.fetch_settings(guild_id))
         except Exception as e:
-            return (None, None, None, None, None)
+            return EMPTY_SETTINGS
 
+    @instrumented
     def save_settings(self, guild_id, form_channel_id=None, approv_channel_id=None,
                      approver_role_id=None, approved_role_id=None, blacklist_report_channel_id=None):
         if not self._ensure_initialized():
@@ -133,26 +216,31 @@ class FirebaseManager:
         except Exception as e:
             pass
 
-    def get_all_settings(self):
+    @instrumented
+    def fetch_all_settings(self):
         if not self._ensure_initialized():
             return {}
         
+        settings_ref = self._db.collection('guild_settings')
+        docs = settings_ref.stream()
+        
+        all_settings = {}
+        for doc in docs:
+            all_settings[doc.id] = doc.to_dict()
+        
+        return all_settings
+
+    @instrumented
+    def get_all_settings(self):
         try:
-            settings_ref = self._db.collection('guild_settings')
-            docs = settings_ref.stream()
-            
-            all_settings = {}
-            for doc in docs:
-                all_settings[doc.id] = doc.to_dict()
-            
-            return all_settings
-            
+            return self.fetch_all_settings()
         except Exception as e:
             return {}
 
+    @instrumented
     def save_application(self, guild_id, channel_id, message_id, applicant_id, embed_data):
         if not self._ensure_initialized():
-            print(f"❌ Firebase не инициализирован для save_application")
+            logger.error("Firebase не инициализирован", extra={'operation': 'save_application'})
             return
         
         try:
@@ -166,49 +254,112 @@ class FirebaseManager:
                 'created_at': firestore.SERVER_TIMESTAMP
             })
             
-            print(f"✅ Заявка сохранена: guild_id={guild_id}, applicant_id={applicant_id}, message_id={message_id}")
+            logger.info("Заявка сохранена", extra={
+                'sample': 'application_saved', 'guild_id': str(guild_id),
+                'applicant_id': str(applicant_id), 'message_id': str(message_id)
+            })
             
-        except Exception as e:
-            print(f"❌ Ошибка сохранения заявки: {e}")
+        except Exception:
+            logger.exception("Ошибка сохранения заявки", extra={'guild_id': str(guild_id), 'message_id': str(message_id)})
 
+    @instrumented
     def remove_application(self, guild_id, message_id):
         if not self._ensure_initialized():
-            print(f"❌ Firebase не инициализирован для remove_application")
+            logger.error("Firebase не инициализирован", extra={'operation': 'remove_application'})
             return
         
         try:
             doc_ref = self._db.collection('applications').document(f"{guild_id}_{message_id}")
             doc_ref.delete()
             
-            print(f"✅ Заявка удалена: guild_id={guild_id}, message_id={message_id}")
+            logger.info("Заявка удалена", extra={
+                'sample': 'application_removed', 'guild_id': str(guild_id), 'message_id': str(message_id)
+            })
             
-        except Exception as e:
-            print(f"❌ Ошибка удаления заявки: {e}")
+        except Exception:
+            logger.exception("Ошибка удаления заявки", extra={'guild_id': str(guild_id), 'message_id': str(message_id)})
+
+    def _lease_ref(self, guild_id, message_id):
+        return self._db.collection('review_leases').document(f"{guild_id}_{message_id}")
+
+    @instrumented
+    def acquire_review_lease(self, guild_id, message_id, user_id, holder: str, ttl: float):
+        """Сравнение с записью в транзакции: возвращает (получена ли аренда, id модератора, который её держит)"""
+        user_id = str(user_id)
+
+        @firestore.transactional
+        def acquire(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            lease = snapshot.to_dict() if snapshot.exists else None
+            now = time.time()
+            # Тот же модератор может перехватить свою аренду, в том числе с другого экземпляра
+            if lease and lease['expires_at'] > now and lease['user_id'] != user_id:
+                return False, lease['user_id']
+            transaction.set(ref, {
+                'guild_id': str(guild_id),
+                'message_id': str(message_id),
+                'user_id': user_id,
+                'holder': holder,
+                'expires_at': now + ttl
+            })
+            return True, user_id
 
-    def get_guild_applications(self, guild_id):
+        return acquire(self._db.transaction(), self._lease_ref(guild_id, message_id))
+
+    @instrumented
+    def renew_review_lease(self, guild_id, message_id, user_id, holder: str, ttl: float) -> bool:
+        user_id = str(user_id)
+
+        @firestore.transactional
+        def renew(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            lease = snapshot.to_dict() if snapshot.exists else None
+            if not lease or lease['holder'] != holder or lease['user_id'] != user_id:
+                return False
+            transaction.update(ref, {'expires_at': time.time() + ttl})
+            return True
+
+        return renew(self._db.transaction(), self._lease_ref(guild_id, message_id))
+
+    @instrumented
+    def release_review_lease(self, guild_id, message_id, holder: str) -> bool:
+        @firestore.transactional
+        def release(transaction, ref):
+            snapshot = ref.get(transaction=transaction)
+            lease = snapshot.to_dict() if snapshot.exists else None
+            # Чужую аренду не трогаем: после истечения её мог получить другой экземпляр
+            if not lease or lease['holder'] != holder:
+                return False
+            transaction.delete(ref)
+            return True
+
+        return release(self._db.transaction(), self._lease_ref(guild_id, message_id))
+
+    @instrumented
+    def fetch_guild_applications(self, guild_id):
         if not self._ensure_initialized():
             return {}
         
+        applications_ref = self._db.collection('applications')
+        query = applications_ref.where('guild_id', '==', str(guild_id)).select(APPLICATION_RECORD_FIELDS)
+        docs = query.stream()
+        
+        applications = {}
+        for doc in docs:
+            data = doc.to_dict()
+            applications[data['message_id']] = ApplicationRecord(data['channel_id'], data['applicant_id'])
+        
+        return applications
+
+    @instrumented
+    def get_guild_applications(self, guild_id):
         try:
-            applications_ref = self._db.collection('applications')
-            query = applications_ref.where('guild_id', '==', str(guild_id))
-            docs = query.stream()
-            
-            applications = {}
-            for doc in docs:
-                data = doc.to_dict()
-                applications[data['message_id']] = {
-                    'channel_id': data['channel_id'],
-                    'applicant_id': data['applicant_id'],
-                    'embed_data': data['embed_data']
-                }
-            
-            return applications
-            
-        except Exception as e:
-            print(f"❌ Ошибка в get_guild_applications: {e}")
+            return self.fetch_guild_applications(guild_id)
+        except Exception:
+            logger.exception("Ошибка загрузки заявок сервера", extra={'guild_id': str(guild_id)})
             return {}
 
+    @instrumented
     def save_capt(self, guild_id, channel_id, message_id, max_members, current_members=None, timer_minutes=None):
         if not self._ensure_initialized():
             return
@@ -235,6 +386,7 @@ class FirebaseManager:
         except Exception as e:
             pass
 
+    @instrumented
     def get_capt(self, guild_id, message_id):
         if not self._ensure_initialized():
             return None
@@ -258,6 +410,7 @@ class FirebaseManager:
         except Exception as e:
             return None
 
+    @instrumented
     def add_member_to_capt(self, guild_id, message_id, member_id):
         if not self._ensure_initialized():
             return False
@@ -284,6 +437,7 @@ class FirebaseManager:
         except Exception as e:
             return False
 
+    @instrumented
     def remove_member_from_capt(self, guild_id, message_id, member_id):
         if not self._ensure_initialized():
             return False
@@ -310,6 +464,7 @@ class FirebaseManager:
         except Exception as e:
             return False
 
+    @instrumented
     def remove_capt(self, guild_id, message_id):
         if not self._ensure_initialized():
             return False
@@ -322,6 +477,7 @@ class FirebaseManager:
         except Exception as e:
             return False
 
+    @instrumented
     def add_to_blacklist(self, guild_id, user_id, reason, reporter_id, static_id=None):
         if not self._ensure_initialized():
             return False
@@ -342,6 +498,36 @@ class FirebaseManager:
         except Exception as e:
             return False
 
+    @instrumented
+    def bulk_add_to_blacklist(self, guild_id, entries, reporter_id):
+        if not self._ensure_initialized():
+            return 0
+        
+        written = 0
+        collection = self._db.collection('blacklist')
+        timestamp = str(int(time.time()))
+        try:
+            for chunk in chunked(entries):
+                batch = self._db.batch()
+                for entry in chunk:
+                    batch.set(collection.document(f"{guild_id}_{entry['user_id']}"), {
+                        'guild_id': str(guild_id),
+                        'user_id': str(entry['user_id']),
+                        'reason': entry['reason'],
+                        'reporter_id': str(entry.get('reporter_id') or reporter_id),
+                        'timestamp': entry.get('timestamp') or timestamp,
+                        'static_id': entry.get('static_id'),
+                        'created_at': firestore.SERVER_TIMESTAMP
+                    })
+                batch.commit()
+                written += len(chunk)
+        except Exception as e:
+            logger.exception("Ошибка пакетной записи черного списка", extra={'guild_id': str(guild_id), 'written': written})
+            raise PartialImportError(written, len(entries)) from e
+        
+        return written
+
+    @instrumented
     def remove_from_blacklist(self, guild_id, user_id):
         if not self._ensure_initialized():
             return False
@@ -354,50 +540,58 @@ class FirebaseManager:
         except Exception as e:
             return False
 
-    def is_blacklisted(self, guild_id, user_id):
+    @instrumented
+    def fetch_is_blacklisted(self, guild_id, user_id):
         if not self._ensure_initialized():
             return False
         
+        doc = self._db.collection('blacklist').document(f"{guild_id}_{user_id}").get()
+        return doc.exists
+
+    @instrumented
+    def is_blacklisted(self, guild_id, user_id):
         try:
-            doc_ref = self._db.collection('blacklist').document(f"{guild_id}_{user_id}")
-            doc = doc_ref.get()
-            return doc.exists
-            
+            return self.fetch_is_blacklisted(guild_id, user_id)
         except Exception as e:
             return False
 
-    def get_blacklist(self, guild_id):
+    @instrumented
+    def fetch_blacklist(self, guild_id):
         if not self._ensure_initialized():
             return {}
         
+        blacklist_ref = self._db.collection('blacklist')
+        query = blacklist_ref.where(filter=('guild_id', '==', str(guild_id)))
+        docs = query.stream()
+        
+        blacklist = {}
+        for doc in docs:
+            data = doc.to_dict()
+            blacklist[data['user_id']] = {
+                'reason': data['reason'],
+                'reporter_id': data['reporter_id'],
+                'timestamp': data['timestamp'],
+                'static_id': data.get('static_id')
+            }
+        
+        return blacklist
+
+    @instrumented
+    def get_blacklist(self, guild_id):
         try:
-            blacklist_ref = self._db.collection('blacklist')
-            query = blacklist_ref.where(filter=('guild_id', '==', str(guild_id)))
-            docs = query.stream()
-            
-            blacklist = {}
-            for doc in docs:
-                data = doc.to_dict()
-                blacklist[data['user_id']] = {
-                    'reason': data['reason'],
-                    'reporter_id': data['reporter_id'],
-                    'timestamp': data['timestamp'],
-                    'static_id': data.get('static_id')
-                }
-            
-            return blacklist
-            
+            return self.fetch_blacklist(guild_id)
         except Exception as e:
             return {}
 
+    @instrumented
     def get_blacklist_report_channel(self, guild_id):
-        settings = self.get_settings(guild_id)
-        return settings[4] if settings and len(settings) > 4 else None
+        return self.get_settings(guild_id).blacklist_report_channel_id
 
+    @instrumented
     def has_pending_application(self, guild_id, applicant_id):
         """Проверяет, есть ли у пользователя активная заявка на сервере"""
         if not self._ensure_initialized():
-            print(f"❌ Firebase не инициализирован для has_pending_application")
+            logger.error("Firebase не инициализирован", extra={'operation': 'has_pending_application'})
             return False
         
         try:
@@ -406,42 +600,47 @@ class FirebaseManager:
             query = applications_ref.where('guild_id', '==', str(guild_id)).where('applicant_id', '==', str(applicant_id))
             docs = list(query.stream())
             
-            print(f"🔍 Проверка заявки: guild_id={guild_id}, applicant_id={applicant_id}, найдено документов: {len(docs)}")
+            logger.debug("Проверка заявки", extra={
+                'guild_id': str(guild_id), 'applicant_id': str(applicant_id), 'documents': len(docs)
+            })
             
             return len(docs) > 0
             
-        except Exception as e:
-            print(f"❌ Ошибка в has_pending_application: {e}")
+        except Exception:
+            logger.exception("Ошибка проверки активной заявки", extra={'guild_id': str(guild_id), 'applicant_id': str(applicant_id)})
             return False
 
+    @instrumented
     def has_pending_application_alternative(self, guild_id, applicant_id):
         """Альтернативная проверка заявок через get_guild_applications"""
         try:
             applications = self.get_guild_applications(guild_id)
             for message_id, app_data in applications.items():
-                if app_data['applicant_id'] == str(applicant_id):
-                    print(f"✅ Найдена активная заявка: message_id={message_id}, applicant_id={applicant_id}")
+                if app_data.applicant_id == str(applicant_id):
+                    logger.debug("Найдена активная заявка", extra={'message_id': message_id, 'applicant_id': str(applicant_id)})
                     return True
             
-            print(f"🔍 Активных заявок не найдено для applicant_id={applicant_id} на сервере {guild_id}")
+            logger.debug("Активных заявок не найдено", extra={'guild_id': str(guild_id), 'applicant_id': str(applicant_id)})
             return False
             
-        except Exception as e:
-            print(f"❌ Ошибка в has_pending_application_alternative: {e}")
+        except Exception:
+            logger.exception("Ошибка альтернативной проверки заявки", extra={'guild_id': str(guild_id), 'applicant_id': str(applicant_id)})
             return False
 
-    async def has_pending_application_with_message_check(self, guild_id, applicant_id, bot):
+    @instrumented
+    async def has_pending_application_with_message_check(self, guild_id, applicant_id, bot, applications=None):
         """Проверка заявок с дополнительной проверкой существования сообщения в чате"""
         try:
-            applications = self.get_guild_applications(guild_id)
+            if applications is None:
+                applications = self.get_guild_applications(guild_id)
             
             for message_id, app_data in applications.items():
-                if app_data['applicant_id'] == str(applicant_id):
+                if app_data.applicant_id == str(applicant_id):
                     # Проверяем, существует ли сообщение в чате
                     try:
                         guild = bot.get_guild(int(guild_id))
                         if guild:
-                            channel = guild.get_channel(int(app_data['channel_id']))
+                            channel = guild.get_channel(int(app_data.channel_id))
                             if channel:
                                 message = await channel.fetch_message(int(message_id))
                                 # Проверяем, обработана ли заявка (есть ли поле "Рассмотрел заявку" в embed)
@@ -454,38 +653,39 @@ class FirebaseManager:
                                             break
                                 
                                 if not is_processed:
-                                    print(f"✅ Найдена активная заявка в чате: message_id={message_id}, applicant_id={applicant_id}")
+                                    logger.debug("Найдена активная заявка в чате", extra={'message_id': message_id, 'applicant_id': str(applicant_id)})
                                     return True
                                 else:
-                                    print(f"⚠️ Заявка найдена, но уже обработана модератором: message_id={message_id}")
+                                    logger.debug("Заявка уже обработана модератором", extra={'message_id': message_id})
                             else:
-                                print(f"⚠️ Канал не найден для заявки: channel_id={app_data['channel_id']}")
+                                logger.warning("Канал заявки не найден", extra={'message_id': message_id, 'channel_id': app_data.channel_id})
                         else:
-                            print(f"⚠️ Сервер не найден: guild_id={guild_id}")
+                            logger.warning("Сервер не найден", extra={'guild_id': str(guild_id)})
                     except discord.NotFound:
-                        print(f"⚠️ Сообщение заявки не найдено в чате: message_id={message_id}")
+                        logger.info("Сообщение заявки не найдено в чате", extra={'message_id': message_id})
                         # Сообщение удалено - заявка больше не активна
                         continue
                     except discord.Forbidden:
-                        print(f"⚠️ Нет доступа к каналу: channel_id={app_data['channel_id']}")
+                        logger.warning("Нет доступа к каналу заявки", extra={'channel_id': app_data.channel_id})
                         # Не можем проверить - считаем заявку активной на всякий случай
                         return True
-                    except Exception as e:
-                        print(f"❌ Ошибка проверки сообщения {message_id}: {e}")
+                    except Exception:
+                        logger.exception("Ошибка проверки сообщения заявки", extra={'message_id': message_id})
                         # В случае ошибки считаем заявку активной
                         return True
             
-            print(f"🔍 Активных заявок не найдено для applicant_id={applicant_id} на сервере {guild_id}")
+            logger.debug("Активных заявок не найдено", extra={'guild_id': str(guild_id), 'applicant_id': str(applicant_id)})
             return False
             
-        except Exception as e:
-            print(f"❌ Ошибка в has_pending_application_with_message_check: {e}")
+        except Exception:
+            logger.exception("Ошибка проверки заявки с сообщением", extra={'guild_id': str(guild_id), 'applicant_id': str(applicant_id)})
             return False
 
+    @instrumented
     def save_role_permissions(self, guild_id, role_id, permissions):
         """Сохраняет разрешения для роли"""
         if not self._ensure_initialized():
-            print(f"❌ Firebase не инициализирован для save_role_permissions")
+            logger.error("Firebase не инициализирован", extra={'operation': 'save_role_permissions'})
             return False
         
         try:
@@ -498,31 +698,32 @@ class FirebaseManager:
             })
             return True
             
-        except Exception as e:
-            print(f"❌ Ошибка при сохранении разрешений: {e}")
+        except Exception:
+            logger.exception("Ошибка при сохранении разрешений", extra={'guild_id': str(guild_id), 'role_id': str(role_id)})
             return False
 
-    def get_role_permissions(self, guild_id, role_id):
-        """Получает разрешения для роли"""
+    @instrumented
+    def fetch_role_permissions(self, guild_id, role_id):
+        """Загружает разрешения роли, ошибки Firestore пробрасываются"""
         if not self._ensure_initialized():
-            print(f"❌ Firebase не инициализирован для get_role_permissions")
+            logger.error("Firebase не инициализирован", extra={'operation': 'get_role_permissions'})
             return []
         
+        doc = self._db.collection('role_permissions').document(f"{guild_id}_{role_id}").get()
+        if doc.exists:
+            return doc.to_dict().get('permissions', [])
+        return []
+
+    @instrumented
+    def get_role_permissions(self, guild_id, role_id):
+        """Получает разрешения для роли"""
         try:
-            doc_ref = self._db.collection('role_permissions').document(f"{guild_id}_{role_id}")
-            doc = doc_ref.get()
-            
-            if doc.exists:
-                data = doc.to_dict()
-                permissions = data.get('permissions', [])
-                return permissions
-            else:
-                return []
-            
-        except Exception as e:
-            print(f"❌ Ошибка при загрузке разрешений: {e}")
+            return self.fetch_role_permissions(guild_id, role_id)
+        except Exception:
+            logger.exception("Ошибка при загрузке разрешений", extra={'guild_id': str(guild_id), 'role_id': str(role_id)})
             return []
 
+    @instrumented
     def get_all_role_permissions(self, guild_id):
         """Получает все разрешения ролей для сервера"""
         if not self._ensure_initialized():
@@ -543,6 +744,7 @@ class FirebaseManager:
         except Exception as e:
             return {}
 
+    @instrumented
     def remove_role_permissions(self, guild_id, role_id):
         """Удаляет разрешения для роли"""
         if not self._ensure_initialized():
@@ -557,6 +759,7 @@ class FirebaseManager:
             return False
 
     @property
+    @instrumented
     def settings(self):
         try:
             return self.get_all_settings()
@@ -564,13 +767,14 @@ class FirebaseManager:
             return {}
 
     @property
+    @instrumented
     def applications(self):
         if not self._ensure_initialized():
             return {}
         
         try:
             applications_ref = self._db.collection('applications')
-            docs = applications_ref.stream()
+            docs = applications_ref.select(['guild_id', *APPLICATION_RECORD_FIELDS]).stream()
             
             result = {}
             for doc in docs:
@@ -581,11 +785,7 @@ class FirebaseManager:
                 if guild_id not in result:
                     result[guild_id] = {}
                 
-                result[guild_id][message_id] = {
-                    'channel_id': data['channel_id'],
-                    'applicant_id': data['applicant_id'],
-                    'embed_data': data['embed_data']
-                }
+                result[guild_id][message_id] = ApplicationRecord(data['channel_id'], data['applicant_id'])
             
             return result
             
@@ -593,6 +793,7 @@ class FirebaseManager:
             return {}
 
     @property
+    @instrumented
     def owner_data(self):
         if not self._ensure_initialized():
             return {
@@ -625,52 +826,207 @@ class FirebaseManager:
     def owner_list(self):
         return self._owners
 
+    @instrumented
     def sync_approver_role(self):
         pass
 
 
 class CacheManager:
-    def __init__(self, firebase_manager: FirebaseManager):
+    _ALL_APPLICATIONS_KEY = 'applications'
+    _ALL_SETTINGS_KEY = 'guild_settings'
+    _OWNER_LIST_KEY = 'owner_list'
+
+    def __init__(self, firebase_manager: FirebaseManager, registry: CacheRegistry = cache_registry):
         self._firebase_manager = firebase_manager
-        self._settings_cache = None
-        self._applications_cache = None
-        self._owners_cache = None
-        self._owners_list = None
+        self._negative_ttl = float(os.getenv('CACHE_NEGATIVE_TTL', 30))
+        self._guild_settings = registry.namespace('guild_settings', max_size=5000, ttl=300)
+        self._blacklist = registry.namespace('blacklist', max_size=20000, ttl=300)
+        self._guild_blacklist = registry.namespace('guild_blacklist', max_size=2000, ttl=300)
+        self._role_permissions = registry.namespace('role_permissions', max_size=10000, ttl=300)
+        self._guild_applications = registry.namespace('guild_applications', max_size=2000, ttl=120)
+        self._collections = registry.namespace('collections', max_size=16, ttl=120)
+        self._owners = registry.namespace('owners', max_size=16, ttl=300)
 
     def clear_cache(self):
-        self._settings_cache = None
-        self._applications_cache = None
-        self._owners_cache = None
-        self._owners_list = None
+        self._guild_settings.clear()
+        self._blacklist.clear()
+        self._guild_blacklist.clear()
+        self._role_permissions.clear()
+        self._guild_applications.clear()
+        self._collections.clear()
+        self._owners.clear()
+
+    def _cached(self, cache, key, loader, is_negative=None):
+        # Ответы "ничего нет" живут negative_ttl, ошибки Firestore не кэшируются и пробрасываются наверх
+        return cache.get_or_load(key, loader, is_negative=is_negative, negative_ttl=self._negative_ttl)
+
+    def _load(self, cache, key, loader, default, is_negative=None):
+        try:
+            return self._cached(cache, key, loader, is_negative)
+        except Exception as e:
+            return default
+
+    # load_* пробрасывают ошибки (их использует встроенный API, чтобы вернуть 500), get_* отдают значение по умолчанию
+
+    def load_settings(self, guild_id) -> GuildSettings:
+        return self._cached(
+            self._guild_settings,
+            str(guild_id),
+            lambda: GuildSettings.from_dict(self._firebase_manager.fetch_settings(guild_id)),
+            is_negative=lambda settings: settings.is_empty
+        )
+
+    def get_settings(self, guild_id) -> GuildSettings:
+        try:
+            return self.load_settings(guild_id)
+        except Exception as e:
+            return EMPTY_SETTINGS
+
+    def is_blacklisted(self, guild_id, user_id):
+        return self._load(
+            self._blacklist,
+            (str(guild_id), str(user_id)),
+            lambda: self._firebase_manager.fetch_is_blacklisted(guild_id, user_id),
+            False,
+            is_negative=lambda exists: not exists
+        )
+
+    def get_role_permissions(self, guild_id, role_id):
+        permissions = self._load(
+            self._role_permissions,
+            (str(guild_id), str(role_id)),
+            lambda: tuple(self._firebase_manager.fetch_role_permissions(guild_id, role_id)),
+            (),
+            is_negative=lambda permissions: not permissions
+        )
+        return list(permissions)
+
+    def load_guild_applications(self, guild_id):
+        return self._cached(
+            self._guild_applications,
+            str(guild_id),
+            lambda: self._firebase_manager.fetch_guild_applications(guild_id)
+        )
+
+    def get_guild_applications(self, guild_id):
+        try:
+            return self.load_guild_applications(guild_id)
+        except Exception:
+            logger.exception("Ошибка загрузки заявок сервера", extra={'guild_id': str(guild_id)})
+            return {}
+
+    def load_blacklist(self, guild_id):
+        return self._cached(
+            self._guild_blacklist,
+            str(guild_id),
+            lambda: self._firebase_manager.fetch_blacklist(guild_id),
+            is_negative=lambda blacklist: not blacklist
+        )
+
+    def get_blacklist(self, guild_id):
+        try:
+            return self.load_blacklist(guild_id)
+        except Exception as e:
+            return {}
+
+    def load_settings_cache(self):
+        return self._cached(self._collections, self._ALL_SETTINGS_KEY, self._firebase_manager.fetch_all_settings)
 
     def get_settings_cache(self):
-        if self._settings_cache is None:
-            self._settings_cache = self._firebase_manager.settings
-        return self._settings_cache
+        try:
+            return self.load_settings_cache()
+        except Exception as e:
+            return {}
 
     def get_applications_cache(self):
-        if self._applications_cache is None:
-            self._applications_cache = self._firebase_manager.applications
-        return self._applications_cache
+        return self._collections.get_or_load(
+            self._ALL_APPLICATIONS_KEY,
+            lambda: self._firebase_manager.applications
+        )
 
     def get_owners_cache(self):
-        if self._owners_cache is None:
-            self._owners_cache = self._firebase_manager.owner_data
-        return self._owners_cache
+        # Роли проверяющих сюда не входят: их сбор читал настройки всех серверов на каждый промах кэша,
+        # роль конкретного сервера отдаёт get_approver_role_id
+        return {'owners': list(self.get_owners_list())}
+
+    def _fetch_owners(self):
+        owners = self._firebase_manager.fetch_owners()
+        if owners is None:
+            raise RuntimeError("Firebase не инициализирован")
+        return tuple(owners)
+
+    def load_owners(self):
+        return self._owners.get_or_load(self._OWNER_LIST_KEY, self._fetch_owners)
 
     def get_owners_list(self):
-        if self._owners_list is None:
-            self._owners_list = self._firebase_manager.owner_list
-        return self._owners_list
+        # Ошибка или неинициализированная база не кэшируются: DEFAULT_OWNERS отдаются в обход кэша,
+        # и следующий вызов снова идёт в Firestore
+        try:
+            return self.load_owners()
+        except Exception as e:
+            return self._firebase_manager.default_owners
+
+    def is_owner(self, user_id):
+        return str(user_id) in self.get_owners_list()
+
+    def get_approver_role_id(self, guild_id):
+        return self.get_settings(guild_id).approver_role_id
+
+    def invalidate_settings(self, guild_id):
+        self._guild_settings.invalidate(str(guild_id))
+        self._collections.invalidate(self._ALL_SETTINGS_KEY)
+
+    def invalidate_blacklist(self, guild_id, user_id):
+        self._blacklist.invalidate((str(guild_id), str(user_id)))
+        self._guild_blacklist.invalidate(str(guild_id))
+
+    def invalidate_guild_blacklist(self, guild_id):
+        guild_id = str(guild_id)
+        self._blacklist.invalidate_where(lambda key: key[0] == guild_id)
+        self._guild_blacklist.invalidate(guild_id)
+
+    def invalidate_role_permissions(self, guild_id, role_id):
+        self._role_permissions.invalidate((str(guild_id), str(role_id)))
+
+    def invalidate_applications(self, guild_id):
+        self._guild_applications.invalidate(str(guild_id))
+        self._collections.invalidate(self._ALL_APPLICATIONS_KEY)
+
+    def invalidate_owners(self):
+        self._owners.clear()
 
     def refresh_owners_cache(self):
-        self._owners_cache = None
-        self._owners_list = None
-        self._firebase_manager.load_owners()
+        self.invalidate_owners()
+
+    def handle_change(self, event: ChangeEvent):
+        # Единая точка инвалидации: записи бота и встроенного API приходят через шину изменений
+        if event.collection == events.SETTINGS:
+            self.invalidate_settings(event.guild_id)
+        elif event.collection == events.APPLICATIONS:
+            self.invalidate_applications(event.guild_id)
+        elif event.collection == events.BLACKLIST:
+            if event.document_id is None:
+                self.invalidate_guild_blacklist(event.guild_id)
+            else:
+                self.invalidate_blacklist(event.guild_id, event.document_id)
+        elif event.collection == events.ROLE_PERMISSIONS:
+            self.invalidate_role_permissions(event.guild_id, event.document_id)
+        elif event.collection == events.OWNERS:
+            self.invalidate_owners()
+
+    def stats(self):
+        return {
+            cache.name: cache.snapshot()
+            for cache in (
+                self._guild_settings, self._blacklist, self._guild_blacklist, self._role_permissions,
+                self._guild_applications, self._collections, self._owners
+            )
+        }
 
 
 firebase_db = FirebaseManager()
 cache_manager = CacheManager(firebase_db)
+data_change_bus.subscribe(cache_manager.handle_change)
 
 def clear_cache():
     cache_manager.clear_cache()
@@ -701,8 +1057,7 @@ def OWNERS():
 
 def init_owners():
     result = firebase_db.load_owners()
-    cache_manager._owners_cache = None
-    cache_manager._owners_list = None
+    events.publish_change(events.OWNERS, events.SET)
     return result
 
 def load_owners():
@@ -711,8 +1066,13 @@ def load_owners():
 def refresh_owners_cache():
     cache_manager.refresh_owners_cache()
 
+@traced(kind='data')
 def is_owner(user_id):
-    return firebase_db.is_owner(user_id)
+    return cache_manager.is_owner(user_id)
+
+@traced(kind='data')
+def get_approver_role_id(guild_id):
+    return cache_manager.get_approver_role_id(guild_id)
 
 def sync_approver_role():
     return firebase_db.sync_approver_role()
@@ -720,86 +1080,151 @@ def sync_approver_role():
 def init_settings():
     return firebase_db.get_all_settings()
 
+@traced(kind='data')
 def get_settings(guild_id):
-    return firebase_db.get_settings(guild_id)
+    return cache_manager.get_settings(guild_id)
 
+@traced(kind='data')
 def save_settings(guild_id, form_channel_id=None, approv_channel_id=None,
                  approver_role_id=None, approved_role_id=None, blacklist_report_channel_id=None):
     result = firebase_db.save_settings(guild_id, form_channel_id, approv_channel_id,
                                       approver_role_id, approved_role_id, blacklist_report_channel_id)
-    
-    if approver_role_id is not None:
-        refresh_owners_cache()
-    
+    events.publish_change(events.SETTINGS, events.SET, guild_id)
     return result
 
 def init_applications():
     return firebase_db.applications
 
+@traced(kind='data')
 def save_application(guild_id, channel_id, message_id, applicant_id, embed_data):
-    return firebase_db.save_application(guild_id, channel_id, message_id, applicant_id, embed_data)
+    result = firebase_db.save_application(guild_id, channel_id, message_id, applicant_id, embed_data)
+    events.publish_change(events.APPLICATIONS, events.SET, guild_id, message_id)
+    return result
 
+@traced(kind='data')
 def remove_application(guild_id, message_id):
-    return firebase_db.remove_application(guild_id, message_id)
+    result = firebase_db.remove_application(guild_id, message_id)
+    events.publish_change(events.APPLICATIONS, events.DELETE, guild_id, message_id)
+    return result
+
+@traced(kind='data')
+def get_guild_applications(guild_id):
+    return cache_manager.get_guild_applications(guild_id)
+
+def get_cache_stats():
+    return cache_manager.stats()
+
+def get_metrics_snapshot():
+    return metrics_registry.snapshot()
+
+def render_metrics():
+    return metrics_registry.render_prometheus()
 
 def get_all_settings():
     return firebase_db.get_all_settings()
 
+@traced(kind='data')
 def save_capt(guild_id, channel_id, message_id, max_members, current_members=None, timer_minutes=None):
-    return firebase_db.save_capt(guild_id, channel_id, message_id, max_members, current_members, timer_minutes)
+    result = firebase_db.save_capt(guild_id, channel_id, message_id, max_members, current_members, timer_minutes)
+    events.publish_change(events.CAPTS, events.SET, guild_id, message_id)
+    return result
 
+@traced(kind='data')
 def get_capt(guild_id, message_id):
     return firebase_db.get_capt(guild_id, message_id)
 
+@traced(kind='data')
 def add_member_to_capt(guild_id, message_id, member_id):
-    return firebase_db.add_member_to_capt(guild_id, message_id, member_id)
+    result = firebase_db.add_member_to_capt(guild_id, message_id, member_id)
+    events.publish_change(events.CAPTS, events.SET, guild_id, message_id)
+    return result
 
+@traced(kind='data')
 def remove_capt(guild_id, message_id):
-    return firebase_db.remove_capt(guild_id, message_id)
+    result = firebase_db.remove_capt(guild_id, message_id)
+    events.publish_change(events.CAPTS, events.DELETE, guild_id, message_id)
+    return result
 
+@traced(kind='data')
 def remove_member_from_capt(guild_id, message_id, member_id):
-    return firebase_db.remove_member_from_capt(guild_id, message_id, member_id)
+    result = firebase_db.remove_member_from_capt(guild_id, message_id, member_id)
+    events.publish_change(events.CAPTS, events.SET, guild_id, message_id)
+    return result
 
+@traced(kind='data')
 def add_to_blacklist(guild_id, user_id, reason, reporter_id, static_id=None):
-    return firebase_db.add_to_blacklist(guild_id, user_id, reason, reporter_id, static_id)
+    result = firebase_db.add_to_blacklist(guild_id, user_id, reason, reporter_id, static_id)
+    events.publish_change(events.BLACKLIST, events.SET, guild_id, user_id)
+    return result
 
+@traced(kind='data')
+def bulk_add_to_blacklist(guild_id, entries, reporter_id):
+    written = 0
+    try:
+        written = firebase_db.bulk_add_to_blacklist(guild_id, entries, reporter_id)
+    except PartialImportError as e:
+        written = e.written
+        raise
+    finally:
+        # Часть пакетов могла записаться и до ошибки: кэши всё равно инвалидируются
+        if written:
+            events.publish_change(events.BLACKLIST, events.SET, guild_id)
+    return written
+
+@traced(kind='data')
 def remove_from_blacklist(guild_id, user_id):
-    return firebase_db.remove_from_blacklist(guild_id, user_id)
+    result = firebase_db.remove_from_blacklist(guild_id, user_id)
+    events.publish_change(events.BLACKLIST, events.DELETE, guild_id, user_id)
+    return result
 
+@traced(kind='data')
 def is_blacklisted(guild_id, user_id):
-    return firebase_db.is_blacklisted(guild_id, user_id)
+    return cache_manager.is_blacklisted(guild_id, user_id)
 
+@traced(kind='data')
 def get_blacklist(guild_id):
-    return firebase_db.get_blacklist(guild_id)
+    return cache_manager.get_blacklist(guild_id)
 
+@traced(kind='data')
 def get_blacklist_report_channel(guild_id):
-    return firebase_db.get_blacklist_report_channel(guild_id)
+    return cache_manager.get_settings(guild_id).blacklist_report_channel_id
 
+@traced(kind='data')
 def has_pending_application(guild_id, applicant_id):
     try:
         result = firebase_db.has_pending_application(guild_id, applicant_id)
         if result:
             return True
-    except Exception as e:
-        print(f"❌ Основной метод проверки заявок не сработал: {e}")
+    except Exception:
+        logger.exception("Основной метод проверки заявок не сработал", extra={'guild_id': str(guild_id)})
     
     try:
         return firebase_db.has_pending_application_alternative(guild_id, applicant_id)
-    except Exception as e:
-        print(f"❌ Альтернативный метод проверки заявок не сработал: {e}")
+    except Exception:
+        logger.exception("Альтернативный метод проверки заявок не сработал", extra={'guild_id': str(guild_id)})
         return False
 
+@traced(kind='data')
 async def has_pending_application_with_bot(guild_id, applicant_id, bot):
-    return await firebase_db.has_pending_application_with_message_check(guild_id, applicant_id, bot)
+    applications = cache_manager.get_guild_applications(guild_id)
+    return await firebase_db.has_pending_application_with_message_check(guild_id, applicant_id, bot, applications)
 
+@traced(kind='data')
 def save_role_permissions(guild_id, role_id, permissions):
-    return firebase_db.save_role_permissions(guild_id, role_id, permissions)
+    result = firebase_db.save_role_permissions(guild_id, role_id, permissions)
+    events.publish_change(events.ROLE_PERMISSIONS, events.SET, guild_id, role_id)
+    return result
 
+@traced(kind='data')
 def get_role_permissions(guild_id, role_id):
-    return firebase_db.get_role_permissions(guild_id, role_id)
+    return cache_manager.get_role_permissions(guild_id, role_id)
 
+@traced(kind='data')
 def get_all_role_permissions(guild_id):
     return firebase_db.get_all_role_permissions(guild_id)
 
+@traced(kind='data')
 def remove_role_permissions(guild_id, role_id):
-    return firebase_db.remove_role_permissions(guild_id, role_id)
\ No newline at end of file
+    result = firebase_db.remove_role_permissions(guild_id, role_id)
+    events.publish_change(events.ROLE_PERMISSIONS, events.DELETE, guild_id, role_id)
+    return result
\ No newline at end of file
@@ -0,0 +1,283 @@
+import contextvars
+import functools
+import inspect
+import time
+from typing import Any, Callable, Iterable, Iterator
+
+from src.metrics import MetricsRegistry, RateWindow, metrics_registry
+from src.tracing import tracer
+
+DOCUMENT_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000, 50000)
+
+_current_operation = contextvars.ContextVar('datastore_operation', default='unknown')
+
+
+def current_operation() -> str:
+    return _current_operation.get()
+
+
+class DatastoreMetrics:
+    def __init__(self, registry: MetricsRegistry = metrics_registry, prefix: str = 'firestore'):
+        self._operation_calls = registry.counter(
+            f'{prefix}_operation_calls_total', 'Вызовы операций слоя данных', ('operation',))
+        self._operation_errors = registry.counter(
+            f'{prefix}_operation_errors_total', 'Исключения, вышедшие из операций слоя данных', ('operation',))
+        self._operation_latency = registry.histogram(
+            f'{prefix}_operation_duration_seconds', 'Длительность операций слоя данных', ('operation',))
+        self._requests = registry.counter(
+            f'{prefix}_requests_total', 'Запросы к Firestore', ('operation', 'request'))
+        self._request_errors = registry.counter(
+            f'{prefix}_request_errors_total', 'Ошибки запросов к Firestore', ('operation', 'request'))
+        self._request_latency = registry.histogram(
+            f'{prefix}_request_duration_seconds', 'Длительность запросов к Firestore', ('request',))
+        self._documents_read = registry.counter(
+            f'{prefix}_documents_read_total', 'Прочитанные документы', ('operation',))
+        self._documents_per_query = registry.histogram(
+            f'{prefix}_documents_per_query', 'Документов на один запрос', ('operation',),
+            buckets=DOCUMENT_COUNT_BUCKETS)
+        self._documents_written = registry.counter(
+            f'{prefix}_documents_written_total', 'Записанные и удалённые документы', ('operation',))
+        self._request_rate = RateWindow()
+        self._read_rate = RateWindow()
+        self._write_rate = RateWindow()
+
+    @property
+    def operation_calls(self):
+        return self._operation_calls
+
+    @property
+    def operation_latency(self):
+        return self._operation_latency
+
+    @property
+    def requests(self):
+        return self._requests
+
+    @property
+    def documents_read(self):
+        return self._documents_read
+
+    @property
+    def documents_written(self):
+        return self._documents_written
+
+    def per_minute(self):
+        return {
+            'requests': self._request_rate.total(),
+            'reads': self._read_rate.total(),
+            'writes': self._write_rate.total()
+        }
+
+    def instrument(self, func: Callable = None, *, name: str = None):
+        if func is None:
+            return functools.partial(self.instrument, name=name)
+
+        operation = name or func.__qualname__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                token = _current_operation.set(operation)
+                start = time.perf_counter()
+                try:
+                    with tracer.span(operation, kind='firestore'):
+                        return await func(*args, **kwargs)
+                except Exception:
+                    self._operation_errors.inc(operation=operation)
+                    raise
+                finally:
+                    self._finish_operation(operation, start)
+                    _current_operation.reset(token)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            token = _current_operation.set(operation)
+            start = time.perf_counter()
+            try:
+                with tracer.span(operation, kind='firestore'):
+                    return func(*args, **kwargs)
+            except Exception:
+                self._operation_errors.inc(operation=operation)
+                raise
+            finally:
+                self._finish_operation(operation, start)
+                _current_operation.reset(token)
+        return wrapper
+
+    def _finish_operation(self, operation: str, start: float) -> None:
+        self._operation_calls.inc(operation=operation)
+        self._operation_latency.observe(time.perf_counter() - start, operation=operation)
+
+    def track_request(self, request: str, call: Callable, *args, reads: int = 0, writes: int = 0, **kwargs):
+        operation = current_operation()
+        start = time.perf_counter()
+        try:
+            return call(*args, **kwargs)
+        except Exception:
+            self._request_errors.inc(operation=operation, request=request)
+            raise
+        finally:
+            self._record_request(operation, request, time.perf_counter() - start, reads, writes)
+
+    def track_stream(self, request: str, iterable: Iterable) -> Iterator:
+        # Операция фиксируется при создании: поток может дочитываться уже вне метода
+        return self._stream(current_operation(), request, iter(iterable))
+
+    def _stream(self, operation: str, request: str, iterator: Iterator) -> Iterator:
+        count = 0
+        elapsed = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    document = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                count += 1
+                yield document
+        except Exception:
+            self._request_errors.inc(operation=operation, request=request)
+            raise
+        finally:
+            self._record_request(operation, request, elapsed, count, 0)
+            self._documents_per_query.observe(count, operation=operation)
+
+    def _record_request(self, operation: str, request: str, duration: float, reads: int, writes: int) -> None:
+        self._requests.inc(operation=operation, request=request)
+        self._request_rate.add()
+        self._request_latency.observe(duration, request=request)
+        if reads:
+            self._documents_read.inc(reads, operation=operation)
+            self._read_rate.add(reads)
+        if writes:
+            self._documents_written.inc(writes, operation=operation)
+            self._write_rate.add(writes)
+
+    def wrap_client(self, client):
+        # Встроенный API получает уже обёрнутый клиент бота: повторная обёртка посчитала бы запросы дважды
+        if isinstance(client, InstrumentedClient):
+            return client
+        return InstrumentedClient(client, self)
+
+
+def unwrap(value):
+    return value._target if isinstance(value, _FirestoreProxy) else value
+
+
+class _FirestoreProxy:
+    def __init__(self, target, metrics: DatastoreMetrics):
+        self._target = target
+        self._metrics = metrics
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._target, name)
+
+
+class InstrumentedQuery(_FirestoreProxy):
+    _CHAINABLE = frozenset((
+        'where', 'order_by', 'limit', 'limit_to_last', 'offset', 'select',
+        'start_at', 'start_after', 'end_at', 'end_before'
+    ))
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._target, name)
+        if name not in self._CHAINABLE:
+            return attribute
+
+        @functools.wraps(attribute)
+        def chained(*args, **kwargs):
+            args = [unwrap(arg) for arg in args]
+            kwargs = {key: unwrap(value) for key, value in kwargs.items()}
+            return InstrumentedQuery(attribute(*args, **kwargs), self._metrics)
+        return chained
+
+    def stream(self, *args, **kwargs):
+        return self._metrics.track_stream('stream', self._target.stream(*args, **kwargs))
+
+    def get(self, *args, **kwargs):
+        return list(self.stream(*args, **kwargs))
+
+
+class InstrumentedCollection(InstrumentedQuery):
+    def document(self, *path):
+        return InstrumentedDocument(self._target.document(*path), self._metrics)
+
+    def add(self, *args, **kwargs):
+        return self._metrics.track_request('add', self._target.add, *args, writes=1, **kwargs)
+
+
+class InstrumentedDocument(_FirestoreProxy):
+    def get(self, *args, **kwargs):
+        return self._metrics.track_request('get', self._target.get, *args, reads=1, **kwargs)
+
+    def set(self, *args, **kwargs):
+        return self._metrics.track_request('set', self._target.set, *args, writes=1, **kwargs)
+
+    def update(self, *args, **kwargs):
+        return self._metrics.track_request('update', self._target.update, *args, writes=1, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        return self._metrics.track_request('delete', self._target.delete, *args, writes=1, **kwargs)
+
+    def collection(self, *path):
+        return InstrumentedCollection(self._target.collection(*path), self._metrics)
+
+
+class InstrumentedBatch(_FirestoreProxy):
+    def __init__(self, target, metrics: DatastoreMetrics):
+        super().__init__(target, metrics)
+        self._pending_writes = 0
+
+    def _stage(self, method: str, reference, *args, **kwargs):
+        self._pending_writes += 1
+        getattr(self._target, method)(unwrap(reference), *args, **kwargs)
+        return self
+
+    def set(self, reference, *args, **kwargs):
+        return self._stage('set', reference, *args, **kwargs)
+
+    def update(self, reference, *args, **kwargs):
+        return self._stage('update', reference, *args, **kwargs)
+
+    def delete(self, reference, *args, **kwargs):
+        return self._stage('delete', reference, *args, **kwargs)
+
+    def commit(self, *args, **kwargs):
+        writes, self._pending_writes = self._pending_writes, 0
+        return self._metrics.track_request('commit', self._target.commit, *args, writes=writes, **kwargs)
+
+
+class InstrumentedTransaction(InstrumentedBatch):
+    # firestore.transactional сам вызывает _begin/_commit/_rollback: первые проходят через __getattr__,
+    # а фиксация перехватывается, чтобы учесть записи
+    def _commit(self, *args, **kwargs):
+        writes, self._pending_writes = self._pending_writes, 0
+        return self._metrics.track_request('commit', self._target._commit, *args, writes=writes, **kwargs)
+
+    def _rollback(self, *args, **kwargs):
+        self._pending_writes = 0
+        return self._target._rollback(*args, **kwargs)
+
+
+class InstrumentedClient(_FirestoreProxy):
+    def collection(self, *path):
+        return InstrumentedCollection(self._target.collection(*path), self._metrics)
+
+    def document(self, *path):
+        return InstrumentedDocument(self._target.document(*path), self._metrics)
+
+    def batch(self):
+        return InstrumentedBatch(self._target.batch(), self._metrics)
+
+    def transaction(self, **kwargs):
+        return InstrumentedTransaction(self._target.transaction(**kwargs), self._metrics)
+
+
+datastore_metrics = DatastoreMetrics()
+
+
+def instrumented(func: Callable = None, *, name: str = None):
+    return datastore_metrics.instrument(func, name=name)
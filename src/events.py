@@ -0,0 +1,94 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, List
+
+from src.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+SETTINGS = 'guild_settings'
+APPLICATIONS = 'applications'
+BLACKLIST = 'blacklist'
+ROLE_PERMISSIONS = 'role_permissions'
+OWNERS = 'owners'
+CAPTS = 'capts'
+
+SET = 'set'
+DELETE = 'delete'
+
+
+class ChangeEvent:
+    __slots__ = ('collection', 'action', 'guild_id', 'document_id')
+
+    def __init__(self, collection: str, action: str, guild_id=None, document_id=None):
+        self.collection = collection
+        self.action = action
+        self.guild_id = str(guild_id) if guild_id is not None else None
+        # document_id=None означает изменение всей коллекции гильдии (например, импорт)
+        self.document_id = str(document_id) if document_id is not None else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'collection': self.collection,
+            'action': self.action,
+            'guild_id': self.guild_id,
+            'document_id': self.document_id
+        }
+
+    def __repr__(self) -> str:
+        return (f"ChangeEvent({self.collection!r}, {self.action!r}, "
+                f"guild_id={self.guild_id!r}, document_id={self.document_id!r})")
+
+
+class DataChangeBus:
+    def __init__(self, registry=metrics_registry):
+        self._subscribers: List[Callable[[ChangeEvent], None]] = []
+        self._lock = threading.Lock()
+        self._published = registry.counter(
+            'data_change_events_total', 'События изменения данных', ('collection', 'action'))
+        self._subscriber_errors = registry.counter(
+            'data_change_subscriber_errors_total', 'Исключения в подписчиках шины изменений')
+
+    def subscribe(self, callback: Callable[[ChangeEvent], None]) -> Callable[[], None]:
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def publish(self, event: ChangeEvent) -> None:
+        # Подписчики вызываются синхронно: инвалидация видна сразу после возврата из записи
+        self._published.inc(collection=event.collection, action=event.action)
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                self._subscriber_errors.inc()
+                logger.exception("Ошибка подписчика шины изменений", extra={
+                    'subscriber': repr(callback), 'collection': event.collection
+                })
+
+    def publish_change(self, collection: str, action: str, guild_id=None, document_id=None) -> ChangeEvent:
+        event = ChangeEvent(collection, action, guild_id, document_id)
+        self.publish(event)
+        return event
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+
+data_change_bus = DataChangeBus()
+
+
+def get_data_change_bus() -> DataChangeBus:
+    return data_change_bus
+
+
+def publish_change(collection: str, action: str, guild_id=None, document_id=None) -> ChangeEvent:
+    return data_change_bus.publish_change(collection, action, guild_id, document_id)
@@ -0,0 +1,147 @@
+import atexit
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from src.metrics import metrics_registry
+from src.tracing import tracer
+
+# Атрибуты LogRecord, которые не считаются пользовательскими полями из extra
+_RESERVED = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'sample'}
+
+_dropped = metrics_registry.counter('log_records_dropped_total', 'Записи лога, отброшенные из-за переполнения очереди')
+_sampled_out = metrics_registry.counter('log_records_sampled_out_total', 'Записи лога, отброшенные выборкой', ('key',))
+
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            'ts': datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        fields = [f"{key}={value}" for key, value in record.__dict__.items()
+                  if key not in _RESERVED and not key.startswith('_')]
+        return f"{text} [{' '.join(fields)}]" if fields else text
+
+
+class SamplingFilter(logging.Filter):
+    def __init__(self, every: int = 10):
+        super().__init__()
+        self._every = max(every, 1)
+        self._counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Выборка применяется только к записям с extra={'sample': ключ}: частые сообщения об успехе
+        key = getattr(record, 'sample', None)
+        if key is None or record.levelno > logging.INFO:
+            return True
+        with self._lock:
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        if count % self._every:
+            _sampled_out.inc(key=key)
+            return False
+        record.sampled_every = self._every
+        return True
+
+
+class ContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        # Выполняется в потоке вызывающего кода, пока контекст трассы ещё доступен
+        span = tracer.current_span()
+        if span is not None:
+            record.trace_id = span.trace.trace_id
+            record.interaction = span.trace.name
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _dropped.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Сообщение и трейсбек форматируются здесь, а JSON и ввод-вывод — в потоке слушателя
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(level: Optional[str] = None, json_output: Optional[bool] = None,
+                  sample_every: Optional[int] = None, max_queue: Optional[int] = None) -> None:
+    global _listener
+    with _lock:
+        if _listener is not None:
+            return
+
+        level = (level or os.getenv('LOG_LEVEL', 'INFO')).upper()
+        if json_output is None:
+            json_output = os.getenv('LOG_FORMAT', 'json').lower() == 'json'
+        if sample_every is None:
+            sample_every = int(os.getenv('LOG_SAMPLE_EVERY', 10))
+        if max_queue is None:
+            max_queue = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+
+        stream_handler = logging.StreamHandler(sys.stdout)
+        stream_handler.setFormatter(JsonFormatter() if json_output else TextFormatter())
+
+        log_queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        queue_handler = NonBlockingQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(sample_every))
+        queue_handler.addFilter(ContextFilter())
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(queue_handler)
+        root.setLevel(level)
+
+        _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    global _listener
+    with _lock:
+        if _listener is None:
+            return
+        # stop() дописывает оставшиеся в очереди записи
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,219 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _is_project_frame(filename: str) -> bool:
+    return (filename.startswith(_PROJECT_ROOT)
+            and 'site-packages' not in filename
+            and os.path.abspath(filename) != os.path.abspath(__file__))
+
+
+def _format_location(filename: str, lineno: int, name: str) -> str:
+    if filename.startswith(_PROJECT_ROOT):
+        filename = os.path.relpath(filename, _PROJECT_ROOT)
+    return f"{filename}:{lineno} in {name}"
+
+
+class BlockingSite:
+    __slots__ = ('location', 'culprit', 'samples', 'blocked_seconds', 'stalls', 'stack')
+
+    def __init__(self, location: str, culprit: str, stack: List[str]):
+        self.location = location
+        self.culprit = culprit
+        self.samples = 0
+        self.blocked_seconds = 0.0
+        self.stalls = 0
+        self.stack = stack
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'location': self.location,
+            'culprit': self.culprit,
+            'samples': self.samples,
+            'blocked_seconds': round(self.blocked_seconds, 3),
+            'stalls': self.stalls,
+            'stack': self.stack
+        }
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = 0.25, threshold: float = 0.1, log_threshold: float = 1.0,
+                 stack_depth: int = 15, max_sites: int = 200, registry=metrics_registry):
+        self._interval = interval
+        self._threshold = threshold
+        self._log_threshold = log_threshold
+        self._sample_interval = max(threshold / 2, 0.005)
+        self._stack_depth = stack_depth
+        self._max_sites = max_sites
+        self._sites: Dict[Tuple[str, str], BlockingSite] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._last_beat = time.perf_counter()
+        self._task = None
+        self._thread = None
+        self._max_lag = 0.0
+        self._lag = registry.histogram(
+            'event_loop_lag_seconds', 'Задержка планирования цикла событий', buckets=LAG_BUCKETS)
+        self._stalls = registry.counter('event_loop_stalls_total', 'Блокировки цикла событий дольше порога')
+        self._stall_duration = registry.histogram(
+            'event_loop_stall_seconds', 'Длительность блокировок цикла событий', buckets=LAG_BUCKETS)
+        self._max_lag_gauge = registry.gauge('event_loop_lag_max_seconds', 'Максимальная задержка цикла событий')
+
+    @property
+    def threshold(self) -> float:
+        return self._threshold
+
+    @property
+    def is_running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self) -> None:
+        # Вызывается из потока цикла: по его id сторож берёт стек из sys._current_frames
+        if self.is_running:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._stopped.clear()
+        self._task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name='loop-monitor', daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+            self._thread = None
+
+    async def _heartbeat(self) -> None:
+        while True:
+            start = time.perf_counter()
+            self._last_beat = start
+            await asyncio.sleep(self._interval)
+            lag = max(time.perf_counter() - start - self._interval, 0.0)
+            self._lag.observe(lag)
+            if lag > self._max_lag:
+                self._max_lag = lag
+                self._max_lag_gauge.set(lag)
+
+    def _watch(self) -> None:
+        stalled_beat = None
+        stall_site = None
+        while not self._stopped.wait(self._sample_interval):
+            beat = self._last_beat
+            overdue = time.perf_counter() - beat - self._interval
+            if overdue < self._threshold:
+                if stalled_beat is not None:
+                    self._finish_stall(stall_site, self._last_beat - stalled_beat - self._interval)
+                    stalled_beat = stall_site = None
+                continue
+
+            site = self._sample()
+            if site is None:
+                continue
+            if stalled_beat != beat:
+                # Новая блокировка: если предыдущая не была закрыта, её длительность известна по новому биению
+                if stalled_beat is not None:
+                    self._finish_stall(stall_site, beat - stalled_beat - self._interval)
+                stalled_beat = beat
+                stall_site = site
+                self._stalls.inc()
+                with self._lock:
+                    site.stalls += 1
+
+    def _finish_stall(self, site: Optional[BlockingSite], duration: float) -> None:
+        duration = max(duration, self._threshold)
+        self._stall_duration.observe(duration)
+        if site is None:
+            return
+        # Время блокировки берётся по фактическому биению, а не по числу сэмплов: первый сэмпл опаздывает на порог
+        with self._lock:
+            site.blocked_seconds += duration
+        if duration >= self._log_threshold:
+            logger.warning("Цикл событий заблокирован", extra={
+                'duration': round(duration, 3), 'location': site.location, 'culprit': site.culprit
+            })
+
+    def _sample(self) -> Optional[BlockingSite]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+
+        stack = []
+        project_location = None
+        culprit = _format_location(frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            location = _format_location(filename, frame.f_lineno, frame.f_code.co_name)
+            if len(stack) < self._stack_depth:
+                stack.append(location)
+            if project_location is None and _is_project_frame(filename):
+                project_location = location
+            frame = frame.f_back
+        del frame
+
+        key = (project_location or culprit, culprit)
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None:
+                if len(self._sites) >= self._max_sites:
+                    return None
+                site = self._sites[key] = BlockingSite(key[0], culprit, stack)
+            site.samples += 1
+        return site
+
+    def report(self, top: int = 10) -> Dict[str, Any]:
+        with self._lock:
+            sites = sorted(self._sites.values(), key=lambda site: site.blocked_seconds, reverse=True)[:top]
+            offenders = [site.as_dict() for site in sites]
+        return {
+            'threshold_ms': round(self._threshold * 1000, 1),
+            'lag': {
+                'p50': self._lag.quantile(0.5),
+                'p95': self._lag.quantile(0.95),
+                'p99': self._lag.quantile(0.99),
+                'max': round(self._max_lag, 4)
+            },
+            'stalls': int(self._stalls.total()),
+            'offenders': offenders
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._sites.clear()
+        self._max_lag = 0.0
+
+
+loop_monitor = LoopMonitor(
+    interval=float(os.getenv('LOOP_MONITOR_INTERVAL_MS', 250)) / 1000,
+    threshold=float(os.getenv('LOOP_MONITOR_THRESHOLD_MS', 100)) / 1000,
+    log_threshold=float(os.getenv('LOOP_MONITOR_LOG_MS', 1000)) / 1000
+)
+
+
+def get_loop_monitor() -> LoopMonitor:
+    return loop_monitor
+
+
+def start_loop_monitor() -> bool:
+    if os.getenv('LOOP_MONITOR', '1') == '0':
+        return False
+    loop_monitor.start()
+    return True
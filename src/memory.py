@@ -0,0 +1,203 @@
+import asyncio
+import gc
+import logging
+import os
+import sys
+import threading
+import tracemalloc
+import types
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import discord
+
+from src.cache import cache_registry
+from src.metrics import metrics_registry
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# Общие объекты не принадлежат ни одному компоненту: не считаются и не обходятся
+_SHARED = (
+    type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.CodeType,
+    types.FrameType, asyncio.AbstractEventLoop, discord.Client, threading.Thread
+)
+# Считаются по собственному размеру, но не обходятся: ссылки из них ведут в цикл событий
+_OPAQUE = (asyncio.Future, asyncio.Handle)
+_CONTAINERS = (list, tuple, set, frozenset, deque)
+
+
+def _slot_values(obj) -> List[Any]:
+    values = []
+    for cls in type(obj).__mro__:
+        slots = cls.__dict__.get('__slots__', ())
+        for slot in (slots,) if isinstance(slots, str) else slots:
+            if slot in ('__dict__', '__weakref__'):
+                continue
+            try:
+                values.append(getattr(obj, slot))
+            except AttributeError:
+                pass
+    return values
+
+
+def deep_sizeof(root: Any, seen: Optional[set] = None) -> Tuple[int, int]:
+    """Приблизительный удерживаемый размер: объект, который уже встречался в seen, второй раз не считается"""
+    seen = set() if seen is None else seen
+    total = objects = 0
+    stack = [root]
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen or isinstance(obj, _SHARED):
+            continue
+        seen.add(id(obj))
+        total += sys.getsizeof(obj)
+        objects += 1
+        if isinstance(obj, _OPAQUE):
+            continue
+        if isinstance(obj, dict):
+            stack.extend(obj.keys())
+            stack.extend(obj.values())
+        elif isinstance(obj, _CONTAINERS):
+            stack.extend(obj)
+        else:
+            attributes = getattr(obj, '__dict__', None)
+            if attributes is not None:
+                stack.append(attributes)
+            stack.extend(_slot_values(obj))
+    return total, objects
+
+
+def _resident_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _peak_resident_bytes() -> Optional[int]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт килобайты, macOS — байты
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class MemoryReporter:
+    def __init__(self, registry=metrics_registry):
+        self._components: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+        self._component_bytes = registry.gauge(
+            'memory_component_bytes', 'Приблизительный удерживаемый размер долгоживущих компонентов', ('component',))
+        self._resident = registry.gauge('process_resident_memory_bytes', 'Резидентная память процесса')
+
+    def register(self, name: str, source: Callable[[], Any]) -> None:
+        # source возвращает корень компонента; вызывается только при построении отчёта
+        with self._lock:
+            self._components[name] = source
+
+    def unregister(self, name: str) -> None:
+        with self._lock:
+            self._components.pop(name, None)
+
+    def _sources(self) -> List[Tuple[str, Callable[[], Any]]]:
+        sources = [(f"cache.{name}", lambda name=name: cache_registry.get(name)) for name in cache_registry.names()]
+        with self._lock:
+            sources.extend(self._components.items())
+        return sources
+
+    def components(self) -> List[Dict[str, Any]]:
+        seen: set = set()
+        result = []
+        for name, source in self._sources():
+            try:
+                root = source()
+            except Exception:
+                logger.exception("Не удалось получить компонент для отчёта о памяти", extra={'component': name})
+                continue
+            try:
+                size, objects = deep_sizeof(root, seen)
+            except RuntimeError:
+                # Контейнер сменил размер во время обхода из потока: компонент пропускается до следующего отчёта
+                logger.warning("Компонент изменился во время обхода", extra={'component': name})
+                continue
+            self._component_bytes.set(size, component=name)
+            result.append({
+                'name': name,
+                'entries': len(root) if hasattr(root, '__len__') else None,
+                'objects': objects,
+                'retained_bytes': size
+            })
+        result.sort(key=lambda item: item['retained_bytes'], reverse=True)
+        return result
+
+    @staticmethod
+    def types(top: int = 15) -> List[Dict[str, Any]]:
+        # gc видит только контейнеры: строки и числа учитываются в размере компонентов, но не здесь
+        counts: Dict[str, List[int]] = {}
+        for obj in gc.get_objects():
+            cls = type(obj)
+            name = f"{cls.__module__}.{cls.__qualname__}"
+            entry = counts.get(name)
+            if entry is None:
+                entry = counts[name] = [0, 0]
+            entry[0] += 1
+            entry[1] += sys.getsizeof(obj)
+        ranked = sorted(counts.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return [{'type': name, 'count': count, 'shallow_bytes': size} for name, (count, size) in ranked]
+
+    @staticmethod
+    def allocations(top: int = 15) -> List[Dict[str, Any]]:
+        if not tracemalloc.is_tracing():
+            return []
+        statistics = tracemalloc.take_snapshot().statistics('lineno')[:top]
+        return [
+            {'location': str(stat.traceback[0]), 'size_bytes': stat.size, 'count': stat.count}
+            for stat in statistics
+        ]
+
+    async def report_async(self, top: int = 15, include_types: bool = False) -> Dict[str, Any]:
+        # Обход в потоке не останавливает цикл событий: интерпретатор переключается между потоками по ходу обхода.
+        # Дочерние ссылки каждого контейнера снимаются одним вызовом на C, поэтому параллельные изменения
+        # в худшем случае сдвигают размер, а не ломают обход
+        return await asyncio.to_thread(self.report, top, include_types)
+
+    def report(self, top: int = 15, include_types: bool = False) -> Dict[str, Any]:
+        resident = _resident_bytes()
+        peak = _peak_resident_bytes()
+        if resident is not None:
+            self._resident.set(resident)
+            # ru_maxrss обновляется ядром с запаздыванием и бывает чуть меньше текущего значения
+            peak = max(peak or 0, resident)
+        return {
+            'process': {
+                'resident_bytes': resident,
+                'peak_resident_bytes': peak,
+                'gc_objects': len(gc.get_objects()) if include_types else None,
+                'tracemalloc': tracemalloc.is_tracing()
+            },
+            'components': self.components(),
+            'types': self.types(top) if include_types else [],
+            'allocations': self.allocations(top)
+        }
+
+
+memory_reporter = MemoryReporter()
+
+
+def get_memory_reporter() -> MemoryReporter:
+    return memory_reporter
+
+
+def start_tracemalloc() -> bool:
+    # Трассировка аллокаций заметно замедляет процесс: включается только явно, MEMORY_TRACEMALLOC=<глубина стека>
+    frames = int(os.getenv('MEMORY_TRACEMALLOC', 0))
+    if frames <= 0 or tracemalloc.is_tracing():
+        return False
+    tracemalloc.start(frames)
+    return True
@@ -0,0 +1,300 @@
+import bisect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.cache import cache_registry
+
+DEFAULT_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Metric:
+    metric_type = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self._name = name
+        self._documentation = documentation
+        self._labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def documentation(self) -> str:
+        return self._documentation
+
+    @property
+    def labelnames(self) -> Tuple[str, ...]:
+        return self._labelnames
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, '')) for name in self._labelnames)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self._labelnames, key))
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def total(self) -> float:
+        return sum(self._values.values())
+
+    def items(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            return [(self._labels(key), value) for key, value in self._values.items()]
+
+    def samples(self) -> List[Sample]:
+        return [(self._name, labels, value) for labels, value in self.items()]
+
+
+class Gauge(Counter):
+    metric_type = 'gauge'
+
+    def set(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class _HistogramState:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self._buckets = tuple(sorted(buckets))
+        self._states: Dict[Tuple[str, ...], _HistogramState] = {}
+
+    @property
+    def buckets(self) -> Tuple[float, ...]:
+        return self._buckets
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _HistogramState(len(self._buckets) + 1)
+            state.counts[index] += 1
+            state.sum += value
+            state.count += 1
+
+    def count(self, **labels) -> int:
+        state = self._states.get(self._key(labels))
+        return state.count if state else 0
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        state = self._states.get(self._key(labels))
+        if state is None or state.count == 0:
+            return None
+
+        rank = q * state.count
+        seen = 0
+        for index, bucket_count in enumerate(state.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return self._buckets[index] if index < len(self._buckets) else math.inf
+        return math.inf
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return [self._labels(key) for key in self._states]
+
+    def summary(self, **labels) -> Dict[str, Any]:
+        state = self._states.get(self._key(labels))
+        if state is None:
+            return {'count': 0, 'sum': 0.0, 'avg': 0.0}
+        return {
+            'count': state.count,
+            'sum': round(state.sum, 6),
+            'avg': round(state.sum / state.count, 6) if state.count else 0.0,
+            'p50': self.quantile(0.5, **labels),
+            'p95': self.quantile(0.95, **labels),
+            'p99': self.quantile(0.99, **labels)
+        }
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        with self._lock:
+            states = list(self._states.items())
+        for key, state in states:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, bucket_count in zip(self._buckets + (math.inf,), state.counts):
+                cumulative += bucket_count
+                samples.append((f'{self._name}_bucket', {**labels, 'le': _format_value(bound)}, cumulative))
+            samples.append((f'{self._name}_sum', labels, state.sum))
+            samples.append((f'{self._name}_count', labels, state.count))
+        return samples
+
+
+class RateWindow:
+    def __init__(self, seconds: int = 60):
+        # Кольцо посекундных корзин: сумма за последнюю минуту без хранения отдельных событий
+        self._seconds = seconds
+        self._counts = [0.0] * seconds
+        self._stamps = [-seconds] * seconds
+        self._lock = threading.Lock()
+
+    def add(self, amount: float = 1) -> None:
+        now = int(time.monotonic())
+        slot = now % self._seconds
+        with self._lock:
+            if self._stamps[slot] != now:
+                self._stamps[slot] = now
+                self._counts[slot] = 0.0
+            self._counts[slot] += amount
+
+    def total(self) -> float:
+        now = int(time.monotonic())
+        with self._lock:
+            return sum(count for count, stamp in zip(self._counts, self._stamps) if now - stamp < self._seconds)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Metric]]] = []
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name: str, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif type(metric) is not metric_class:
+                raise ValueError(f"Метрика {name} уже зарегистрирована с типом {metric.metric_type}")
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def register_collector(self, collector: Callable[[], Iterable[Metric]]) -> None:
+        self._collectors.append(collector)
+
+    def collect(self) -> List[Metric]:
+        metrics = list(self._metrics.values())
+        for collector in self._collectors:
+            try:
+                metrics.extend(collector())
+            except Exception:
+                continue
+        return metrics
+
+    def snapshot(self) -> Dict[str, Any]:
+        result = {}
+        for metric in self.collect():
+            if isinstance(metric, Histogram):
+                result[metric.name] = [
+                    {'labels': labels, **metric.summary(**labels)} for labels in metric.label_sets()
+                ]
+            else:
+                result[metric.name] = [
+                    {'labels': labels, 'value': value} for _, labels, value in metric.samples()
+                ]
+        return result
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self.collect():
+            lines.append(f'# HELP {metric.name} {_escape_help(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.metric_type}')
+            for sample_name, labels, value in metric.samples():
+                lines.append(f'{sample_name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape_help(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label(str(value))}"' for name, value in labels.items()) + '}'
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _collect_cache_metrics() -> List[Metric]:
+    fields = {
+        'hits': (Counter, 'cache_hits_total', 'Попадания в кэш'),
+        'misses': (Counter, 'cache_misses_total', 'Промахи кэша'),
+        'evictions': (Counter, 'cache_evictions_total', 'Вытеснения по LRU'),
+        'expirations': (Counter, 'cache_expirations_total', 'Записи, истекшие по TTL'),
+        'invalidations': (Counter, 'cache_invalidations_total', 'Явные инвалидации'),
+        'negative_stores': (Counter, 'cache_negative_stores_total', 'Сохранённые отрицательные ответы'),
+        'size': (Gauge, 'cache_entries', 'Текущее количество записей'),
+        'hit_ratio': (Gauge, 'cache_hit_ratio', 'Доля попаданий')
+    }
+    metrics = {field: metric_class(name, doc, ('namespace',)) for field, (metric_class, name, doc) in fields.items()}
+    for namespace, stats in cache_registry.stats().items():
+        for field, metric in metrics.items():
+            metric.inc(stats[field], namespace=namespace)
+    return list(metrics.values())
+
+
+metrics_registry = MetricsRegistry()
+metrics_registry.register_collector(_collect_cache_metrics)
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    return metrics_registry
+
+
+def render_metrics() -> str:
+    return metrics_registry.render_prometheus()
@@ -1,23 +1,12 @@
 import discord
 from discord import app_commands
-from src.database_firebase import is_owner, init_owners, owners_cache, get_role_permissions
+from src.database_firebase import is_owner, get_approver_role_id, get_role_permissions
+from src.tracing import traced
 
 
 class PermissionChecker:
-    def __init__(self):
-        self._owners_cache = None
-    
-    def _update_cache(self):
-        init_owners()
-        self._owners_cache = owners_cache()
-    
-    def _get_guild_id_string(self, guild_id: int) -> str:
-        return str(guild_id)
-    
-    def _get_approver_role_id(self, guild_id_str: str) -> str:
-        if not self._owners_cache:
-            return None
-        return self._owners_cache.get('approver_role_ids', {}).get(guild_id_str)
+    def _get_approver_role_id(self, guild_id: int) -> int:
+        return get_approver_role_id(guild_id)
     
     def _validate_guild(self, interaction: discord.Interaction) -> bool:
         return interaction.guild is not None
@@ -25,15 +14,13 @@ class PermissionChecker:
     def _is_owner(self, user_id: int) -> bool:
         return is_owner(user_id)
     
-    def _get_role(self, guild: discord.Guild, role_id: str) -> discord.Role:
-        try:
-            return guild.get_role(int(role_id))
-        except ValueError:
-            return None
+    def _get_role(self, guild: discord.Guild, role_id: int) -> discord.Role:
+        return guild.get_role(role_id)
     
     def _user_has_role(self, user: discord.Member, role: discord.Role) -> bool:
         return role in user.roles
     
+    @traced(kind='permission')
     async def check_approver(self, interaction: discord.Interaction) -> bool:
         if not self._validate_guild(interaction):
             return False
@@ -41,9 +28,7 @@ class PermissionChecker:
         if self._is_owner(interaction.user.id):
             return True
         
-        self._update_cache()
-        guild_id_str = self._get_guild_id_string(interaction.guild_id)
-        approver_role_id = self._get_approver_role_id(guild_id_str)
+        approver_role_id = self._get_approver_role_id(interaction.guild_id)
         
         if not approver_role_id:
             return False
@@ -54,6 +39,7 @@ class PermissionChecker:
         
         return self._user_has_role(interaction.user, role)
     
+    @traced(kind='permission')
     async def check_command_permission(self, interaction: discord.Interaction, command_name: str) -> bool:
         if not self._validate_guild(interaction):
             return False
@@ -102,7 +88,7 @@ class UniversalPermissionChecker:
     def __init__(self, permission_service: PermissionService):
         self._permission_service = permission_service
         self._always_allowed_commands = ['help']
-        self._owner_only_commands = ['sync', 'manageroles']
+        self._owner_only_commands = ['sync', 'manageroles', 'perf']
     
     def _is_always_allowed(self, command_name: str) -> bool:
         return command_name in self._always_allowed_commands
@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import socket
+from typing import Dict, Optional, Tuple
+
+from src.database_firebase import firebase_db
+from src.metrics import metrics_registry
+from src.utils import get_application_state_service
+
+logger = logging.getLogger(__name__)
+
+
+class ReviewLease:
+    __slots__ = ('guild_id', 'user_id', 'heartbeat')
+
+    def __init__(self, guild_id, user_id: int, heartbeat: asyncio.Task):
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.heartbeat = heartbeat
+
+
+class ReviewLockManager:
+    """Блокировка «заявку смотрит модератор».
+
+    В режиме local блокировка живёт только в памяти процесса. В режиме firestore поверх неё берётся аренда
+    в коллекции review_leases: держатель продлевает её, пока состояние рассмотрения живо, а после падения
+    экземпляра аренда истекает через ttl и заявку может взять модератор на другом экземпляре.
+    """
+
+    def __init__(self, backend: str = 'local', ttl: float = 30.0, holder: Optional[str] = None,
+                 store=firebase_db, states=None, registry=metrics_registry):
+        self._backend = backend
+        self._ttl = ttl
+        self._holder = holder or f"{socket.gethostname()}-{os.getpid()}"
+        self._store = store
+        self._states = states or get_application_state_service()
+        self._leases: Dict[str, ReviewLease] = {}
+        self._operations = registry.counter(
+            'review_lock_operations_total', 'Операции с блокировками рассмотрения заявок',
+            ('backend', 'operation', 'result'))
+
+    @property
+    def holder(self) -> str:
+        return self._holder
+
+    @property
+    def distributed(self) -> bool:
+        return self._backend == 'firestore' and self._store._ensure_initialized()
+
+    def _count(self, operation: str, result: str) -> None:
+        self._operations.inc(backend='firestore' if self.distributed else 'local', operation=operation, result=result)
+
+    async def acquire(self, guild_id, message_id: str, user_id: int) -> Tuple[bool, Optional[int]]:
+        """Возвращает (получена ли блокировка, id модератора, который уже смотрит заявку)"""
+        state = self._states.get_state(message_id)
+        if state and state.user_id is not None and state.user_id != user_id:
+            # Быстрый путь: заявку смотрят через этот же процесс, обращение к Firestore не нужно
+            self._count('acquire', 'busy')
+            return False, state.user_id
+
+        if self.distributed:
+            try:
+                acquired, reviewer_id = await asyncio.to_thread(
+                    self._store.acquire_review_lease, guild_id, message_id, user_id, self._holder, self._ttl)
+            except Exception:
+                # Недоступный Firestore не должен останавливать модерацию: остаётся локальная блокировка
+                logger.exception("Не удалось получить аренду заявки", extra={'message_id': str(message_id)})
+                self._count('acquire', 'error')
+            else:
+                if not acquired:
+                    self._count('acquire', 'busy')
+                    return False, int(reviewer_id)
+                self._start_heartbeat(guild_id, message_id, user_id)
+
+        self._states.add_state(message_id, user_id, guild_id)
+        self._count('acquire', 'acquired')
+        return True, None
+
+    def _start_heartbeat(self, guild_id, message_id: str, user_id: int) -> None:
+        previous = self._leases.pop(message_id, None)
+        if previous is not None:
+            previous.heartbeat.cancel()
+        heartbeat = asyncio.create_task(self._heartbeat(guild_id, message_id, user_id))
+        self._leases[message_id] = ReviewLease(guild_id, user_id, heartbeat)
+
+    async def _heartbeat(self, guild_id, message_id: str, user_id: int) -> None:
+        while True:
+            await asyncio.sleep(self._ttl / 3)
+            state = self._states.get_state(message_id)
+            # Локальное состояние снято или истекло по APPLICATION_STATE_TIMEOUT: аренду больше не продлеваем
+            if state is None or state.user_id != user_id:
+                self._leases.pop(message_id, None)
+                return
+            try:
+                renewed = await asyncio.to_thread(
+                    self._store.renew_review_lease, guild_id, message_id, user_id, self._holder, self._ttl)
+            except Exception:
+                logger.exception("Не удалось продлить аренду заявки", extra={'message_id': str(message_id)})
+                self._count('renew', 'error')
+                continue
+            if not renewed:
+                logger.warning("Аренда заявки потеряна", extra={'message_id': str(message_id), 'user_id': user_id})
+                self._count('renew', 'lost')
+                self._leases.pop(message_id, None)
+                return
+            self._count('renew', 'renewed')
+
+    async def release(self, guild_id, message_id: str) -> None:
+        self._states.remove_state(message_id)
+        lease = self._leases.pop(message_id, None)
+        if lease is None:
+            self._count('release', 'local')
+            return
+        lease.heartbeat.cancel()
+        try:
+            released = await asyncio.to_thread(self._store.release_review_lease, guild_id, message_id, self._holder)
+        except Exception:
+            # Аренда истечёт сама через ttl
+            logger.exception("Не удалось снять аренду заявки", extra={'message_id': str(message_id)})
+            self._count('release', 'error')
+            return
+        self._count('release', 'released' if released else 'lost')
+
+    async def close(self) -> None:
+        # При остановке аренды отдаются сразу, чтобы заявки не ждали истечения ttl
+        for message_id, lease in list(self._leases.items()):
+            await self.release(lease.guild_id, message_id)
+
+
+review_locks = ReviewLockManager(
+    backend=os.getenv('REVIEW_LOCK_BACKEND', 'local'),
+    ttl=float(os.getenv('REVIEW_LEASE_TTL', 30)),
+    holder=os.getenv('INSTANCE_ID')
+)
+
+
+def get_review_locks() -> ReviewLockManager:
+    return review_locks
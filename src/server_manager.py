@@ -1,19 +1,45 @@
-import subprocess
+import aiohttp
+import asyncio
+import importlib
+import logging
 import time
 import os
 import signal
 import sys
-import requests
-from threading import Thread
+import uvicorn
+from logging.handlers import RotatingFileHandler
 from dotenv import load_dotenv
+from src.metrics import metrics_registry
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+def build_output_logger():
+    logger = logging.getLogger('api.subprocess')
+    log_path = os.getenv('API_LOG_FILE')
+    if log_path and not logger.handlers:
+        handler = RotatingFileHandler(
+            log_path,
+            maxBytes=int(os.getenv('API_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+            backupCount=int(os.getenv('API_LOG_BACKUP_COUNT', 5)),
+            encoding='utf-8'
+        )
+        handler.setFormatter(logging.Formatter('%(asctime)s %(message)s'))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        # Вывод API пишется только в свой файл и не дублируется в лог бота
+        logger.propagate = False
+    return logger
+
+
 class ServerConfig:
     def __init__(self):
         self._host = os.getenv('API_HOST', '127.0.0.1')
         self._port = int(os.getenv('API_PORT', '8000'))
         self._database_mode = os.getenv('DATABASE_MODE', 'firebase')
+        self._api_mode = os.getenv('API_MODE', 'off')
+        self._workers = max(int(os.getenv('API_WORKERS', '1')), 1)
     
     @property
     def host(self):
@@ -27,6 +53,14 @@ class ServerConfig:
     def database_mode(self):
         return self._database_mode
     
+    @property
+    def api_mode(self):
+        return self._api_mode
+    
+    @property
+    def workers(self):
+        return self._workers
+    
     @property
     def url(self):
         return f"http://{self._host}:{self._port}"
@@ -36,97 +70,270 @@ class ServerConfig:
             return "src.api_firebase:app"
         return "src.api:app"
     
+    def load_api_app(self):
+        module_name, attribute = self.get_api_module().split(':')
+        return getattr(importlib.import_module(module_name), attribute)
+    
     def get_expected_message(self):
         if self._database_mode == 'firebase':
             return "Discord Bot Firebase API is running"
         return "Discord Bot API is running"
 
 
+OUTPUT_CHUNK_SIZE = 65536
+OUTPUT_MAX_LINE = 1024 * 1024
+
+
 class ProcessManager:
-    def __init__(self):
+    def __init__(self, output_logger=None):
         self._process = None
+        self._drain_task = None
+        self._output_logger = output_logger or build_output_logger()
     
-    def start_process(self, command):
-        self._process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
+    async def start_process(self, command):
+        # stderr сливается в stdout, а вывод непрерывно вычитывается: иначе uvicorn встанет на полном пайпе
+        self._process = await asyncio.create_subprocess_exec(
+            *command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.STDOUT
         )
+        self._drain_task = asyncio.create_task(self._drain(self._process.stdout))
+        return self._process
     
-    def stop_process(self):
-        if self._process:
-            os.kill(self._process.pid, signal.SIGTERM)
+    async def _drain(self, stream):
+        # readline() падает с ValueError на строке длиннее лимита потока (64 КиБ), поэтому строки режутся вручную
+        buffer = b''
+        while True:
+            chunk = await stream.read(OUTPUT_CHUNK_SIZE)
+            if not chunk:
+                break
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                self._log_output(line)
+            # Вывод без переводов строк не копится в памяти бесконечно
+            if len(buffer) > OUTPUT_MAX_LINE:
+                self._log_output(buffer)
+                buffer = b''
+        if buffer:
+            self._log_output(buffer)
+    
+    def _log_output(self, line):
+        self._output_logger.info(line.decode('utf-8', errors='replace').rstrip())
+    
+    async def wait(self):
+        return_code = await self._process.wait()
+        if self._drain_task is not None:
+            await self._drain_task
+        return return_code
+    
+    async def stop_process(self, timeout=10):
+        if not self.is_active:
             self._process = None
+            return
+        
+        self._process.send_signal(signal.SIGTERM)
+        try:
+            await asyncio.wait_for(self._process.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self._process.kill()
+            await self._process.wait()
+        if self._drain_task is not None:
+            await self._drain_task
+            self._drain_task = None
+        self._process = None
+    
+    @property
+    def pid(self):
+        return self._process.pid if self._process else None
     
     @property
     def is_active(self):
-        return self._process is not None
+        return self._process is not None and self._process.returncode is None
 
 
 class ServerValidator:
     def __init__(self, config):
         self._config = config
     
-    def wait_for_server(self, timeout=30, interval=1):
-        start_time = time.time()
-        while time.time() - start_time < timeout:
-            if self._check_server_response():
+    async def wait_for_server(self, timeout=30, initial_interval=0.1, max_interval=2.0, process_manager=None):
+        deadline = time.monotonic() + timeout
+        interval = initial_interval
+        while time.monotonic() < deadline:
+            if await self._check_server_response():
                 return True
-            time.sleep(interval)
+            if process_manager is not None and not process_manager.is_active:
+                return False
+            await asyncio.sleep(min(interval, max(deadline - time.monotonic(), 0)))
+            interval = min(interval * 2, max_interval)
         return False
     
-    def _check_server_response(self):
+    async def _fetch_root(self):
+        timeout = aiohttp.ClientTimeout(total=2)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            async with session.get(self._config.url) as response:
+                if response.status != 200:
+                    return None
+                return await response.json()
+    
+    async def _check_server_response(self):
         try:
-            response = requests.get(self._config.url)
-            if response.status_code == 200:
-                response_data = response.json()
-                expected_message = self._config.get_expected_message()
-                return response_data.get('message') == expected_message
-        except requests.exceptions.ConnectionError:
-            pass
-        return False
+            response_data = await self._fetch_root()
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            return False
+        expected_message = self._config.get_expected_message()
+        return bool(response_data) and response_data.get('message') == expected_message
     
-    def is_server_running(self):
+    async def is_server_running(self):
         try:
-            response = requests.get(self._config.url)
-            return response.status_code == 200
-        except requests.exceptions.ConnectionError:
+            return await self._fetch_root() is not None
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
             return False
 
 
 class APIServerManager:
-    def __init__(self):
-        self._config = ServerConfig()
+    def __init__(self, config=None, max_restart_delay=30.0):
+        self._config = config or ServerConfig()
         self._process_manager = ProcessManager()
         self._validator = ServerValidator(self._config)
+        self._supervisor_task = None
+        self._stopping = False
+        self._max_restart_delay = max_restart_delay
+        self._restarts = metrics_registry.counter(
+            'api_subprocess_restarts_total', 'Перезапуски процесса API после падения')
+        self._ready = metrics_registry.gauge('api_subprocess_ready', 'Процесс API отвечает на health-запрос')
 
-    def start(self):
-        if self._validator.is_server_running():
-            return
+    async def start(self):
+        if await self._validator.is_server_running():
+            return True
         
-        command = self._build_command()
-        self._process_manager.start_process(command)
-        self._validator.wait_for_server()
+        self._stopping = False
+        ready = await self._launch()
+        self._supervisor_task = asyncio.create_task(self._supervise())
+        return ready
+
+    async def _launch(self):
+        await self._process_manager.start_process(self._build_command())
+        ready = await self._validator.wait_for_server(process_manager=self._process_manager)
+        self._ready.set(1 if ready else 0)
+        if ready:
+            logger.info("API запущен", extra={'url': self._config.url, 'pid': self._process_manager.pid})
+        else:
+            logger.error("API не ответил", extra={'url': self._config.url})
+        return ready
+
+    async def _supervise(self):
+        delay = 1.0
+        while not self._stopping:
+            started_at = time.monotonic()
+            return_code = await self._process_manager.wait()
+            self._ready.set(0)
+            if self._stopping:
+                return
+            
+            # Процесс, проработавший дольше максимальной задержки, считается стабильным: задержка сбрасывается
+            if time.monotonic() - started_at > self._max_restart_delay:
+                delay = 1.0
+            logger.warning("Процесс API завершился, перезапуск", extra={'return_code': return_code, 'delay': delay})
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self._max_restart_delay)
+            if self._stopping:
+                return
+            
+            self._restarts.inc()
+            try:
+                await self._launch()
+            except OSError as e:
+                logger.error("Не удалось перезапустить API", extra={'error': str(e)})
 
     def _build_command(self):
         python_executable = sys.executable
         api_module = self._config.get_api_module()
         
-        return [
+        command = [
             python_executable, "-m", "uvicorn", api_module,
             "--host", self._config.host,
             "--port", str(self._config.port)
         ]
+        if self._config.workers > 1:
+            command.extend(["--workers", str(self._config.workers)])
+        return command
 
-    def stop(self):
-        self._process_manager.stop_process()
+    async def stop(self):
+        self._stopping = True
+        if self._supervisor_task is not None:
+            self._supervisor_task.cancel()
+            await asyncio.gather(self._supervisor_task, return_exceptions=True)
+            self._supervisor_task = None
+        await self._process_manager.stop_process()
+        self._ready.set(0)
 
-    def is_running(self):
-        return self._validator.is_server_running()
+    async def is_running(self):
+        return await self._validator.is_server_running()
 
-    def __enter__(self):
-        self.start()
+    async def __aenter__(self):
+        await self.start()
         return self
 
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.stop()
\ No newline at end of file
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.stop()
+
+
+class EmbeddedAPIServer:
+    def __init__(self, config=None):
+        self._config = config or ServerConfig()
+        self._server = None
+        self._task = None
+    
+    async def start(self, timeout=30):
+        if self.is_running:
+            return True
+        
+        # Приложение импортируется в процессе бота: общий firebase_admin, кэши и шина изменений
+        uvicorn_config = uvicorn.Config(
+            self._config.load_api_app(),
+            host=self._config.host,
+            port=self._config.port,
+            log_level=os.getenv('API_LOG_LEVEL', 'warning'),
+            # Без собственной конфигурации логи uvicorn идут в общую очередь логов бота
+            log_config=None
+        )
+        self._server = uvicorn.Server(uvicorn_config)
+        self._task = asyncio.create_task(self._serve(self._server))
+        
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if self._task.done() or time.monotonic() > deadline:
+                logger.error("Встроенный API не запустился", extra={'url': self._config.url})
+                await self.stop()
+                return False
+            await asyncio.sleep(0.05)
+        
+        logger.info("Встроенный API запущен", extra={'url': self._config.url})
+        return True
+    
+    @staticmethod
+    async def _serve(server):
+        try:
+            await server.serve()
+        except SystemExit:
+            # uvicorn завершает процесс при ошибке bind — здесь это не должно останавливать бота
+            pass
+    
+    async def stop(self):
+        if self._task is None:
+            return
+        
+        self._server.should_exit = True
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout=10)
+        except asyncio.TimeoutError:
+            self._server.force_exit = True
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        self._server = None
+    
+    @property
+    def is_running(self):
+        return self._task is not None and not self._task.done() and self._server.started
@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import os
+import time
+from collections import Counter
+from typing import Any, Coroutine, Dict, List, Optional, Set, Tuple
+
+import discord
+from discord.ext import commands
+
+from src.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+
+class ShardConfig:
+    __slots__ = ('enabled', 'shard_count', 'shard_ids')
+
+    def __init__(self, enabled: bool = False, shard_count: Optional[int] = None, shard_ids: Optional[List[int]] = None):
+        if shard_ids is not None and shard_count is None:
+            raise ValueError("SHARD_IDS задан без SHARD_COUNT")
+        if shard_ids is not None and any(not 0 <= shard_id < shard_count for shard_id in shard_ids):
+            raise ValueError(f"SHARD_IDS должны быть в диапазоне 0..{shard_count - 1}")
+        self.enabled = enabled or shard_count is not None or shard_ids is not None
+        self.shard_count = shard_count
+        self.shard_ids = shard_ids
+
+    @classmethod
+    def from_env(cls) -> 'ShardConfig':
+        count = os.getenv('SHARD_COUNT')
+        ids = os.getenv('SHARD_IDS')
+        return cls(
+            enabled=os.getenv('SHARDING', '0').lower() in ('1', 'true', 'auto'),
+            shard_count=int(count) if count else None,
+            shard_ids=[int(part) for part in ids.split(',') if part.strip()] if ids else None
+        )
+
+    def describe(self) -> str:
+        if not self.enabled:
+            return "без шардирования"
+        count = self.shard_count if self.shard_count is not None else "авто"
+        ids = ",".join(map(str, self.shard_ids)) if self.shard_ids is not None else "все"
+        return f"шардов {count}, в процессе: {ids}"
+
+
+def create_bot(config: ShardConfig, **kwargs) -> commands.Bot:
+    if not config.enabled:
+        return commands.Bot(**kwargs)
+    # Без shard_count AutoShardedBot сам берёт рекомендованное Discord число шардов
+    return commands.AutoShardedBot(shard_count=config.shard_count, shard_ids=config.shard_ids, **kwargs)
+
+
+class ShardMonitor:
+    """Метрики по шардам и фоновые задачи, привязанные к шарду сервера.
+
+    Число событий берётся из номера последовательности шлюза: он растёт на каждое событие, так что
+    подсчёт ничего не добавляет в обработку самих событий.
+    """
+
+    def __init__(self, interval: float = 15.0, registry=metrics_registry):
+        self._interval = interval
+        self._bot: Optional[commands.Bot] = None
+        self._task = None
+        self._connected: Dict[int, asyncio.Event] = {}
+        self._sequences: Dict[int, Tuple[int, float]] = {}
+        self._rates: Dict[int, float] = {}
+        self._latencies: Dict[int, float] = {}
+        self._tasks: Dict[int, Set[asyncio.Task]] = {}
+        self._latency = registry.gauge('discord_shard_latency_seconds', 'Задержка heartbeat шлюза по шардам', ('shard',))
+        self._guilds = registry.gauge('discord_shard_guilds', 'Серверы на шарде', ('shard',))
+        self._events = registry.counter('discord_shard_events_total', 'События шлюза по шардам', ('shard',))
+        self._up = registry.gauge('discord_shard_connected', 'Подключён ли шард к шлюзу', ('shard',))
+        self._background = registry.gauge(
+            'discord_shard_background_tasks', 'Фоновые задачи, привязанные к шарду', ('shard',))
+
+    @property
+    def sharded(self) -> bool:
+        return isinstance(self._bot, discord.AutoShardedClient)
+
+    def attach(self, bot: commands.Bot) -> None:
+        self._bot = bot
+        if self.sharded:
+            bot.add_listener(self._on_shard_up, 'on_shard_connect')
+            bot.add_listener(self._on_shard_up, 'on_shard_resumed')
+            bot.add_listener(self._on_shard_down, 'on_shard_disconnect')
+        else:
+            # Без шардирования весь бот — один шард с id 0
+            bot.add_listener(self._on_connect, 'on_connect')
+            bot.add_listener(self._on_connect, 'on_resumed')
+            bot.add_listener(self._on_disconnect, 'on_disconnect')
+
+    def _event(self, shard_id: int) -> asyncio.Event:
+        event = self._connected.get(shard_id)
+        if event is None:
+            event = self._connected[shard_id] = asyncio.Event()
+        return event
+
+    async def _on_shard_up(self, shard_id: int) -> None:
+        self._event(shard_id).set()
+        self._up.set(1, shard=str(shard_id))
+
+    async def _on_shard_down(self, shard_id: int) -> None:
+        self._event(shard_id).clear()
+        self._up.set(0, shard=str(shard_id))
+
+    async def _on_connect(self) -> None:
+        await self._on_shard_up(0)
+
+    async def _on_disconnect(self) -> None:
+        await self._on_shard_down(0)
+
+    def shard_ids(self) -> List[int]:
+        if self._bot is None:
+            return []
+        if self.sharded:
+            return sorted(self._bot.shards)
+        return [0]
+
+    def shard_for_guild(self, guild_id: int) -> int:
+        shard_count = self._bot.shard_count if self._bot is not None else None
+        return (int(guild_id) >> 22) % shard_count if shard_count else 0
+
+    def _websocket(self, shard_id: int):
+        # Публичного доступа к сокету шарда в discord.py нет: ShardInfo хранит его в _parent.ws
+        if self.sharded:
+            shard = self._bot.get_shard(shard_id)
+            return shard._parent.ws if shard is not None else None
+        return self._bot.ws
+
+    async def wait_connected(self, shard_id: int, timeout: float) -> bool:
+        event = self._connected.get(shard_id)
+        if event is None or event.is_set():
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def spawn(self, shard_id: int, coroutine: Coroutine[Any, Any, Any], name: str = None) -> asyncio.Task:
+        # Задачи держатся по шардам: ссылка не даёт сборщику мусора убить таймер, а остановка снимает их все
+        task = asyncio.create_task(coroutine, name=name)
+        tasks = self._tasks.setdefault(shard_id, set())
+        tasks.add(task)
+        self._background.set(len(tasks), shard=str(shard_id))
+
+        def forget(finished: asyncio.Task) -> None:
+            tasks.discard(finished)
+            self._background.set(len(tasks), shard=str(shard_id))
+        task.add_done_callback(forget)
+        return task
+
+    def sample(self) -> None:
+        if self._bot is None:
+            return
+        now = time.monotonic()
+        latencies = dict(self._bot.latencies) if self.sharded else {0: self._bot.latency}
+        guilds = Counter(guild.shard_id for guild in self._bot.guilds)
+        for shard_id in self.shard_ids():
+            label = str(shard_id)
+            latency = latencies.get(shard_id)
+            # До первого heartbeat задержка равна nan или inf
+            if latency is not None and latency == latency and latency != float('inf'):
+                self._latencies[shard_id] = latency
+                self._latency.set(latency, shard=label)
+            self._guilds.set(guilds.get(shard_id, 0), shard=label)
+
+            websocket = self._websocket(shard_id)
+            sequence = getattr(websocket, 'sequence', None)
+            if sequence is None:
+                continue
+            previous = self._sequences.get(shard_id)
+            self._sequences[shard_id] = (sequence, now)
+            if previous is None:
+                continue
+            # Новая сессия начинает последовательность заново
+            delta = sequence - previous[0] if sequence >= previous[0] else sequence
+            self._events.inc(delta, shard=label)
+            self._rates[shard_id] = delta / max(now - previous[1], 1e-9)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        result = []
+        for shard_id in self.shard_ids():
+            label = str(shard_id)
+            event = self._connected.get(shard_id)
+            result.append({
+                'shard': shard_id,
+                'connected': event is not None and event.is_set(),
+                'latency': self._latencies.get(shard_id),
+                'guilds': int(self._guilds.value(shard=label)),
+                'events_per_second': self._rates.get(shard_id),
+                'background_tasks': len(self._tasks.get(shard_id, ()))
+            })
+        return result
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                self.sample()
+            except Exception:
+                logger.exception("Ошибка при сборе метрик шардов")
+            await asyncio.sleep(self._interval)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        tasks = [task for shard_tasks in self._tasks.values() for task in shard_tasks]
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+shard_monitor = ShardMonitor(interval=float(os.getenv('SHARD_METRICS_INTERVAL', 15)))
+
+
+def get_shard_monitor() -> ShardMonitor:
+    return shard_monitor
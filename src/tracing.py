@@ -0,0 +1,348 @@
+import contextlib
+import contextvars
+import functools
+import inspect
+import itertools
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+import discord
+from discord import app_commands
+
+from src.memory import memory_reporter
+from src.metrics import metrics_registry
+
+logger = logging.getLogger(__name__)
+
+_current_span = contextvars.ContextVar('trace_span', default=None)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(q * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def _quantiles(values) -> Dict[str, Optional[float]]:
+    ordered = sorted(values)
+    return {
+        'p50': _percentile(ordered, 0.5),
+        'p95': _percentile(ordered, 0.95),
+        'p99': _percentile(ordered, 0.99)
+    }
+
+
+class Span:
+    __slots__ = ('trace', 'span_id', 'parent_id', 'name', 'kind', 'start', 'duration', 'attributes', 'error')
+
+    def __init__(self, trace: 'Trace', span_id: int, parent_id: Optional[int], name: str, kind: str,
+                 attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.duration = None
+        self.attributes = attributes
+        self.error = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'kind': self.kind,
+            'offset_ms': round((self.start - self.trace.root.start) * 1000, 3),
+            'duration_ms': round((self.duration or 0.0) * 1000, 3),
+            'attributes': self.attributes,
+            'error': self.error
+        }
+
+
+class Trace:
+    __slots__ = ('trace_id', 'name', 'started_at', 'root', 'spans', 'finished', '_span_ids')
+
+    def __init__(self, trace_id: str, name: str):
+        self.trace_id = trace_id
+        self.name = name
+        self.started_at = time.time()
+        self.root = None
+        self.spans: List[Span] = []
+        self.finished = False
+        self._span_ids = itertools.count(1)
+
+    def new_span(self, parent: Optional[Span], name: str, kind: str, attributes: Dict[str, Any]) -> Span:
+        return Span(self, next(self._span_ids), parent.span_id if parent else None, name, kind, attributes)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round((self.root.duration or 0.0) * 1000, 3),
+            'spans': [span.as_dict() for span in [self.root] + sorted(self.spans, key=lambda span: span.start)]
+        }
+
+
+class JsonlExporter:
+    def __init__(self, path: str, max_queue: int = 10000):
+        self._path = path
+        # Запись в файл уходит в отдельный поток, чтобы не блокировать цикл бота
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._write_loop, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, record: Dict[str, Any]) -> bool:
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            return False
+
+    def _write_loop(self) -> None:
+        while True:
+            records = [self._queue.get()]
+            while not self._queue.empty() and len(records) < 500:
+                records.append(self._queue.get_nowait())
+            try:
+                with open(self._path, 'a', encoding='utf-8') as file:
+                    for record in records:
+                        file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+            except OSError as e:
+                logger.error("Не удалось записать трассы", extra={'path': self._path, 'error': str(e)})
+
+
+class Tracer:
+    def __init__(self, window: int = 1000, recent: int = 200, exporter: Optional[JsonlExporter] = None,
+                 sample_rate: float = 1.0, registry=metrics_registry):
+        self._window = window
+        self._exporter = exporter
+        self._sample_rate = sample_rate
+        self._lock = threading.Lock()
+        self._durations: Dict[str, deque] = {}
+        self._span_durations: Dict[str, Dict[tuple, deque]] = {}
+        self._recent: deque = deque(maxlen=recent)
+        self._interaction_latency = registry.histogram(
+            'interaction_duration_seconds', 'Длительность обработки взаимодействий', ('interaction',))
+        self._rest_latency = registry.histogram(
+            'discord_rest_duration_seconds', 'Длительность запросов к Discord REST API', ('route',))
+        self._rest_errors = registry.counter(
+            'discord_rest_errors_total', 'Ошибки запросов к Discord REST API', ('route', 'status'))
+        self._dropped = registry.counter('trace_export_dropped_total', 'Трассы, не попавшие в экспорт')
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    @contextlib.contextmanager
+    def interaction(self, interaction: discord.Interaction, name: str):
+        if _current_span.get() is not None:
+            # Вложенное взаимодействие (например, модалка из колбэка) становится спаном внешней трассы
+            with self.span(name, kind='interaction') as span:
+                yield span
+            return
+
+        trace = Trace(str(interaction.id), name)
+        trace.root = trace.new_span(None, name, 'interaction', {
+            'guild_id': interaction.guild_id,
+            'user_id': interaction.user.id if interaction.user else None
+        })
+        token = _current_span.set(trace.root)
+        try:
+            yield trace.root
+        except BaseException as e:
+            trace.root.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            trace.root.duration = time.perf_counter() - trace.root.start
+            self._finish_trace(trace)
+
+    @contextlib.contextmanager
+    def span(self, name: str, kind: str = 'internal', **attributes):
+        parent = _current_span.get()
+        # Вне трассы спаны не создаются: фоновые задачи и API не платят за трассировку
+        if parent is None or parent.trace.finished:
+            yield None
+            return
+
+        span = parent.trace.new_span(parent, name, kind, attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            span.duration = time.perf_counter() - span.start
+            if not span.trace.finished:
+                span.trace.spans.append(span)
+
+    def traced(self, func: Callable = None, *, name: str = None, kind: str = 'internal'):
+        if func is None:
+            return functools.partial(self.traced, name=name, kind=kind)
+
+        span_name = name or func.__name__
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if _current_span.get() is None:
+                    return await func(*args, **kwargs)
+                with self.span(span_name, kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current_span.get() is None:
+                return func(*args, **kwargs)
+            with self.span(span_name, kind):
+                return func(*args, **kwargs)
+        return wrapper
+
+    def instrument_http(self, http) -> None:
+        request = http.request
+        if getattr(request, '__traced__', False):
+            return
+
+        @functools.wraps(request)
+        async def traced_request(route, **kwargs):
+            name = f"{route.method} {route.path}"
+            start = time.perf_counter()
+            with self.span(name, kind='discord') as span:
+                try:
+                    return await request(route, **kwargs)
+                except discord.HTTPException as e:
+                    self._rest_errors.inc(route=name, status=str(e.status))
+                    if span is not None:
+                        span.set_attribute('status', e.status)
+                    raise
+                finally:
+                    self._rest_latency.observe(time.perf_counter() - start, route=name)
+
+        traced_request.__traced__ = True
+        http.request = traced_request
+
+    def _finish_trace(self, trace: Trace) -> None:
+        trace.finished = True
+        duration = trace.root.duration
+        self._interaction_latency.observe(duration, interaction=trace.name)
+        with self._lock:
+            durations = self._durations.get(trace.name)
+            if durations is None:
+                durations = self._durations[trace.name] = deque(maxlen=self._window)
+                self._span_durations[trace.name] = {}
+            durations.append(duration)
+            span_durations = self._span_durations[trace.name]
+            for span in trace.spans:
+                key = (span.name, span.kind)
+                window = span_durations.get(key)
+                if window is None:
+                    window = span_durations[key] = deque(maxlen=self._window)
+                window.append(span.duration)
+            self._recent.append(trace)
+
+        if self._exporter is not None and random.random() < self._sample_rate:
+            if not self._exporter.export(trace.as_dict()):
+                self._dropped.inc()
+
+    def summary(self, top_spans: int = 5) -> List[Dict[str, Any]]:
+        with self._lock:
+            windows = {name: list(durations) for name, durations in self._durations.items()}
+            span_windows = {
+                name: {key: list(values) for key, values in spans.items()}
+                for name, spans in self._span_durations.items()
+            }
+
+        result = []
+        for name, durations in windows.items():
+            total = sum(durations)
+            spans = []
+            for (span_name, kind), values in span_windows[name].items():
+                spans.append({
+                    'name': span_name,
+                    'kind': kind,
+                    'count': len(values),
+                    **_quantiles(values),
+                    # Доля от суммарного времени взаимодействия; вложенные спаны учитываются и в родителе
+                    'share': round(sum(values) / total, 3) if total else 0.0
+                })
+            spans.sort(key=lambda span: span['p95'] or 0.0, reverse=True)
+            result.append({
+                'interaction': name,
+                'count': len(durations),
+                **_quantiles(durations),
+                'spans': spans[:top_spans]
+            })
+        result.sort(key=lambda item: item['p95'] or 0.0, reverse=True)
+        return result
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._recent)[-limit:]
+        return [trace.as_dict() for trace in traces]
+
+    def export_jsonl(self, path: str) -> int:
+        traces = self.recent(self._recent.maxlen)
+        with open(path, 'w', encoding='utf-8') as file:
+            for record in traces:
+                file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+        return len(traces)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._durations.clear()
+            self._span_durations.clear()
+            self._recent.clear()
+
+
+def callback_name(item) -> str:
+    callback = item.callback
+    # Кнопки из @discord.ui.button оборачиваются в _ViewCallback с исходной функцией в .callback
+    name = getattr(callback, '__name__', None) or getattr(getattr(callback, 'callback', None), '__name__', None)
+    return name or getattr(item, 'custom_id', None) or type(item).__name__
+
+
+class TracedCommandTree(app_commands.CommandTree):
+    async def _call(self, interaction: discord.Interaction) -> None:
+        # _call — единая точка вызова слэш-команд discord.py: в трассу попадают проверки прав и сама команда
+        name = f"command.{(interaction.data or {}).get('name', 'unknown')}"
+        if interaction.type == discord.InteractionType.autocomplete:
+            name += '.autocomplete'
+        with tracer.interaction(interaction, name):
+            await super()._call(interaction)
+
+
+def _build_exporter() -> Optional[JsonlExporter]:
+    path = os.getenv('TRACE_EXPORT_PATH')
+    return JsonlExporter(path) if path else None
+
+
+tracer = Tracer(
+    window=int(os.getenv('TRACE_WINDOW', 1000)),
+    exporter=_build_exporter(),
+    sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', 1.0))
+)
+memory_reporter.register('traces', lambda: tracer._recent)
+
+
+def get_tracer() -> Tracer:
+    return tracer
+
+
+def traced(func: Callable = None, *, name: str = None, kind: str = 'internal'):
+    return tracer.traced(func, name=name, kind=kind)
@@ -1,16 +1,25 @@
 import asyncio
+import heapq
+import itertools
+import logging
 import time
 import os
 from dotenv import load_dotenv
 from src.database_firebase import applications_cache, remove_application
+from src.memory import memory_reporter
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 class ApplicationState:
-    def __init__(self, user_id: int, timestamp: float):
+    __slots__ = ('_user_id', '_timestamp', '_guild_id')
+
+    def __init__(self, user_id: int, timestamp: float, guild_id: str = None):
         self._user_id = user_id
         self._timestamp = timestamp
+        self._guild_id = guild_id
     
     @property
     def user_id(self) -> int:
@@ -20,6 +29,10 @@ class ApplicationState:
     def timestamp(self) -> float:
         return self._timestamp
     
+    @property
+    def guild_id(self) -> str:
+        return self._guild_id
+    
     def is_expired(self, timeout: int) -> bool:
         return time.time() - self._timestamp > timeout
 
@@ -27,9 +40,30 @@ class ApplicationState:
 class StateStorage:
     def __init__(self):
         self._states = {}
+        # Куча (timestamp, seq, message_id, state) упорядочена по времени создания: таймаут у всех состояний общий.
+        # Снятые и перезаписанные состояния не удаляются из кучи сразу, а пропускаются при извлечении
+        self._expiry = []
+        self._sequence = itertools.count()
     
     def add(self, message_id: int, state: ApplicationState) -> None:
         self._states[message_id] = state
+        heapq.heappush(self._expiry, (state.timestamp, next(self._sequence), message_id, state))
+        if len(self._expiry) > 2 * len(self._states) + 64:
+            self._compact()
+    
+    def _compact(self) -> None:
+        self._expiry = [entry for entry in self._expiry if self._states.get(entry[2]) is entry[3]]
+        heapq.heapify(self._expiry)
+    
+    def pop_older_than(self, cutoff: float) -> list:
+        # Стоимость пропорциональна числу истёкших записей, а не размеру хранилища
+        expired = []
+        while self._expiry and self._expiry[0][0] < cutoff:
+            _, _, message_id, state = heapq.heappop(self._expiry)
+            if self._states.get(message_id) is state:
+                del self._states[message_id]
+                expired.append((message_id, state))
+        return expired
     
     def remove(self, message_id: int) -> ApplicationState:
         return self._states.pop(message_id, None)
@@ -42,6 +76,9 @@ class StateStorage:
     
     def pop(self, message_id: int) -> ApplicationState:
         return self._states.pop(message_id, None)
+    
+    def __len__(self) -> int:
+        return len(self._states)
 
 
 class StateCleanupService:
@@ -49,27 +86,22 @@ class StateCleanupService:
         self._storage = storage
         self._timeout = timeout
     
-    def get_expired_states(self):
-        expired_states = []
-        for message_id, state in self._storage.get_all_items():
-            if state.is_expired(self._timeout):
-                expired_states.append(message_id)
-        return expired_states
-    
-    def remove_expired_states(self):
-        expired_message_ids = self.get_expired_states()
-        for message_id in expired_message_ids:
-            self._storage.pop(message_id)
-            self._remove_from_applications_cache(message_id)
-    
-    def _remove_from_applications_cache(self, message_id: int):
-        guild_id = self._find_guild_id_for_message(message_id)
+    def remove_expired_states(self) -> int:
+        expired = self._storage.pop_older_than(time.time() - self._timeout)
+        for message_id, state in expired:
+            self._remove_from_applications_cache(message_id, state)
+        return len(expired)
+    
+    def _remove_from_applications_cache(self, message_id: str, state: ApplicationState):
+        guild_id = state.guild_id or self._find_guild_id_for_message(message_id)
         if guild_id:
             remove_application(guild_id, message_id)
     
-    def _find_guild_id_for_message(self, message_id: int):
+    def _find_guild_id_for_message(self, message_id: str):
+        # Запасной путь для состояний без guild_id: полный обход коллекции заявок
         cache = applications_cache()
         if cache and hasattr(cache, 'items'):
+            message_id = str(message_id)
             return next((gid for gid, apps in cache.items() if message_id in apps), None)
         return None
 
@@ -81,8 +113,8 @@ class ApplicationStateManager:
         self._storage = StateStorage()
         self._cleanup_service = StateCleanupService(self._storage, self._timeout)
     
-    def add_state(self, message_id: int, user_id: int) -> None:
-        state = ApplicationState(user_id, time.time())
+    def add_state(self, message_id: int, user_id: int, guild_id=None) -> None:
+        state = ApplicationState(user_id, time.time(), str(guild_id) if guild_id is not None else None)
         self._storage.add(message_id, state)
     
     def remove_state(self, message_id: int) -> ApplicationState:
@@ -91,18 +123,28 @@ class ApplicationStateManager:
     def get_state(self, message_id: int) -> ApplicationState:
         return self._storage.get(message_id)
     
+    @property
+    def storage(self) -> StateStorage:
+        return self._storage
+    
     async def clear_old_states(self) -> None:
         while True:
             await asyncio.sleep(self._clear_interval)
-            self._cleanup_service.remove_expired_states()
+            try:
+                removed = self._cleanup_service.remove_expired_states()
+            except Exception:
+                logger.exception("Ошибка при очистке устаревших состояний заявок")
+                continue
+            if removed:
+                logger.info("Сняты устаревшие блокировки рассмотрения", extra={'count': removed})
 
 
 class ApplicationStateService:
     def __init__(self):
         self._manager = ApplicationStateManager()
     
-    def add_state(self, message_id: int, user_id: int) -> None:
-        self._manager.add_state(message_id, user_id)
+    def add_state(self, message_id: int, user_id: int, guild_id=None) -> None:
+        self._manager.add_state(message_id, user_id, guild_id)
     
     def remove_state(self, message_id: int) -> ApplicationState:
         return self._manager.remove_state(message_id)
@@ -110,11 +152,16 @@ class ApplicationStateService:
     def get_state(self, message_id: int) -> ApplicationState:
         return self._manager.get_state(message_id)
     
+    @property
+    def storage(self) -> StateStorage:
+        return self._manager.storage
+    
     async def start_cleanup_task(self) -> None:
         await self._manager.clear_old_states()
 
 
 _application_state_service = ApplicationStateService()
+memory_reporter.register('application_states', lambda: _application_state_service.storage)
 
 
 def get_application_state_service() -> ApplicationStateService:
@@ -1,11 +1,15 @@
 # $1
 
+import logging
 import time
 import discord
 from discord.ui import View, Button, Modal, TextInput
 from src.database_firebase import get_settings, save_application, remove_application, save_settings, init_owners, owners_cache, add_member_to_capt, get_capt, remove_capt, remove_member_from_capt
 from src.permissions import check_approver
-from src.utils import get_application_state_service
+from src.tracing import callback_name, tracer
+from src.review_locks import get_review_locks
+
+logger = logging.getLogger(__name__)
 
 start_time = time.time()
 
@@ -13,6 +17,11 @@ class BaseModal(Modal):
     def __init__(self, title: str):
         super().__init__(title=title)
     
+    async def _scheduled_task(self, interaction: discord.Interaction, components):
+        # Точка диспетчеризации discord.py: в трассу попадают interaction_check и on_submit
+        with tracer.interaction(interaction, f"{type(self).__name__}.on_submit"):
+            return await super()._scheduled_task(interaction, components)
+    
     async def handle_error(self, interaction: discord.Interaction, error_message: str):
         if interaction.response.is_done():
             await interaction.followup.send(error_message, ephemeral=True)
@@ -24,6 +33,10 @@ class BaseView(View):
     def __init__(self, timeout=None):
         super().__init__(timeout=timeout)
     
+    async def _scheduled_task(self, item, interaction: discord.Interaction):
+        with tracer.interaction(interaction, f"{type(self).__name__}.{callback_name(item)}"):
+            return await super()._scheduled_task(item, interaction)
+    
     async def handle_error(self, interaction: discord.Interaction, error_message: str):
         if interaction.response.is_done():
             await interaction.followup.send(error_message, ephemeral=True)
@@ -32,23 +45,22 @@ class BaseView(View):
 
 
 class ApplicationReviewer:
+    __slots__ = ('application_view',)
+
     def __init__(self, application_view):
         self.application_view = application_view
     
-    def is_being_reviewed(self, message_id: str, user_id: int) -> tuple[bool, str]:
-        current_reviewer = get_application_state_service().get_state(message_id)
-        if current_reviewer and current_reviewer.user_id is not None and current_reviewer.user_id != user_id:
-            return True, current_reviewer.user_id
-        return False, None
+    async def acquire(self, message_id: str, user_id: int) -> tuple[bool, int]:
+        # Проверка и захват одной операцией: между ними заявку не успеет взять другой экземпляр бота
+        return await get_review_locks().acquire(self.application_view.guild_id, message_id, user_id)
     
-    def set_reviewer(self, message_id: str, user_id: int):
-        get_application_state_service().add_state(message_id, user_id)
-    
-    def clear_reviewer(self, message_id: str):
-        get_application_state_service().remove_state(message_id)
+    async def release(self, message_id: str):
+        await get_review_locks().release(self.application_view.guild_id, message_id)
 
 
 class NotificationSender:
+    __slots__ = ('bot',)
+
     def __init__(self, bot):
         self.bot = bot
     
@@ -73,58 +85,51 @@ class RoleManager:
     @staticmethod
     async def assign_approved_role(guild, applicant_id: str, bot_user_id: int = None) -> bool:
         try:
-            # get_settings возвращает: (form_channel_id, approv_channel_id, approver_role_id, approved_role_id, blacklist_report_channel_id)
-            settings = get_settings(guild.id)
-            if len(settings) >= 4:
-                approved_role_id = settings[3]  # 4-й элемент (индекс 3)
-                
-                if approved_role_id:
-                    role = guild.get_role(int(approved_role_id))
-                    if role:
-                        # Используем fetch_member как основной метод для надёжного поиска
-                        member = None
-                        applicant_id_int = int(applicant_id)
+            approved_role_id = get_settings(guild.id).approved_role_id
+            if approved_role_id:
+                role = guild.get_role(approved_role_id)
+                if role:
+                    # Используем fetch_member как основной метод для надёжного поиска
+                    member = None
+                    applicant_id_int = int(applicant_id)
+                    
+                    try:
+                        member = await guild.fetch_member(applicant_id_int)
+                    except discord.NotFound:
+                        return True  # Пользователь покинул сервер
+                    except Exception:
+                        # Fallback на get_member в случае ошибки API
+                        member = guild.get_member(applicant_id_int)
+                        if not member:
+                            return False
+                    
+                    if member:
+                        # Проверяем права бота (используем guild.me для получения бота)
+                        bot_member = guild.me
+                        if not bot_member:
+                            logger.error("Бот не найден на сервере", extra={'guild_id': guild.id})
+                            return False
+                            
+                        if not bot_member.guild_permissions.manage_roles:
+                            return False
                         
-                        try:
-                            member = await guild.fetch_member(applicant_id_int)
-                        except discord.NotFound:
-                            return True  # Пользователь покинул сервер
-                        except Exception:
-                            # Fallback на get_member в случае ошибки API
-                            member = guild.get_member(applicant_id_int)
-                            if not member:
-                                return False
+                        # Проверяем иерархию ролей
+                        if role.position >= bot_member.top_role.position:
+                            return False
                         
-                        if member:
-                            # Проверяем права бота (используем guild.me для получения бота)
-                            bot_member = guild.me
-                            if not bot_member:
-                                print(f"❌ Бот не найден на сервере {guild.id}")
-                                return False
-                                
-                            if not bot_member.guild_permissions.manage_roles:
-                                return False
-                            
-                            # Проверяем иерархию ролей
-                            if role.position >= bot_member.top_role.position:
-                                return False
-                            
-                            # Проверяем, есть ли уже эта роль у пользователя
-                            if role in member.roles:
-                                return True
-                            
-                            await member.add_roles(role, reason="Заявка одобрена")
-                            return True
-                        else:
-                            # Пользователь покинул сервер - возвращаем True, чтобы заявка была помечена как обработанная
+                        # Проверяем, есть ли уже эта роль у пользователя
+                        if role in member.roles:
                             return True
+                        
+                        await member.add_roles(role, reason="Заявка одобрена")
+                        return True
                     else:
-                        return False
+                        # Пользователь покинул сервер - возвращаем True, чтобы заявка была помечена как обработанная
+                        return True
                 else:
                     return False
             else:
                 return False
-            return False
         except Exception:
             return False
 
@@ -421,7 +426,7 @@ class DenyReasonModal(BaseModal, title="Причина отказа"):
 
         await self.message.edit(embed=embed, view=new_view)
 
-        get_application_state_service().remove_state(self.message_id)
+        await get_review_locks().release(interaction.guild_id, self.message_id)
         
         remove_application(interaction.guild_id, self.message_id)
 
@@ -469,16 +474,14 @@ class ApplicationView(BaseView):
         return True
 
     async def _check_reviewer_status(self, interaction: discord.Interaction) -> bool:
-        message_id = str(self.message_id)
-        is_being_reviewed, reviewer_id = self.reviewer.is_being_reviewed(message_id, interaction.user.id)
+        acquired, reviewer_id = await self.reviewer.acquire(str(self.message_id), interaction.user.id)
         
-        if is_being_reviewed:
+        if not acquired:
             reviewer = interaction.guild.get_member(reviewer_id)
             tag = reviewer.mention if reviewer else f"<@{reviewer_id}>"
             await self.handle_error(interaction, f"Сейчас заявку смотрит {tag}.")
             return False
         
-        self.reviewer.set_reviewer(message_id, interaction.user.id)
         return True
 
     async def approve(self, interaction: discord.Interaction):
@@ -535,7 +538,7 @@ class ApplicationView(BaseView):
         else:
             await interaction.followup.send("✅ Заявка одобрена успешно!", ephemeral=True)
 
-        self.reviewer.clear_reviewer(str(self.message_id))
+        await self.reviewer.release(str(self.message_id))
         
         remove_application(interaction.guild_id, self.message_id)
 
@@ -650,31 +653,19 @@ class ApplicationModal(BaseModal, title="Заявка на вступление"
     async def on_submit(self, interaction: discord.Interaction):
         settings = get_settings(interaction.guild_id)
         
-        if len(settings) < 3:
-            await self.handle_error(interaction, "Ошибка! Настройки канала не настроены.")
-            return
-        
-        form_channel_id, approv_channel_id, approver_role_id = settings[0], settings[1], settings[2]
-        
-        if not approv_channel_id:
+        if not settings.approv_channel_id:
             await self.handle_error(interaction, "Ошибка! Канал для заявок не настроен.")
             return
 
-        channel = interaction.guild.get_channel(int(approv_channel_id))
+        channel = interaction.guild.get_channel(settings.approv_channel_id)
         if channel is None:
             await self.handle_error(interaction, "Ошибка: канал для заявок не найден.")
             return
 
         # Получаем роль модераторов из настроек
-        guild_id_str = str(interaction.guild_id)
-        settings = get_settings(interaction.guild_id)
-        approver_role_id = settings[2] if len(settings) >= 3 else None
-
         role = None
-        if approver_role_id:
-            role = interaction.guild.get_role(int(approver_role_id))
-        else:
-            pass
+        if settings.approver_role_id:
+            role = interaction.guild.get_role(settings.approver_role_id)
 
         mention = role.mention if role else "@everyone"
 
@@ -722,22 +713,14 @@ class ApplyButtonView(BaseView):
             await self.handle_error(interaction, "❌ У вас уже есть активная заявка!\n\n📋 Пока ваша заявка не рассмотрена, вы не можете подать новую.\n⏰ Дождитесь решения администрации по вашей текущей заявке.")
             return
         
-        settings = get_settings(interaction.guild_id)
-        
-        if len(settings) >= 2:
-            form_channel_id, approv_channel_id = settings[0], settings[1]
-        else:
-            await self.handle_error(interaction, "Ошибка! Настройки канала не найдены.")
-            return
-        
-        if not approv_channel_id:
+        if not get_settings(interaction.guild_id).approv_channel_id:
             await self.handle_error(interaction, "Ошибка! Канал для заявок не настроен.")
             return
             
         await interaction.response.send_modal(ApplicationModal(self.bot))
 
 
-class CaptView(View):
+class CaptView(BaseView):
     def __init__(self, max_members, timer_minutes=None):
         super().__init__(timeout=None)
         self.max_members = max_members
@@ -767,8 +750,8 @@ class CaptView(View):
     async def join_callback(self, interaction: discord.Interaction):
         try:
             await self.member_manager.handle_join(interaction, self.max_members)
-        except Exception as e:
-            print(f"Ошибка в обработке кнопки присоединения к группе: {e}")
+        except Exception:
+            logger.exception("Ошибка в обработке кнопки присоединения к группе", extra={'guild_id': interaction.guild_id})
             error_embed = discord.Embed(
                 title="❌ Системная ошибка",
                 description="Произошла непредвиденная ошибка. Обратитесь к администратору.",
@@ -779,8 +762,8 @@ class CaptView(View):
     async def leave_callback(self, interaction: discord.Interaction):
         try:
             await self.member_manager.handle_leave(interaction, self.max_members)
-        except Exception as e:
-            print(f"Ошибка в обработке кнопки покидания группы: {e}")
+        except Exception:
+            logger.exception("Ошибка в обработке кнопки покидания группы", extra={'guild_id': interaction.guild_id})
             error_embed = discord.Embed(
                 title="❌ Системная ошибка",
                 description="Произошла непредвиденная ошибка. Обратитесь к администратору.",
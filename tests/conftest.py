@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+# Тесты запускаются и как `pytest`, и как `python -m pytest`: пакеты src и benchmarks лежат в корне репозитория
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Clock:
+    """Подменяет time.monotonic в модуле кэша: сроки жизни проверяются без sleep"""
+
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    from src import cache
+
+    clock = Clock()
+    monkeypatch.setattr(cache.time, 'monotonic', clock)
+    return clock
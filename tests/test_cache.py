@@ -0,0 +1,160 @@
+import pytest
+
+from src.cache import CacheRegistry, TTLCache
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = TTLCache('test', ttl=10)
+    cache.set('key', 'value')
+
+    clock.advance(9.9)
+    assert cache.get('key') == 'value'
+    clock.advance(0.1)
+    assert cache.get('key') is None
+    assert 'key' not in cache
+    assert cache.stats.expirations == 1
+
+
+def test_per_entry_ttl_overrides_default(clock):
+    cache = TTLCache('test', ttl=10)
+    cache.set('short', 1, ttl=1)
+    cache.set('long', 2)
+
+    clock.advance(5)
+    assert cache.get('short') is None
+    assert cache.get('long') == 2
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache('test', max_size=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # Чтение переносит запись в конец очереди вытеснения
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+
+    assert cache.keys() == ['a', 'c']
+    assert cache.stats.evictions == 1
+
+
+def test_overwrite_refreshes_position_and_ttl(clock):
+    cache = TTLCache('test', max_size=2, ttl=10)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    clock.advance(8)
+    cache.set('a', 10)
+    cache.set('c', 3)
+
+    assert cache.keys() == ['a', 'c']
+    clock.advance(5)
+    assert cache.get('a') == 10
+
+
+def test_get_or_load_calls_loader_once():
+    cache = TTLCache('test')
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return {'value': 1}
+
+    assert cache.get_or_load('key', loader) == {'value': 1}
+    assert cache.get_or_load('key', loader) == {'value': 1}
+    assert len(calls) == 1
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+
+def test_loader_exception_is_not_cached():
+    cache = TTLCache('test')
+
+    def failing():
+        raise RuntimeError("нет связи")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load('key', failing)
+    assert 'key' not in cache
+    assert cache.get_or_load('key', lambda: 'ok') == 'ok'
+
+
+def test_should_cache_rejects_value():
+    cache = TTLCache('test')
+    assert cache.get_or_load('key', lambda: None, should_cache=lambda value: value is not None) is None
+    assert 'key' not in cache
+
+
+def test_negative_result_uses_negative_ttl(clock):
+    cache = TTLCache('test', ttl=300)
+    cache.get_or_load('missing', lambda: {}, is_negative=lambda value: not value, negative_ttl=5)
+    cache.get_or_load('present', lambda: {'a': 1}, is_negative=lambda value: not value, negative_ttl=5)
+    assert cache.stats.negative_stores == 1
+
+    clock.advance(4)
+    assert 'missing' in cache
+    clock.advance(1)
+    assert 'missing' not in cache
+    assert 'present' in cache
+
+
+def test_invalidation_during_load_discards_result():
+    cache = TTLCache('test')
+
+    def loader():
+        # Запись в базу и её инвалидация пришлись на время чтения: прочитанное значение уже устарело
+        cache.invalidate('key')
+        return 'stale'
+
+    assert cache.get_or_load('key', loader) == 'stale'
+    assert 'key' not in cache
+    assert cache.get_or_load('key', lambda: 'fresh') == 'fresh'
+    assert cache.get('key') == 'fresh'
+
+
+@pytest.mark.parametrize('invalidate', [
+    lambda cache: cache.invalidate('other'),
+    lambda cache: cache.invalidate_where(lambda key: False),
+    lambda cache: cache.clear()
+])
+def test_any_invalidation_bumps_generation(invalidate):
+    cache = TTLCache('test')
+
+    def loader():
+        invalidate(cache)
+        return 'stale'
+
+    cache.get_or_load('key', loader)
+    assert 'key' not in cache
+
+
+def test_set_with_stale_generation_is_ignored():
+    cache = TTLCache('test')
+    generation = cache._generation
+    cache.invalidate('key')
+    cache.set('key', 'stale', generation=generation)
+    assert 'key' not in cache
+
+
+def test_invalidate_where_removes_matching_keys():
+    cache = TTLCache('test')
+    for guild_id in ('1', '2'):
+        for user_id in ('10', '20'):
+            cache.set((guild_id, user_id), True)
+
+    assert cache.invalidate_where(lambda key: key[0] == '1') == 2
+    assert sorted(cache.keys()) == [('2', '10'), ('2', '20')]
+    assert cache.stats.invalidations == 2
+
+
+def test_registry_returns_same_namespace_and_reads_env(monkeypatch):
+    monkeypatch.setenv('CACHE_USERS_MAX_SIZE', '3')
+    monkeypatch.setenv('CACHE_DEFAULT_TTL', '7')
+    registry = CacheRegistry()
+
+    cache = registry.namespace('users', max_size=100, ttl=60)
+    assert registry.namespace('users') is cache
+    assert cache.max_size == 3
+    assert cache.ttl == 7.0
+
+    cache.set('a', 1)
+    registry.clear_all()
+    assert len(cache) == 0
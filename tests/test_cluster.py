@@ -0,0 +1,163 @@
+import asyncio
+import contextlib
+import os
+import tempfile
+
+import pytest
+
+from src.cache import cache_registry
+from src.cluster import ClusterBroker, ClusterClient, _encode
+from src.events import ChangeEvent, DataChangeBus
+
+
+@pytest.fixture
+def socket_path():
+    with tempfile.TemporaryDirectory() as directory:
+        yield os.path.join(directory, 'cluster.sock')
+
+
+class Node:
+    """Процесс кластера в тесте: своя шина изменений и список полученных из неё событий"""
+
+    def __init__(self, path: str, process_id: int, **options):
+        self.bus = DataChangeBus()
+        self.received = []
+        self.bus.subscribe(self.received.append)
+        options.setdefault('reconnect_delay', 0.01)
+        self.client = ClusterClient(path, process_id, bus=self.bus, **options)
+
+
+async def _eventually(predicate, timeout: float = 2.0) -> None:
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not predicate():
+        assert asyncio.get_running_loop().time() < deadline, "условие не выполнилось вовремя"
+        await asyncio.sleep(0.005)
+
+
+@contextlib.asynccontextmanager
+async def _cluster(path: str, *nodes: Node):
+    broker = ClusterBroker(path)
+    await broker.start()
+    for node in nodes:
+        await node.client.start()
+        assert await node.client.wait_connected(2)
+    processes = [node.client._process_id for node in nodes]
+    await _eventually(lambda: [member['process'] for member in broker.members()] == processes)
+    try:
+        yield broker
+    finally:
+        for node in nodes:
+            await node.client.stop()
+        await broker.stop()
+
+
+def test_event_is_relayed_to_other_processes_without_echo(socket_path):
+    async def scenario():
+        first, second, third = Node(socket_path, 1), Node(socket_path, 2), Node(socket_path, 3)
+        async with _cluster(socket_path, first, second, third):
+            first.bus.publish_change('blacklist', 'add', '100', '100_200')
+            await _eventually(lambda: second.received and third.received)
+            await asyncio.sleep(0.05)
+
+            expected = ChangeEvent('blacklist', 'add', '100', '100_200').as_dict()
+            assert [event.as_dict() for event in second.received] == [expected]
+            assert [event.as_dict() for event in third.received] == [expected]
+            # Событие из брокера применяется к шине, но обратно в кластер не уходит
+            assert len(first.received) == 1
+
+    asyncio.run(scenario())
+
+
+def test_malformed_line_does_not_drop_connection(socket_path):
+    async def scenario():
+        first, second = Node(socket_path, 1), Node(socket_path, 2)
+        async with _cluster(socket_path, first, second):
+            first.client._writer.write(b'{broken\n[1, 2]\n')
+            first.bus.publish_change('guild_settings', 'update', '100')
+            await _eventually(lambda: second.received)
+            assert second.received[0].collection == 'guild_settings'
+
+    asyncio.run(scenario())
+
+
+def test_events_published_offline_are_flushed_after_connect(socket_path):
+    async def scenario():
+        # Процесс с очередью переподключается позже получателя, иначе ему некому отдать события
+        first, second = Node(socket_path, 1, reconnect_delay=0.2), Node(socket_path, 2)
+        await first.client.start()
+        first.bus.publish_change('capts', 'delete', '100', '100_1')
+        first.bus.publish_change('capts', 'delete', '100', '100_2')
+        await asyncio.sleep(0.05)
+        assert not first.client.connected
+
+        broker = ClusterBroker(socket_path)
+        await broker.start()
+        await second.client.start()
+        try:
+            assert await second.client.wait_connected(2)
+            assert not first.client.connected
+            assert await first.client.wait_connected(2)
+            await _eventually(lambda: len(second.received) == 2)
+            assert [event.document_id for event in second.received] == ['100_1', '100_2']
+        finally:
+            await first.client.stop()
+            await second.client.stop()
+            await broker.stop()
+
+    asyncio.run(scenario())
+
+
+def test_backlog_overflow_sends_resync(socket_path):
+    async def scenario():
+        cache = cache_registry.namespace('test_cluster_resync')
+        first, second = Node(socket_path, 1, backlog_size=2, reconnect_delay=0.2), Node(socket_path, 2)
+        await first.client.start()
+        for index in range(5):
+            first.bus.publish_change('blacklist', 'add', '100', f"100_{index}")
+        await asyncio.sleep(0.05)
+
+        broker = ClusterBroker(socket_path)
+        await broker.start()
+        await second.client.start()
+        try:
+            assert await second.client.wait_connected(2)
+            assert not first.client.connected
+            cache.set('key', 'value')
+            assert await first.client.wait_connected(2)
+            # Вместо части событий остальные процессы получают resync и сбрасывают кэши целиком
+            await _eventually(lambda: 'key' not in cache)
+            assert second.received == []
+        finally:
+            await first.client.stop()
+            await second.client.stop()
+            await broker.stop()
+
+    asyncio.run(scenario())
+
+
+def test_reconnect_clears_local_caches(socket_path):
+    async def scenario():
+        cache = cache_registry.namespace('test_cluster_reconnect')
+        node = Node(socket_path, 1)
+        async with _cluster(socket_path, node) as broker:
+            cache.set('key', 'value')
+            # Разрыв со стороны брокера: за время без связи процесс мог пропустить инвалидации
+            for connection in list(broker._connections):
+                connection.writer.close()
+            await _eventually(lambda: not node.client.connected)
+            assert await node.client.wait_connected(2)
+            await _eventually(lambda: 'key' not in cache)
+
+    asyncio.run(scenario())
+
+
+def test_resync_from_other_process_clears_caches(socket_path):
+    async def scenario():
+        cache = cache_registry.namespace('test_cluster_remote_resync')
+        first, second = Node(socket_path, 1), Node(socket_path, 2)
+        async with _cluster(socket_path, first, second):
+            cache.set('key', 'value')
+            first.client._writer.write(_encode({'op': 'resync', 'origin': 1}))
+            await _eventually(lambda: 'key' not in cache)
+
+    asyncio.run(scenario())
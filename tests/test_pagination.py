@@ -0,0 +1,90 @@
+import pytest
+
+import src.core.command_factory  # noqa: F401  (порядок импорта: иначе циклический импорт через src.utils)
+from benchmarks.fake_firestore import FakeFirestore
+from src.api_firebase import BaseRepository, BlacklistRepository, FirebaseManager, GuildSettingsRepository
+
+
+def _settings(count: int) -> dict:
+    return {f"guild{index:03d}": {'form_channel_id': str(index), 'approv_channel_id': str(index + 1),
+                                  'updated_at': 'служебное'} for index in range(count)}
+
+
+@pytest.fixture
+def firestore():
+    return FakeFirestore()
+
+
+@pytest.fixture
+def settings_repository(firestore):
+    return GuildSettingsRepository(FirebaseManager(db=firestore))
+
+
+def _walk(read_page, limit: int):
+    pages, cursor = [], None
+    while True:
+        page = read_page(limit, cursor)
+        pages.append(list(page['items']))
+        cursor = page['next_start_after']
+        if cursor is None:
+            return pages
+
+
+def test_page_reports_cursor_only_when_more_items():
+    items = [(str(index), index) for index in range(3)]
+    assert BaseRepository._page(iter(items), 2) == {'items': {'0': 0, '1': 1}, 'next_start_after': '1'}
+    assert BaseRepository._page(iter(items), 3) == {'items': {'0': 0, '1': 1, '2': 2}, 'next_start_after': None}
+    assert BaseRepository._page(iter(()), 3) == {'items': {}, 'next_start_after': None}
+
+
+@pytest.mark.parametrize('count,limit', [(25, 10), (20, 10), (1, 10), (0, 10), (7, 1)])
+def test_settings_pages_cover_collection_once(firestore, settings_repository, count, limit):
+    firestore.seed('guild_settings', _settings(count))
+    pages = _walk(settings_repository.get_settings_page, limit)
+
+    keys = [key for page in pages for key in page]
+    assert keys == sorted(_settings(count))
+    assert all(len(page) == limit for page in pages[:-1])
+    # Полная последняя страница не порождает лишний пустой запрос
+    assert pages[-1] or count == 0
+
+
+def test_settings_page_reads_limit_plus_one(firestore, settings_repository):
+    firestore.seed('guild_settings', _settings(50))
+    firestore.reset_counters()
+
+    settings_repository.get_settings_page(10, 'guild019')
+    assert firestore.reads == 11
+
+
+def test_cursor_between_existing_ids(firestore, settings_repository):
+    firestore.seed('guild_settings', _settings(5))
+    page = settings_repository.get_settings_page(2, 'guild001~')
+    assert list(page['items']) == ['guild002', 'guild003']
+
+
+def test_settings_page_projection_and_service_fields(firestore, settings_repository):
+    firestore.seed('guild_settings', _settings(2))
+
+    full = settings_repository.get_settings_page(1)['items']['guild000']
+    assert 'updated_at' not in full
+    assert settings_repository.get_settings_page(1, fields=['form_channel_id'])['items'] == {
+        'guild000': {'form_channel_id': '0'}}
+
+
+def test_blacklist_pages_stay_within_guild(firestore):
+    entries = {}
+    for guild_id in ('1', '2'):
+        for user in range(12):
+            user_id = f"{user:02d}"
+            entries[f"{guild_id}_{user_id}"] = {
+                'guild_id': guild_id, 'user_id': user_id, 'reason': 'spam', 'reporter_id': '9', 'timestamp': '0'}
+    firestore.seed('blacklist', entries)
+    repository = BlacklistRepository(FirebaseManager(db=firestore))
+
+    pages = _walk(lambda limit, cursor: repository.get_blacklist_page('2', limit, cursor), 5)
+    assert [len(page) for page in pages] == [5, 5, 2]
+    assert [key for page in pages for key in page] == [f"{user:02d}" for user in range(12)]
+
+    page = repository.get_blacklist_page('1', 3, '10', fields=['reason'])
+    assert page == {'items': {'11': {'reason': 'spam'}}, 'next_start_after': None}
@@ -0,0 +1,68 @@
+from src.utils import ApplicationState, StateStorage
+
+
+def _state(timestamp: float, user_id: int = 1) -> ApplicationState:
+    return ApplicationState(user_id, timestamp, '100')
+
+
+def test_pop_older_than_returns_expired_in_order():
+    storage = StateStorage()
+    for message_id, timestamp in ((3, 30.0), (1, 10.0), (2, 20.0), (4, 40.0)):
+        storage.add(message_id, _state(timestamp))
+
+    expired = storage.pop_older_than(25.0)
+    assert [message_id for message_id, _ in expired] == [1, 2]
+    assert len(storage) == 2
+    assert storage.get(1) is None
+    assert storage.get(3) is not None
+
+
+def test_cutoff_is_exclusive():
+    storage = StateStorage()
+    storage.add(1, _state(10.0))
+    assert storage.pop_older_than(10.0) == []
+    assert len(storage.pop_older_than(10.5)) == 1
+
+
+def test_removed_state_is_skipped_lazily():
+    storage = StateStorage()
+    storage.add(1, _state(10.0))
+    storage.add(2, _state(20.0))
+    storage.remove(1)
+
+    # Запись снятого состояния остаётся в куче до извлечения, но наружу не попадает
+    assert len(storage._expiry) == 2
+    assert [message_id for message_id, _ in storage.pop_older_than(100.0)] == [2]
+    assert storage._expiry == []
+
+
+def test_overwritten_state_expires_by_new_timestamp():
+    storage = StateStorage()
+    storage.add(1, _state(10.0, user_id=1))
+    replacement = _state(50.0, user_id=2)
+    storage.add(1, replacement)
+
+    assert storage.pop_older_than(30.0) == []
+    assert storage.get(1) is replacement
+    assert storage.pop_older_than(60.0) == [(1, replacement)]
+
+
+def test_readded_state_after_expiry_is_not_popped_twice():
+    storage = StateStorage()
+    storage.add(1, _state(10.0))
+    assert len(storage.pop_older_than(20.0)) == 1
+
+    storage.add(1, _state(30.0))
+    assert storage.pop_older_than(20.0) == []
+    assert len(storage) == 1
+
+
+def test_compaction_bounds_heap_size():
+    storage = StateStorage()
+    # Одно и то же сообщение перезаписывается: без уплотнения куча росла бы с каждым добавлением
+    for timestamp in range(1000):
+        storage.add(1, _state(float(timestamp)))
+
+    assert len(storage) == 1
+    assert len(storage._expiry) <= 2 * len(storage) + 65
+    assert [message_id for message_id, _ in storage.pop_older_than(1000.0)] == [1]